@@ -1,15 +1,36 @@
 import os
-import re
+import json
 import time
+import asyncio
 import logging
-from typing import List, Dict
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from groq import Groq
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from werkzeug.utils import secure_filename
-from pdf_indexer import PDFIndexer  # Importer notre classe PDFIndexer améliorée
+from pdf_indexer import PDFIndexer, SUPPORTED_EXTENSIONS  # Importer notre classe PDFIndexer améliorée
+from response_cache import ResponseCache, make_cache_key as hash_cache_key
+from semantic_cache import SemanticCache
+from legal_links_database import ARTICLE_ANCHORS, LEGAL_LINKS, build_legal_linker
+from citation_index import CitationIndex
+from language_detector import identify_language, response_language
+from conversation_store import Conversation, create_conversation_store
+from history_manager import HistoryManager, TokenCounter
+from feedback_store import FeedbackStore
+from scoped_index import ScopedDocumentIndex
+from ingestion_queue import IngestionQueue, SCOPE_CONVERSATION, SCOPE_SHARED
+from template_engine import TemplateStore, write_batch_zip
+import metrics
+from metrics import MetricsMiddleware
+from single_flight import SingleFlight
+from warmup import FAILED, READY, WarmUp
+from llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailableError
+from model_router import LARGE, ModelRouter
 
 # Configuration des logs
 logging.basicConfig(filename='app.log', level=logging.INFO)
@@ -24,6 +45,103 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # Obtenir le modèle (avec une valeur par défaut sécurisée)
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-70b-8192")
 
+# Nombre maximum d'appels simultanés à Groq et de recherches simultanées dans l'index
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "16"))
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+
+# Appels à Groq: délai d'une tentative et délai total d'un appel (attente et nouvelles tentatives
+# comprises) en secondes, nouvelles tentatives sur les erreurs 429/5xx avec attente exponentielle
+# (base et plafond en secondes), et taille du pool de connexions persistantes
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+# Disjoncteur: échecs consécutifs avant de refuser les appels, et durée du refus en secondes
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# Processus d'extraction des PDF à l'indexation (0 = nombre de cœurs) et délai par fichier en secondes
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "0")) or None
+PDF_EXTRACTION_TIMEOUT = float(os.getenv("PDF_EXTRACTION_TIMEOUT", "120")) or None
+# Mode de recherche dans les documents: "tfidf" (similarité cosinus) ou "bm25" (index inversé)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "tfidf")
+# Nombre d'ajouts/suppressions de documents avant de réentraîner le vectoriseur en arrière-plan
+REFIT_AFTER_CHANGES = int(os.getenv("REFIT_AFTER_CHANGES", "10"))
+# Nombre de requêtes dont le classement des passages est conservé (0 pour désactiver ce cache)
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "2000"))
+# Délai en secondes entre deux vérifications d'une nouvelle génération de l'index publiée par un autre worker
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "2"))
+# Répertoire des documents juridiques indexés et répertoire où l'index est sauvegardé entre deux démarrages
+LEGAL_DOCUMENTS_DIR = os.getenv("LEGAL_DOCUMENTS_DIR", "legal_documents")
+INDEX_DIRECTORY = os.getenv("INDEX_DIRECTORY", "index_cache")
+
+# Routage des questions: modèle rapide pour les questions simples (vide, par défaut: tout va à GROQ_MODEL),
+# nombre de mots et de questions de la conversation au-delà desquels le grand modèle répond, score
+# minimal du meilleur passage (dans l'échelle de RETRIEVAL_MODE) et langues traitées par le modèle rapide
+GROQ_FAST_MODEL = os.getenv("GROQ_FAST_MODEL", "")
+ROUTER_MAX_FAST_WORDS = int(os.getenv("ROUTER_MAX_FAST_WORDS", "20"))
+ROUTER_MAX_FAST_DEPTH = int(os.getenv("ROUTER_MAX_FAST_DEPTH", "4"))
+ROUTER_MIN_FAST_SCORE = float(os.getenv("ROUTER_MIN_FAST_SCORE", "0.3" if RETRIEVAL_MODE == "tfidf" else "15"))
+ROUTER_FAST_LANGUAGES = [language.strip() for language in os.getenv("ROUTER_FAST_LANGUAGES", "french").split(",")
+                         if language.strip()]
+
+# Démarrage: l'index est chargé en arrière-plan. En attendant, /chat/ répond sans contexte
+# juridique ("no_context") ou refuse la question ("unavailable": 503 avec Retry-After en secondes)
+CHAT_WHILE_WARMING = os.getenv("CHAT_WHILE_WARMING", "unavailable")
+WARMUP_RETRY_AFTER = int(os.getenv("WARMUP_RETRY_AFTER", "10"))
+# Une étape de démarrage en échec est relancée après WARMUP_BACKOFF_BASE secondes (doublées à
+# chaque essai, au plus WARMUP_BACKOFF_MAX); après WARMUP_MAX_ATTEMPTS tentatives (0 = sans
+# limite), /healthz répond 503 pour que le processus soit redémarré
+WARMUP_MAX_ATTEMPTS = int(os.getenv("WARMUP_MAX_ATTEMPTS", "5"))
+WARMUP_BACKOFF_BASE = float(os.getenv("WARMUP_BACKOFF_BASE", "5"))
+WARMUP_BACKOFF_MAX = float(os.getenv("WARMUP_BACKOFF_MAX", "300"))
+
+# Configuration du cache de réponses (TTL en secondes, taille en octets; 0 = pas de limite)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400")) or None
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))) or None
+
+# Cache sémantique des premières questions (similarité de Jaccard minimale, 0 pour désactiver)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "50000"))
+
+# Stockage des conversations: "memory" (processus courant) ou "sqlite" (partagé entre workers),
+# nombre maximum de conversations, durée d'inactivité avant expiration et intervalle de nettoyage en secondes
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "memory")
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "conversations.db")
+MAX_CONVERSATIONS = int(os.getenv("MAX_CONVERSATIONS", "10000"))
+CONVERSATION_IDLE_TIMEOUT = float(os.getenv("CONVERSATION_IDLE_TIMEOUT", "3600"))
+CONVERSATION_SWEEP_INTERVAL = float(os.getenv("CONVERSATION_SWEEP_INTERVAL", "60"))
+
+# Budget en tokens de l'historique envoyé au LLM (message système, résumé et messages, hors
+# contexte juridique), part réservée au résumé des anciens échanges (0 = pas de résumé) et encodage tiktoken
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4096"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "512"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+# Documents téléversés: base SQLite du statut des tâches et des documents des conversations
+# (partagée entre workers), documents traités simultanément, passages des documents de la
+# conversation ajoutés au contexte et nombre de conversations dont les documents sont conservés
+UPLOADS_DB_PATH = os.getenv("UPLOADS_DB_PATH", "uploads.db")
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+SCOPED_TOP_K = int(os.getenv("SCOPED_TOP_K", "2"))
+MAX_SCOPED_CONVERSATIONS = int(os.getenv("MAX_SCOPED_CONVERSATIONS", "1000"))
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
+
+# Génération de documents: dossiers des modèles et des documents générés, taille maximale d'un lot
+DOCUMENT_TEMPLATES_DIR = os.getenv("DOCUMENT_TEMPLATES_DIR", "document_templates")
+GENERATED_DOCUMENTS_DIR = os.getenv("GENERATED_DOCUMENTS_DIR", "generated_documents")
+MAX_BATCH_DOCUMENTS = int(os.getenv("MAX_BATCH_DOCUMENTS", "1000"))
+
+# Base des retours des utilisateurs (l'ancien journal CSV y est importé au premier démarrage)
+FEEDBACK_DB_PATH = os.getenv("FEEDBACK_DB_PATH", os.path.join("feedback_data", "feedback.db"))
+LEGACY_FEEDBACK_CSV = os.path.join("feedback_data", "feedback_log.csv")
+
+# Détail des durées de chaque étape renvoyé dans l'en-tête Server-Timing des réponses
+TIMING_HEADER = os.getenv("TIMING_HEADER", "false").lower() in ("1", "true", "yes")
+
 # Vérifier si la clé API est définie
 if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY not found in .env file")
@@ -32,6 +150,9 @@ if not GROQ_API_KEY:
 if not GROQ_MODEL:
     raise ValueError("GROQ_MODEL not found in .env file")
 
+if CHAT_WHILE_WARMING not in ("unavailable", "no_context"):
+    raise ValueError(f"CHAT_WHILE_WARMING invalide: {CHAT_WHILE_WARMING}")
+
 
 # Initialize FastAPI application
 app = FastAPI()
@@ -43,45 +164,101 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+# Durée des requêtes et des étapes du chat (/metrics)
+app.add_middleware(MetricsMiddleware, timing_header=TIMING_HEADER)
+
+# Client Groq: connexions persistantes, délais, nouvelles tentatives, disjoncteur et limite
+# du nombre d'appels en cours pour ne pas saturer l'API ni le worker
+llm_gateway = LLMGateway(
+    api_key=GROQ_API_KEY,
+    max_concurrency=MAX_CONCURRENT_LLM_CALLS,
+    timeout=LLM_TIMEOUT,
+    deadline=LLM_DEADLINE,
+    max_retries=LLM_MAX_RETRIES,
+    backoff_base=LLM_BACKOFF_BASE,
+    backoff_max=LLM_BACKOFF_MAX,
+    max_connections=LLM_MAX_CONNECTIONS,
+    breaker=CircuitBreaker(failure_threshold=LLM_BREAKER_FAILURES, reset_timeout=LLM_BREAKER_RESET)
+)
+# Choix du modèle (rapide ou grand) de chaque question
+model_router = ModelRouter(
+    GROQ_FAST_MODEL,
+    GROQ_MODEL,
+    max_fast_words=ROUTER_MAX_FAST_WORDS,
+    max_fast_depth=ROUTER_MAX_FAST_DEPTH,
+    min_fast_score=ROUTER_MIN_FAST_SCORE,
+    fast_languages=ROUTER_FAST_LANGUAGES
 )
 
-# Initialize Groq client
-client = Groq(api_key=GROQ_API_KEY)
+# Pool dédié à la recherche dans l'index (CPU) pour ne pas bloquer la boucle d'événements
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
 
 # Initialize PDF indexer
-pdf_indexer = PDFIndexer(pdf_directory="legal_documents")
-# Indexer les documents au démarrage de l'application
-pdf_indexer.index_documents()
-
-# Système de cache simple
-class ResponseCache:
-    def __init__(self, max_size=100):
-        self.cache = {}
-        self.max_size = max_size
-        self.access_times = {}
-    
-    def get(self, key):
-        if key in self.cache:
-            self.access_times[key] = time.time()
-            return self.cache[key]
-        return None
-    
-    def set(self, key, value):
-        # Si le cache est plein, supprimer l'élément le moins récemment utilisé
-        if len(self.cache) >= self.max_size:
-            oldest_key = min(self.access_times.items(), key=lambda x: x[1])[0]
-            del self.cache[oldest_key]
-            del self.access_times[oldest_key]
-        
-        self.cache[key] = value
-        self.access_times[key] = time.time()
-    
-    def clear(self):
-        self.cache.clear()
-        self.access_times.clear()
+pdf_indexer = PDFIndexer(
+    pdf_directory=LEGAL_DOCUMENTS_DIR,
+    index_directory=INDEX_DIRECTORY,
+    max_workers=INDEX_WORKERS,
+    extraction_timeout=PDF_EXTRACTION_TIMEOUT,
+    retrieval_mode=RETRIEVAL_MODE,
+    reload_interval=INDEX_RELOAD_INTERVAL,
+    search_cache_size=RETRIEVAL_CACHE_MAX_ENTRIES
+)
+# Index des articles des codes, pour les questions qui citent un article précis, et liens
+# vers ces articles ajoutés aux réponses
+citation_index = CitationIndex()
+legal_linker = build_legal_linker()
+
+
+def refresh_citations():
+    global legal_linker
+    start = time.perf_counter()
+    articles = citation_index.build(pdf_indexer.document_pages())
+    legal_linker = build_legal_linker(citation_index.article_links(LEGAL_LINKS, ARTICLE_ANCHORS))
+    logging.info(f"Index des citations: {articles} articles en {time.perf_counter() - start:.2f}s")
+
+
+# Documents propres à une conversation et file d'ingestion des documents téléversés
+scoped_documents = ScopedDocumentIndex(UPLOADS_DB_PATH, max_conversations=MAX_SCOPED_CONVERSATIONS)
+ingestion_queue = IngestionQueue(
+    pdf_indexer,
+    scoped_documents,
+    UPLOADS_DB_PATH,
+    workers=INGESTION_WORKERS,
+    extraction_timeout=PDF_EXTRACTION_TIMEOUT,
+    on_indexed=lambda: on_documents_changed()
+)
+
+# Questions identiques en cours de traitement: une seule recherche et un seul appel à Groq
+retrieval_flight = SingleFlight("retrieval")
+llm_flight = SingleFlight("llm")
+
+# Modèles de documents compilés et mis en cache
+template_store = TemplateStore(DOCUMENT_TEMPLATES_DIR)
+
+# Indexation des documents et index des citations préparés en arrière-plan: le serveur répond
+# dès son démarrage (/healthz) et /readyz indique quand la recherche est disponible
+warm_up = WarmUp(WARMUP_MAX_ATTEMPTS, WARMUP_BACKOFF_BASE, WARMUP_BACKOFF_MAX)
+warm_up.add_step("index", pdf_indexer.index_documents, progress=pdf_indexer.index_progress)
+warm_up.add_step("citations", refresh_citations)
+# Première recherche: charge le vectoriseur et les pages de l'index avant la première question
+warm_up.add_step("retrieval", lambda: pdf_indexer.search("contrat de travail"))
 
 # Initialiser le cache
-response_cache = ResponseCache(max_size=100)
+response_cache = ResponseCache(
+    max_size=RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=RESPONSE_CACHE_TTL,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES
+)
+semantic_cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, max_size=SEMANTIC_CACHE_MAX_ENTRIES)
+
+# Retours des utilisateurs, écrits par lots avec des statistiques agrégées
+feedback_store = FeedbackStore(FEEDBACK_DB_PATH)
+if os.path.exists(LEGACY_FEEDBACK_CSV):
+    imported = feedback_store.import_csv(LEGACY_FEEDBACK_CSV)
+    if imported:
+        logging.info(f"{imported} retours importés depuis {LEGACY_FEEDBACK_CSV}")
 
 # Data models
 class UserInput(BaseModel):
@@ -100,10 +277,13 @@ class DocumentRequest(BaseModel):
     language: str = "fr"  # "fr" ou "ar"
     parameters: dict  # Paramètres spécifiques au type de document
 
-class Conversation:
-    def __init__(self):
-        self.messages: List[Dict[str, str]] = [
-            {"role": "system", "content": """Tu es un assistant juridique spécialisé dans le droit tunisien, capable de répondre en français et en arabe.
+class DocumentBatchRequest(BaseModel):
+    document_type: str
+    language: str = "fr"
+    documents: List[dict]  # Paramètres de chaque document (un document par élément)
+
+# Message système, partagé par référence entre toutes les conversations
+SYSTEM_PROMPT = """Tu es un assistant juridique spécialisé dans le droit tunisien, capable de répondre en français et en arabe.
 
 DIRECTIVES GÉNÉRALES :
 1. Détecte automatiquement la langue de l'utilisateur (français ou arabe) et réponds dans la même langue
@@ -124,65 +304,133 @@ FORMAT DE RÉPONSE EN FRANÇAIS :
 - استشهد صراحة بمواد القانون والمراجع الدقيقة (مثال: "وفقًا للمادة 123 من مجلة الشغل التونسية...")
 - اختم بتوصيات عملية أو خطوات يجب اتباعها
 
-Utilise les informations juridiques fournies dans le contexte pour répondre aux questions."""}
-        ]
-        self.active: bool = True
-        self.last_activity: float = time.time()
+Utilise les informations juridiques fournies dans le contexte pour répondre aux questions."""
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
 
-    def update_last_activity(self):
-        self.last_activity = time.time()
+# Stockage des conversations, borné et nettoyé en arrière-plan
+conversation_store = create_conversation_store(
+    CONVERSATION_STORE,
+    SYSTEM_MESSAGE,
+    path=CONVERSATION_DB_PATH,
+    max_conversations=MAX_CONVERSATIONS,
+    idle_timeout=CONVERSATION_IDLE_TIMEOUT
+)
+conversation_store.start_sweeper(CONVERSATION_SWEEP_INTERVAL)
+
+# Fenêtre d'historique envoyée à Groq, réduite au budget de tokens à chaque tour
+history_manager = HistoryManager(
+    SYSTEM_MESSAGE,
+    token_budget=HISTORY_TOKEN_BUDGET,
+    summary_budget=HISTORY_SUMMARY_TOKENS,
+    count_tokens=TokenCounter(TOKENIZER_ENCODING)
+)
+# Encodage des tokens chargé (téléchargé au premier démarrage) en arrière-plan, pas à l'import
+warm_up.add_step("tokenizer", history_manager.count_tokens.load)
+
+
+def make_cache_key(conversation: Conversation, user_query: str) -> str:
+    # Générer une clé de cache basée sur la requête et les derniers messages
+    # Limiter à 3 derniers messages pour éviter des clés trop longues
+    last_messages = conversation.messages[-3:] if len(conversation.messages) > 3 else conversation.messages
+    # Les réponses qui s'appuient sur les documents de la conversation lui sont propres
+    if conversation.scope_version:
+        last_messages = last_messages + [
+            {"role": "scope", "content": f"{conversation.conversation_id}:{conversation.scope_version}"}
+        ]
+    return hash_cache_key(user_query, last_messages)
 
 
-# In-memory conversation storage (for demonstration purposes)
-conversations: Dict[str, Conversation] = {}
+# Une question est "première" tant que l'assistant n'a pas encore répondu dans la conversation:
+# sa réponse ne dépend alors que de la question, et peut être partagée entre utilisateurs
+def is_first_turn(conversation: Conversation) -> bool:
+    if conversation.dropped_messages or conversation.scope_version:
+        return False
+    return not any(message["role"] == "assistant" for message in conversation.messages)
 
 
-# Fonction simple de détection de langue
-def detect_language(text: str) -> str:
-    # Caractères arabes courants
-    arabic_pattern = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]+')
-    
-    # Si le texte contient des caractères arabes, on considère qu'il est en arabe
-    if arabic_pattern.search(text):
-        return "arabic"
-    else:
-        return "french"  # Par défaut, on considère que c'est du français
-
-
-# Groq API interaction function with context enhancement and language detection
-def query_groq_api(conversation: Conversation, user_query: str) -> str:
-    try:
-        # Générer une clé de cache basée sur la requête et les derniers messages
-        # Limiter à 3 derniers messages pour éviter des clés trop longues
-        last_messages = conversation.messages[-3:] if len(conversation.messages) > 3 else conversation.messages
-        cache_key = f"{user_query}_{str(last_messages)}"
-        
-        # Vérifier si la réponse est dans le cache
+# Recherche d'une réponse déjà générée: cache exact, puis cache sémantique pour les premières questions
+def get_cached_response(conversation: Conversation, user_query: str, cache_key: str, language: str):
+    with metrics.stage("cache"):
         cached_response = response_cache.get(cache_key)
         if cached_response:
-            print("Réponse trouvée dans le cache")
+            metrics.cache_lookups.inc(result="exact")
             return cached_response
-            
-        # Détecter la langue de la requête
-        language = detect_language(user_query)
-        print(f"Langue détectée: {language}")
-        
+
+        if SEMANTIC_CACHE_THRESHOLD > 0 and is_first_turn(conversation):
+            cached_response = semantic_cache.get(user_query, language)
+            if cached_response:
+                metrics.cache_lookups.inc(result="semantic")
+                response_cache.set(cache_key, cached_response)
+                return cached_response
+        metrics.cache_lookups.inc(result="miss")
+        return None
+
+
+# Stockage d'une réponse générée dans les caches
+def store_response(conversation: Conversation, user_query: str, cache_key: str, language: str, response: str):
+    response_cache.set(cache_key, response)
+    if SEMANTIC_CACHE_THRESHOLD > 0 and is_first_turn(conversation):
+        semantic_cache.set(user_query, language, response)
+
+
+# Recherche du contexte: documents de la conversation en premier, puis les articles cités
+# dans la question, puis l'index partagé. Retourne aussi, pour choisir le modèle, le score du
+# meilleur passage de l'index (None si tous les articles cités ont été trouvés, sans recherche)
+# et le nombre d'articles cités trouvés
+def retrieve_context(conversation_id: str, user_query: str) -> Tuple[str, Optional[float], int]:
+    # Un autre worker a publié une nouvelle génération de l'index (document ajouté, réindexation)
+    if pdf_indexer.reload_if_changed():
+        retrieval_executor.submit(refresh_citations)
+    scoped_results = scoped_documents.search(conversation_id, user_query, top_k=SCOPED_TOP_K)
+    cited_results, citations = citation_index.lookup_query(user_query)
+    # Tous les articles cités ont été trouvés: leur texte suffit, sans recherche vectorielle
+    if cited_results and len(cited_results) == citations:
+        return pdf_indexer.format_context(scoped_results + cited_results), None, len(cited_results)
+    context, best_score = pdf_indexer.retrieve(user_query, extra_results=scoped_results + cited_results)
+    return context, best_score, len(cited_results)
+
+
+# Attente du résultat d'un calcul identique déjà en cours, ou lancement du calcul
+async def coalesce(flight: SingleFlight, key, factory):
+    if flight.in_flight(key):
+        metrics.coalesced_requests.inc(kind=flight.name)
+    return await flight.do(key, factory)
+
+
+# Construction des messages envoyés à Groq, enrichis du contexte juridique (sauf si with_context
+# est faux: index en cours de chargement), score de la recherche (None sans recherche) et nombre
+# d'articles cités trouvés
+async def build_messages_with_context(conversation: Conversation, user_query: str, language: str,
+                                      with_context: bool = True) -> Tuple[List[Dict[str, str]], Optional[float], int]:
+    legal_context, retrieval_score, cited_articles = "", None, 0
+    if with_context:
         # Rechercher des informations pertinentes dans les documents juridiques
-        print(f"Recherche de contexte pour: {user_query}")
-        legal_context = pdf_indexer.get_relevant_context(user_query)
-        print(f"Contexte trouvé: {legal_context[:100]}..." if legal_context else "Aucun contexte trouvé")
-        
-        # Créer une copie des messages pour ne pas modifier l'historique original
-        messages_with_context = conversation.messages.copy()
-        
-        # Ajouter le contexte juridique au message de l'utilisateur si des informations pertinentes ont été trouvées
-        if legal_context:
-            # Trouver le dernier message de l'utilisateur
-            for i in range(len(messages_with_context) - 1, -1, -1):
-                if messages_with_context[i]["role"] == "user":
-                    # Ajouter le contexte juridique en fonction de la langue détectée
-                    if language == "arabic":
-                        enhanced_message = f"""سؤال المستخدم: {messages_with_context[i]['content']}
+        # Le contexte ne dépend de la conversation que si elle a ses propres documents
+        loop = asyncio.get_running_loop()
+        scope_version = conversation.scope_version
+        retrieval_key = (conversation.conversation_id if scope_version else None, scope_version, user_query)
+        with metrics.stage("retrieval"):
+            legal_context, retrieval_score, cited_articles = await coalesce(retrieval_flight, retrieval_key, lambda: loop.run_in_executor(
+                retrieval_executor, retrieve_context, conversation.conversation_id, user_query
+            ))
+    
+    with metrics.stage("prompt"):
+        return enrich_messages(conversation, legal_context, language), retrieval_score, cited_articles
+
+
+# Ajout du contexte juridique (ou, à défaut, de la consigne de langue) à la dernière question
+def enrich_messages(conversation: Conversation, legal_context: str, language: str) -> List[Dict[str, str]]:
+    # Créer une copie des messages (résumé des anciens échanges compris) pour ne pas modifier l'historique original
+    messages_with_context = history_manager.build_messages(conversation)
+    
+    # Ajouter le contexte juridique au message de l'utilisateur si des informations pertinentes ont été trouvées
+    if legal_context:
+        # Trouver le dernier message de l'utilisateur
+        for i in range(len(messages_with_context) - 1, -1, -1):
+            if messages_with_context[i]["role"] == "user":
+                # Ajouter le contexte juridique en fonction de la langue détectée
+                if language == "arabic":
+                    enhanced_message = f"""سؤال المستخدم: {messages_with_context[i]['content']}
 
 السياق القانوني التونسي الذي يجب مراعاته:
 {legal_context}
@@ -192,8 +440,8 @@ def query_groq_api(conversation: Conversation, user_query: str) -> str:
 إذا كان السياق لا يحتوي على معلومات ذات صلة للإجابة على السؤال، فأشر إلى ذلك بوضوح واقترح موارد بديلة.
 قم بهيكلة إجابتك بأقسام مرقمة إذا لزم الأمر وانتهِ بتوصيات عملية.
 أجب باللغة العربية."""
-                    else:  # french
-                        enhanced_message = f"""Question de l'utilisateur: {messages_with_context[i]['content']}
+                else:  # french
+                    enhanced_message = f"""Question de l'utilisateur: {messages_with_context[i]['content']}
 
 Contexte juridique tunisien à prendre en compte:
 {legal_context}
@@ -203,100 +451,214 @@ Tu dois toujours citer explicitement les articles de loi et références exactes
 Si le contexte ne contient pas d'information pertinente pour répondre à la question, indique-le clairement et suggère des ressources alternatives.
 Structure ta réponse avec des sections numérotées si nécessaire et termine par des recommandations pratiques.
 Réponds en français."""
-                    
-                    # Remplacer le message original par le message enrichi
-                    messages_with_context[i]["content"] = enhanced_message
-                    print(f"Message enrichi avec contexte juridique en {language}")
-                    break
-        else:
-            # Si aucun contexte n'est trouvé, ajouter une instruction pour répondre dans la langue détectée
-            for i in range(len(messages_with_context) - 1, -1, -1):
-                if messages_with_context[i]["role"] == "user":
-                    # Ajouter l'instruction de répondre dans la langue détectée
-                    if language == "arabic":
-                        enhanced_message = f"""سؤال المستخدم: {messages_with_context[i]['content']}
+                
+                # Remplacer le message original par le message enrichi (sans modifier l'historique)
+                messages_with_context[i] = {**messages_with_context[i], "content": enhanced_message}
+                break
+    else:
+        # Si aucun contexte n'est trouvé, ajouter une instruction pour répondre dans la langue détectée
+        for i in range(len(messages_with_context) - 1, -1, -1):
+            if messages_with_context[i]["role"] == "user":
+                # Ajouter l'instruction de répondre dans la langue détectée
+                if language == "arabic":
+                    enhanced_message = f"""سؤال المستخدم: {messages_with_context[i]['content']}
 
 لم يتم العثور على معلومات محددة في قاعدة البيانات القانونية.
 يرجى الإجابة على السؤال بأفضل ما لديك من معرفة عامة حول القانون التونسي.
 يجب أن تستشهد دائمًا بمواد القانون والمراجع الدقيقة إذا كنت تعرفها.
 أجب باللغة العربية."""
-                    else:  # french
-                        enhanced_message = f"""Question de l'utilisateur: {messages_with_context[i]['content']}
+                else:  # french
+                    enhanced_message = f"""Question de l'utilisateur: {messages_with_context[i]['content']}
 
 Aucune information spécifique n'a été trouvée dans la base de données juridique.
 Réponds à la question avec ta meilleure connaissance générale du droit tunisien.
 Tu dois toujours citer explicitement les articles de loi et références exactes si tu les connais.
 Réponds en français."""
-                    
-                    # Remplacer le message original par le message enrichi
-                    messages_with_context[i]["content"] = enhanced_message
-                    print(f"Message enrichi avec instruction de répondre en {language}")
-                    break
+                
+                # Remplacer le message original par le message enrichi (sans modifier l'historique)
+                messages_with_context[i] = {**messages_with_context[i], "content": enhanced_message}
+                break
+    
+    return messages_with_context
+
+
+# Groq API interaction function with context enhancement and language detection
+async def query_groq_api(conversation: Conversation, user_query: str, with_context: bool = True) -> str:
+    try:
+        cache_key = make_cache_key(conversation, user_query)
         
-        print("Envoi de la requête à Groq...")
-        completion = client.chat.completions.create(
-            model=GROQ_MODEL,
-            messages=messages_with_context,
-            temperature=0.3,
-            max_tokens=1024,
-            top_p=1,
-            stream=False,
-            stop=None,
+        # Détecter la langue de la requête
+        with metrics.stage("language"):
+            language = response_language(user_query)
+        
+        # Vérifier si la réponse est dans le cache
+        cached_response = get_cached_response(conversation, user_query, cache_key, language)
+        if cached_response:
+            return cached_response
+        
+        # La même question (même clé de cache) déjà envoyée à Groq n'est pas renvoyée: on attend sa réponse
+        return await coalesce(
+            llm_flight, llm_flight_key(cache_key, with_context),
+            lambda: generate_response(conversation, user_query, cache_key, language, with_context)
         )
-        print("Réponse reçue de Groq")
 
-        # Access the content safely
-        response = completion.choices[0].message.content
-        print(f"Réponse générée: {response[:100]}...")
-        
-        # Stocker la réponse dans le cache
-        response_cache.set(cache_key, response)
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        logging.error(f"Erreur détaillée dans query_groq_api: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error with Groq API: {str(e)}")
+
 
-        return response
+# Une réponse générée sans contexte n'est pas partagée avec les questions traitées normalement
+def llm_flight_key(cache_key: str, with_context: bool):
+    return cache_key if with_context else (cache_key, "no_context")
 
+
+# Nombre de questions posées dans la conversation (celles sorties de la fenêtre d'historique comprises)
+def conversation_depth(conversation: Conversation) -> int:
+    return sum(1 for message in conversation.turns if message["role"] == "user") + conversation.dropped_messages // 2
+
+
+# Appel à Groq avec le modèle choisi par le routage; durée et tokens sont comptés par route
+async def complete_with_route(decision: Dict, messages_with_context: List[Dict[str, str]]):
+    start = time.perf_counter()
+    try:
+        with metrics.stage("llm"):
+            completion = await llm_gateway.complete(
+                model=decision["model"],
+                messages=messages_with_context,
+                temperature=0.3,
+                max_tokens=1024,
+                top_p=1,
+                stop=None,
+            )
+    except Exception:
+        metrics.llm_requests.inc(mode="complete", outcome="error")
+        raise
+    metrics.llm_requests.inc(mode="complete", outcome="success")
+    metrics.record_llm_usage(completion.usage)
+    model_router.record(decision, time.perf_counter() - start, completion.usage)
+    return completion
+
+
+# Génération d'une réponse par Groq (contexte juridique compris) et mise en cache
+async def generate_response(conversation: Conversation, user_query: str, cache_key: str, language: str,
+                            with_context: bool = True) -> str:
+    messages_with_context, retrieval_score, cited_articles = await build_messages_with_context(
+        conversation, user_query, language, with_context
+    )
+    decision = model_router.route(user_query, language, retrieval_score, conversation_depth(conversation),
+                                  cited_articles)
+    
+    # Une réponse peu sûre (ou un échec) du modèle rapide est redemandée au grand modèle
+    try:
+        completion = await complete_with_route(decision, messages_with_context)
+        response = completion.choices[0].message.content
+        escalation = model_router.escalation_reason(decision, response, completion.choices[0].finish_reason)
     except Exception as e:
-        print(f"Erreur détaillée dans query_groq_api: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error with Groq API: {str(e)}")
+        if decision["route"] == LARGE:
+            raise
+        logging.warning(f"Échec du modèle rapide {decision['model']}: {str(e)}")
+        escalation = "error"
+    if escalation:
+        decision = model_router.escalate(decision, escalation)
+        completion = await complete_with_route(decision, messages_with_context)
+        response = completion.choices[0].message.content
+    
+    # Stocker la réponse dans le cache (pas celle d'une réponse sans contexte, qui serait servie
+    # une fois l'index prêt)
+    if with_context:
+        store_response(conversation, user_query, cache_key, language, response)
 
+    return response
 
-# Conversation management functions
-def get_or_create_conversation(conversation_id: str) -> Conversation:
-    if conversation_id not in conversations:
-        conversations[conversation_id] = Conversation()
-    else:
-        conversation = conversations[conversation_id]
-        if time.time() - conversation.last_activity > 3600:  # 1 hour inactivity
-            conversation.active = False
-            conversation.messages = [
-                {"role": "system", "content": """Tu es un assistant juridique spécialisé dans le droit tunisien, capable de répondre en français et en arabe.
 
-DIRECTIVES GÉNÉRALES :
-1. Détecte automatiquement la langue de l'utilisateur (français ou arabe) et réponds dans la même langue
-2. Justifie toujours tes réponses avec des références précises aux lois, codes et articles tunisiens
-3. Structure tes réponses de manière claire et professionnelle
-4. Si tu n'as pas d'information spécifique dans le contexte fourni, précise-le clairement
-5. N'invente jamais de lois ou de dispositions légales qui ne sont pas mentionnées dans le contexte
+# Variante en streaming: renvoie les tokens au fur et à mesure de leur génération par Groq
+async def stream_groq_api(conversation: Conversation, user_query: str, with_context: bool = True):
+    cache_key = make_cache_key(conversation, user_query)
+    with metrics.stage("language"):
+        language = response_language(user_query)
+    
+    # Une réponse en cache est renvoyée en un seul morceau
+    cached_response = get_cached_response(conversation, user_query, cache_key, language)
+    if cached_response:
+        yield cached_response
+        return
+    
+    # Une réponse identique déjà demandée par /chat/ est attendue puis renvoyée en un seul morceau
+    flight_key = llm_flight_key(cache_key, with_context)
+    if llm_flight.in_flight(flight_key):
+        yield await coalesce(
+            llm_flight, flight_key,
+            lambda: generate_response(conversation, user_query, cache_key, language, with_context)
+        )
+        return
+    
+    messages_with_context, retrieval_score, cited_articles = await build_messages_with_context(
+        conversation, user_query, language, with_context
+    )
+    # Pas de nouvel essai avec le grand modèle: les tokens du modèle rapide sont déjà envoyés
+    decision = model_router.route(user_query, language, retrieval_score, conversation_depth(conversation),
+                                  cited_articles)
+    
+    parts = []
+    usage = None
+    start = time.perf_counter()
+    try:
+        async for chunk in llm_gateway.stream(
+            model=decision["model"],
+            messages=messages_with_context,
+            temperature=0.3,
+            max_tokens=1024,
+            top_p=1,
+            stop=None,
+        ):
+            # Groq joint le décompte des tokens au dernier morceau (x_groq.usage)
+            chunk_usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if chunk_usage is not None:
+                usage = chunk_usage
+                metrics.record_llm_usage(usage)
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                if not parts:
+                    metrics.record_stage("llm_first_token", time.perf_counter() - start)
+                parts.append(token)
+                yield token
+    except Exception:
+        metrics.llm_requests.inc(mode="stream", outcome="error")
+        raise
+    metrics.record_stage("llm", time.perf_counter() - start)
+    metrics.llm_requests.inc(mode="stream", outcome="success")
+    model_router.record(decision, time.perf_counter() - start, usage)
+    
+    # Stocker la réponse complète dans le cache une fois le flux terminé
+    if with_context:
+        store_response(conversation, user_query, cache_key, language, "".join(parts))
 
-FORMAT DE RÉPONSE EN FRANÇAIS :
-- Commence par une réponse directe à la question
-- Développe avec les détails juridiques pertinents
-- Cite explicitement les articles de loi et références exactes (ex: "Selon l'article 123 du Code du Travail tunisien...")
-- Termine par des recommandations pratiques ou des étapes à suivre
 
-تنسيق الإجابة بالعربية:
-- ابدأ بإجابة مباشرة على السؤال
-- قم بتطوير إجابتك مع التفاصيل القانونية ذات الصلة
-- استشهد صراحة بمواد القانون والمراجع الدقيقة (مثال: "وفقًا للمادة 123 من مجلة الشغل التونسية...")
-- اختم بتوصيات عملية أو خطوات يجب اتباعها
+# Refus d'une opération qui a besoin de l'index tant qu'il est en cours de chargement
+def require_ready():
+    if not warm_up.is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail="Index des documents juridiques en cours de chargement",
+            headers={"Retry-After": str(WARMUP_RETRY_AFTER)}
+        )
 
-Utilise les informations juridiques fournies dans le contexte pour répondre aux questions."""}
-            ]
-    return conversations[conversation_id]
 
+# Mode de réponse du chat: avec le contexte juridique si l'index est prêt, sinon selon CHAT_WHILE_WARMING
+def chat_with_context() -> bool:
+    if warm_up.is_ready():
+        return True
+    if CHAT_WHILE_WARMING == "unavailable":
+        require_ready()
+    return False
 
-# API endpoint for chat
-@app.post("/chat/")
-async def chat(input: UserInput, request: Request):
+
+# Validation d'un message de chat et ajout à la conversation
+def start_chat_turn(input: UserInput) -> Conversation:
     # Ajout de logs détaillés
     logging.info(f"Requête reçue - Conversation ID: {input.conversation_id}")
     
@@ -304,39 +666,74 @@ async def chat(input: UserInput, request: Request):
         logging.error("Message ou conversation_id manquant")
         raise HTTPException(status_code=400, detail="Message et conversation_id sont obligatoires")
 
-    try:
-        conversation = get_or_create_conversation(input.conversation_id)
-        
-        if not conversation.active:
-            logging.warning(f"Conversation inactive - ID: {input.conversation_id}")
-            raise HTTPException(status_code=400, detail="La session de chat est terminée. Veuillez démarrer une nouvelle session.")
-
+    def add_question(conversation: Conversation) -> None:
         # Ajout du message utilisateur
         conversation.messages.append({
             "role": input.role,
             "content": input.message
         })
         conversation.update_last_activity()
+        # Seuls les messages ajoutés depuis le tour précédent sont comptés
+        history_manager.trim(conversation)
+        # Lue une fois par tour, ici plutôt que sur la boucle d'événements (clé de cache, recherche)
+        conversation.scope_version = scoped_documents.version(conversation.conversation_id)
+
+    # Une conversation inconnue ou expirée (inactive depuis CONVERSATION_IDLE_TIMEOUT) repart de zéro.
+    # La conversation est relue et enregistrée en une seule transaction (voir ConversationStore.update)
+    return conversation_store.update(input.conversation_id, add_question)
+
+
+# Ajout de la réponse à la dernière version de la conversation: un tour simultané de la même
+# conversation a pu l'enregistrer pendant la génération, et ses messages sont conservés
+def finish_chat_turn(conversation: Conversation, response: str) -> None:
+    def add_response(latest: Conversation) -> None:
+        if not latest.turns:
+            # Conversation expirée ou supprimée pendant la génération: elle repart de ce tour
+            latest.messages.extend(conversation.turns)
+        latest.messages.append({
+            "role": "assistant",
+            "content": response
+        })
+
+    conversation_store.update(conversation.conversation_id, add_response)
+
+
+# API endpoint for chat
+@app.post("/chat/")
+async def chat(input: UserInput, request: Request):
+    try:
+        with_context = chat_with_context()
+        # Les accès au stockage des conversations (SQLite) ne bloquent pas la boucle d'événements
+        loop = asyncio.get_running_loop()
+        conversation = await loop.run_in_executor(retrieval_executor, start_chat_turn, input)
 
         # Appel sécurisé à l'API Groq
         try:
-            response = query_groq_api(conversation, input.message)
+            response = await query_groq_api(conversation, input.message, with_context)
+        except LLMUnavailableError as e:
+            # API en panne ou saturée: le client peut réessayer après le délai indiqué
+            logging.error(f"API Groq indisponible: {str(e)}")
+            raise HTTPException(
+                status_code=503,
+                detail="Service temporairement indisponible",
+                headers={"Retry-After": str(max(1, round(e.retry_after)))}
+            )
         except Exception as e:
             logging.error(f"Erreur API Groq: {str(e)}")
             raise HTTPException(status_code=503, detail="Service temporairement indisponible")
 
         # Ajout de la réponse
-        conversation.messages.append({
-            "role": "assistant",
-            "content": response
-        })
-
-        return {
-            "message": "Réponse générée avec succès",
-            "response": response,
-            "conversation_id": input.conversation_id,
-            "language": detect_language(response)
-        }
+        await loop.run_in_executor(retrieval_executor, finish_chat_turn, conversation, response)
+
+        # L'historique garde le texte brut; les liens vers les textes juridiques sont ajoutés à l'affichage
+        with metrics.stage("serialization"):
+            return {
+                "message": "Réponse générée avec succès",
+                "response": legal_linker.link(response),
+                "conversation_id": input.conversation_id,
+                "language": response_language(response),
+                "degraded": not with_context
+            }
 
     except HTTPException:
         raise
@@ -348,22 +745,130 @@ async def chat(input: UserInput, request: Request):
         )
 
 
+# Formatage d'un événement Server-Sent Events
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# API endpoint for chat en streaming (Server-Sent Events)
+# Événements émis: "token" ({"token": ...}) pour chaque morceau de texte, puis "done" avec
+# la réponse complète, ou "error" si Groq échoue en cours de route
+@app.post("/chat/stream/")
+async def chat_stream(input: UserInput, request: Request):
+    with_context = chat_with_context()
+    loop = asyncio.get_running_loop()
+    conversation = await loop.run_in_executor(retrieval_executor, start_chat_turn, input)
+
+    async def event_stream():
+        parts = []
+        # Les références juridiques sont liées au fil du flux (une référence coupée entre deux
+        # tokens est retenue jusqu'au token suivant)
+        links = legal_linker.stream()
+        try:
+            async for token in stream_groq_api(conversation, input.message, with_context):
+                parts.append(token)
+                linked = links.feed(token)
+                if linked:
+                    yield sse_event("token", {"token": linked})
+        except LLMUnavailableError as e:
+            logging.error(f"API Groq indisponible (streaming): {str(e)}")
+            yield sse_event("error", {"detail": "Service temporairement indisponible",
+                                      "retry_after": max(1, round(e.retry_after))})
+            return
+        except Exception as e:
+            logging.error(f"Erreur API Groq (streaming): {str(e)}")
+            yield sse_event("error", {"detail": "Service temporairement indisponible"})
+            return
+        linked = links.flush()
+        if linked:
+            yield sse_event("token", {"token": linked})
+
+        # Ajout de la réponse complète à l'historique une fois le flux terminé
+        response = "".join(parts)
+        await loop.run_in_executor(retrieval_executor, finish_chat_turn, conversation, response)
+
+        yield sse_event("done", {
+            "response": legal_linker.link(response),
+            "conversation_id": input.conversation_id,
+            "language": response_language(response),
+            "degraded": not with_context
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Vivacité: le processus répond, même pendant le chargement de l'index (503 si la préparation a échoué)
+@app.get("/healthz")
+async def healthz():
+    status = warm_up.status()
+    body = {"status": "ok" if status["status"] != FAILED else "failed", "index": status["status"],
+            "uptime": status["uptime"], "error": status["error"]}
+    return JSONResponse(body, status_code=503 if status["status"] == FAILED else 200)
+
+
+# Disponibilité: l'index est chargé et la recherche prête (503 avec Retry-After et l'avancement sinon)
+@app.get("/readyz")
+async def readyz():
+    status = warm_up.status()
+    if status["status"] != READY:
+        return JSONResponse(status, status_code=503, headers={"Retry-After": str(WARMUP_RETRY_AFTER)})
+    return status
+
+
+# Mesures au format texte de Prometheus
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # Endpoint pour réindexer les documents (utile si vous ajoutez de nouveaux documents)
+# (seuls les fichiers nouveaux ou modifiés sont réextraits; un index à jour n'est pas reconstruit)
 @app.post("/reindex/")
 async def reindex_documents():
+    require_ready()
     try:
-        pdf_indexer.index_documents()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(retrieval_executor, pdf_indexer.index_documents)
+        await loop.run_in_executor(retrieval_executor, refresh_citations)
         return {"message": "Documents réindexés avec succès!"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Réentraînement du vectoriseur en arrière-plan après plusieurs ajouts/suppressions incrémentaux
+def schedule_refit_if_needed():
+    if pdf_indexer.pending_changes >= REFIT_AFTER_CHANGES:
+        retrieval_executor.submit(pdf_indexer.refit)
+
+
+# Après l'ajout ou la suppression d'un document de l'index partagé
+def on_documents_changed():
+    schedule_refit_if_needed()
+    refresh_citations()
+
+
+# Endpoint pour consulter le rapport de la dernière indexation (durée et pages par fichier)
+@app.get("/index/report/")
+async def get_index_report():
+    report = sorted(pdf_indexer.ingestion_report, key=lambda r: r["seconds"], reverse=True)
+    return {
+        "documents": len(pdf_indexer.documents),
+        "passages": len(pdf_indexer.passage_doc_ids),
+        "extraction_seconds": sum(r["seconds"] for r in report),
+        "files": report
+    }
+
+
 # Endpoint de test pour vérifier la connexion à Groq
 @app.get("/test-groq/")
 async def test_groq():
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-specdec",
+        completion = await llm_gateway.complete(
+            model=GROQ_MODEL,
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
                 {"role": "user", "content": "Hello, how are you?"}
@@ -371,140 +876,147 @@ async def test_groq():
             temperature=0.3,
             max_tokens=100
         )
-        return {"status": "success", "response": completion.choices[0].message.content}
+        return {"status": "success", "model": GROQ_MODEL, "response": completion.choices[0].message.content,
+                "gateway": llm_gateway.stats()}
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return {"status": "error", "message": str(e), "gateway": llm_gateway.stats()}
 
 
 # Endpoint pour vider le cache
 @app.post("/clear_cache/")
 async def clear_cache():
     response_cache.clear()
+    semantic_cache.clear()
+    pdf_indexer.search_cache.clear()
     return {"message": "Cache vidé avec succès"}
 
 
+# Endpoint pour obtenir les statistiques du cache
+@app.get("/cache/stats/")
+async def get_cache_stats():
+    return {
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "retrieval_cache": pdf_indexer.search_cache.stats()
+    }
+
+
+# Endpoint pour consulter le nombre de conversations et leur occupation mémoire ou disque
+@app.get("/conversations/stats/")
+async def get_conversation_stats():
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(retrieval_executor, conversation_store.stats)
+
+
 # Endpoint pour recevoir le feedback
 @app.post("/feedback/")
 async def submit_feedback(feedback: FeedbackInput):
+    if feedback.rating not in range(1, 6):
+        raise HTTPException(status_code=400, detail="La note doit être comprise entre 1 et 5")
     try:
-        # Créer un répertoire pour stocker les feedbacks s'il n'existe pas
-        feedback_dir = "feedback_data"
-        if not os.path.exists(feedback_dir):
-            os.makedirs(feedback_dir)
-        
-        # Enregistrer le feedback dans un fichier CSV
-        feedback_file = os.path.join(feedback_dir, "feedback_log.csv")
-        
-        # Créer l'en-tête si le fichier n'existe pas
-        if not os.path.exists(feedback_file):
-            with open(feedback_file, "w", encoding="utf-8") as f:
-                f.write("timestamp,conversation_id,message_id,rating,comment\n")
-        
-        # Ajouter le feedback au fichier
-        with open(feedback_file, "a", encoding="utf-8") as f:
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            # Échapper les virgules et les sauts de ligne dans le commentaire
-            safe_comment = feedback.comment.replace(",", "\\,").replace("\n", "\\n")
-            f.write(f"{timestamp},{feedback.conversation_id},{feedback.message_id},{feedback.rating},{safe_comment}\n")
-        
+        # Langue de la conversation (dernière question de l'utilisateur), sinon du commentaire
+        loop = asyncio.get_running_loop()
+        conversation = await loop.run_in_executor(retrieval_executor, conversation_store.get, feedback.conversation_id)
+        questions = [m["content"] for m in conversation.turns if m["role"] == "user"] if conversation else []
+        text = questions[-1] if questions else feedback.comment
+        language = identify_language(text) if text else "unknown"
+
+        # Le retour est écrit par lot en arrière-plan
+        feedback_store.submit(
+            feedback.conversation_id, feedback.message_id, feedback.rating, feedback.comment, language
+        )
         return {"message": "Feedback enregistré avec succès"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# Endpoint pour obtenir les statistiques de feedback
+# Endpoint pour obtenir les statistiques de feedback, éventuellement par conversation,
+# période (dates AAAA-MM-JJ incluses) et langue détectée
 @app.get("/feedback/stats/")
-async def get_feedback_stats():
+async def get_feedback_stats(conversation_id: str = None, start: str = None, end: str = None, language: str = None):
     try:
-        feedback_file = os.path.join("feedback_data", "feedback_log.csv")
-        
-        if not os.path.exists(feedback_file):
-            return {"message": "Aucun feedback disponible", "stats": {}}
-        
-        # Lire le fichier CSV et calculer les statistiques
-        ratings = []
-        with open(feedback_file, "r", encoding="utf-8") as f:
-            # Ignorer l'en-tête
-            next(f)
-            for line in f:
-                parts = line.strip().split(",")
-                if len(parts) >= 4:
-                    try:
-                        rating = int(parts[3])
-                        ratings.append(rating)
-                    except ValueError:
-                        continue
-        
-        if not ratings:
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(
+            retrieval_executor,
+            lambda: feedback_store.stats(conversation_id=conversation_id, start=start, end=end, language=language)
+        )
+
+        if not stats["total_feedbacks"]:
             return {"message": "Aucun feedback disponible", "stats": {}}
-        
-        # Calculer les statistiques
-        avg_rating = sum(ratings) / len(ratings)
-        rating_counts = {i: ratings.count(i) for i in range(1, 6)}
-        
+
         return {
             "message": "Statistiques de feedback récupérées avec succès",
-            "stats": {
-                "total_feedbacks": len(ratings),
-                "average_rating": avg_rating,
-                "rating_distribution": rating_counts
-            }
+            "stats": stats
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+SUPPORTED_DOCUMENT_TYPES = ["lettre_mise_en_demeure", "requete_simple", "procuration"]
+
+
+# Vérifie le type et la langue demandés et retourne le modèle compilé
+def get_document_template(document_type: str, language: str):
+    if document_type not in SUPPORTED_DOCUMENT_TYPES:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Type de document non supporté. Types supportés: {', '.join(SUPPORTED_DOCUMENT_TYPES)}"
+        )
+    
+    if language not in ["fr", "ar"]:
+        raise HTTPException(status_code=400, detail="Langue non supportée. Langues supportées: fr, ar")
+    
+    template = template_store.get(document_type, language)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template de document non trouvé")
+    return template
+
+
+# Écriture d'un document généré (dans un thread)
+def write_generated_document(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+# Suppression d'un fichier temporaire (archive envoyée ou écriture interrompue)
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Nom unique d'un document généré: deux requêtes de la même seconde ne s'écrasent plus
+def generated_filename(document_type: str, language: str, extension: str) -> str:
+    timestamp = time.strftime("%Y%m%d%H%M%S")
+    return f"{document_type}_{language}_{timestamp}_{uuid.uuid4().hex[:8]}.{extension}"
+
+
 # Endpoint pour générer des documents juridiques
 @app.post("/generate_document/")
 async def generate_document(request: DocumentRequest):
     try:
-        # Vérifier si le type de document est supporté
-        supported_types = ["lettre_mise_en_demeure", "requete_simple", "procuration"]
-        if request.document_type not in supported_types:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Type de document non supporté. Types supportés: {', '.join(supported_types)}"
-            )
-        
-        # Vérifier la langue
-        if request.language not in ["fr", "ar"]:
-            raise HTTPException(status_code=400, detail="Langue non supportée. Langues supportées: fr, ar")
-        
-        # Charger le template approprié
-        template_dir = "document_templates"
-        template_file = os.path.join(template_dir, f"{request.document_type}_{request.language}.txt")
-        
-        if not os.path.exists(template_file):
-            raise HTTPException(status_code=404, detail="Template de document non trouvé")
+        template = get_document_template(request.document_type, request.language)
         
-        # Lire le template
-        with open(template_file, "r", encoding="utf-8") as f:
-            template = f.read()
+        # Remplir le modèle en une passe et signaler les variables manquantes ou inconnues
+        content = template.render(request.parameters)
+        missing, unknown = template.check(request.parameters)
         
-        # Remplacer les variables dans le template
-        for key, value in request.parameters.items():
-            placeholder = f"{{{{{key}}}}}"
-            template = template.replace(placeholder, str(value))
-        
-        # Générer un nom de fichier unique
-        timestamp = time.strftime("%Y%m%d%H%M%S")
-        filename = f"{request.document_type}_{request.language}_{timestamp}.txt"
-        output_dir = "generated_documents"
-        
-        # Créer le répertoire s'il n'existe pas
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        
-        # Enregistrer le document généré
-        output_path = os.path.join(output_dir, filename)
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(template)
+        # Enregistrer le document généré hors de la boucle d'événements
+        filename = generated_filename(request.document_type, request.language, "txt")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            retrieval_executor, write_generated_document, os.path.join(GENERATED_DOCUMENTS_DIR, filename), content
+        )
         
         # Retourner le document généré
         return {
             "message": "Document généré avec succès",
-            "document_content": template,
-            "filename": filename
+            "document_content": content,
+            "filename": filename,
+            "missing_parameters": missing,
+            "unknown_parameters": unknown
         }
     except HTTPException:
         raise
@@ -512,37 +1024,82 @@ async def generate_document(request: DocumentRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Endpoint pour générer un lot de documents à partir d'un même modèle, renvoyés dans une
+# archive zip (un fichier par document et rapport.json des variables manquantes ou inconnues)
+@app.post("/generate_documents/batch/")
+async def generate_documents_batch(request: DocumentBatchRequest):
+    try:
+        template = get_document_template(request.document_type, request.language)
+        
+        if not request.documents:
+            raise HTTPException(status_code=400, detail="Aucun document à générer")
+        if len(request.documents) > MAX_BATCH_DOCUMENTS:
+            raise HTTPException(
+                status_code=413, detail=f"Trop de documents dans le lot. Maximum {MAX_BATCH_DOCUMENTS}"
+            )
+        
+        # L'archive est écrite dans un thread, envoyée par blocs puis supprimée
+        filename = generated_filename(request.document_type, request.language, "zip")
+        path = os.path.join(GENERATED_DOCUMENTS_DIR, filename)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(retrieval_executor, os.makedirs, GENERATED_DOCUMENTS_DIR, 0o777, True)
+        try:
+            report = await loop.run_in_executor(
+                retrieval_executor, write_batch_zip, path, template, request.documents,
+                f"{request.document_type}_{request.language}"
+            )
+        except Exception:
+            await loop.run_in_executor(retrieval_executor, remove_file, path)
+            raise
+        
+        incomplete = sum(1 for document in report if document["missing_parameters"])
+        return FileResponse(
+            path,
+            media_type="application/zip",
+            filename=filename,
+            headers={
+                "X-Documents-Count": str(len(report)),
+                "X-Incomplete-Documents": str(incomplete)
+            },
+            background=BackgroundTask(remove_file, path)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # Endpoint pour obtenir la liste des templates disponibles
 @app.get("/document_templates/")
 async def get_document_templates():
     try:
-        template_dir = "document_templates"
-        if not os.path.exists(template_dir):
-            return {"templates": []}
-        
-        templates = []
-        for file in os.listdir(template_dir):
-            if file.endswith(".txt"):
-                parts = file.split("_")
-                if len(parts) >= 2:
-                    doc_type = parts[0]
-                    language = parts[1].split(".")[0]
-                    templates.append({
-                        "type": doc_type,
-                        "language": language,
-                        "filename": file
-                    })
-        
-        return {"templates": templates}
+        return {"templates": template_store.list_templates()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ------ Endpoint d'Upload de Document Sécurisé ------
+# Copie d'un fichier téléversé sur le disque (dans un thread), limitée à max_size octets
+def save_upload(source, destination: str, max_size: int) -> int:
+    total_size = 0
+    chunk_size = 1024 * 1024  # 1MB
+    with open(destination, "wb") as f:
+        while content := source.read(chunk_size):
+            total_size += len(content)
+            if total_size > max_size:
+                raise ValueError("Fichier trop volumineux")
+            f.write(content)
+    return total_size
+
+
+# Endpoint de téléversement: le fichier est enregistré puis extrait et indexé en arrière-plan
+# (suivi par /upload_status/{job_id}). Avec scope="conversation", le document n'est cherché
+# que pour la conversation qui l'a téléversé et l'index partagé n'est pas modifié.
 @app.post("/upload_document/")
 async def upload_document(
     file: UploadFile = File(...),
     conversation_id: str = Form(...),
-    language: str = Form("fr")
+    language: str = Form("fr"),
+    scope: str = Form(SCOPE_SHARED)
 ):
     try:
         # 1. Validation du fichier
@@ -553,6 +1110,12 @@ async def upload_document(
         if not filename:
             raise HTTPException(400, "Nom de fichier invalide")
 
+        if scope not in (SCOPE_SHARED, SCOPE_CONVERSATION):
+            raise HTTPException(400, f"Portée invalide. Valeurs acceptées: {SCOPE_SHARED}, {SCOPE_CONVERSATION}")
+        # L'indexation au démarrage reconstruit l'index partagé: un ajout en parallèle serait perdu
+        if scope == SCOPE_SHARED:
+            require_ready()
+
         # 2. Vérification de l'extension
         allowed_extensions = {'.pdf', '.doc', '.docx', '.txt'}
         file_ext = os.path.splitext(filename)[1].lower()
@@ -560,8 +1123,10 @@ async def upload_document(
             raise HTTPException(400, 
                 f"Type de fichier non supporté. Formats acceptés: {', '.join(allowed_extensions)}")
 
-        # 3. Configuration du dossier
+        # 3. Configuration du dossier (un sous-dossier par conversation pour les documents privés)
         upload_dir = os.path.abspath("uploaded_documents")
+        if scope == SCOPE_CONVERSATION:
+            upload_dir = os.path.join(upload_dir, "conversations", secure_filename(conversation_id) or "_")
         try:
             os.makedirs(upload_dir, exist_ok=True)
             # Vérification des permissions
@@ -574,43 +1139,36 @@ async def upload_document(
         # 4. Préparation du chemin final
         file_location = os.path.join(upload_dir, filename)
         
-        # 5. Téléchargement sécurisé
+        # 5. Téléchargement sécurisé (écriture hors de la boucle d'événements)
+        loop = asyncio.get_running_loop()
         try:
-            with open(file_location, "wb") as f:
-                # Limite à 50MB et lecture par chunks
-                max_size = 50 * 1024 * 1024  # 50MB
-                total_size = 0
-                chunk_size = 1024 * 1024  # 1MB
-                
-                while content := await file.read(chunk_size):
-                    total_size += len(content)
-                    if total_size > max_size:
-                        os.remove(file_location)  # Nettoyer le fichier partiel
-                        raise HTTPException(413, f"Fichier trop volumineux. Maximum {max_size//(1024*1024)}MB")
-                    f.write(content)
+            total_size = await loop.run_in_executor(
+                retrieval_executor, save_upload, file.file, file_location, MAX_UPLOAD_SIZE
+            )
+        except ValueError:
+            os.remove(file_location)  # Nettoyer le fichier partiel
+            raise HTTPException(413, f"Fichier trop volumineux. Maximum {MAX_UPLOAD_SIZE//(1024*1024)}MB")
         except Exception as e:
             if os.path.exists(file_location):
                 os.remove(file_location)
             logging.error(f"Erreur écriture fichier: {str(e)}")
             raise HTTPException(500, "Erreur lors de l'enregistrement du fichier")
 
-        # 6. Traitement selon le type de fichier
-        summary = f"Fichier {filename} enregistré avec succès"
-        if file_ext == '.pdf':
-            try:
-                # Ajouter à l'indexeur PDF si disponible
-                if hasattr(pdf_indexer, 'add_document'):
-                    pdf_indexer.add_document(file_location)
-                    summary = "Document PDF indexé avec succès"
-            except Exception as e:
-                logging.warning(f"Erreur indexation PDF: {str(e)}")
-                summary = f"Document enregistré mais erreur d'indexation: {str(e)}"
+        # 6. Extraction et indexation en arrière-plan
+        job_id = None
+        if file_ext in SUPPORTED_EXTENSIONS:
+            job_id = ingestion_queue.submit(file_location, filename, conversation_id, scope)
+            summary = f"Fichier {filename} reçu, extraction et indexation en cours"
+        else:
+            summary = f"Fichier {filename} enregistré (format {file_ext} non indexé)"
 
         return {
             "status": "success",
             "filename": filename,
-            "size": f"{os.path.getsize(file_location)/(1024*1024):.2f}MB",
+            "size": f"{total_size/(1024*1024):.2f}MB",
             "summary": summary,
+            "job_id": job_id,
+            "scope": scope,
             "conversation_id": conversation_id,
             "language": language
         }
@@ -622,6 +1180,39 @@ async def upload_document(
         raise HTTPException(500, f"Erreur interne du serveur: {str(e)}")
 
 
+# Endpoint pour suivre l'extraction et l'indexation d'un document téléversé
+@app.get("/upload_status/{job_id}")
+async def get_upload_status(job_id: str):
+    job = ingestion_queue.status(job_id)
+    if job is None:
+        raise HTTPException(404, "Tâche inconnue")
+    return job
+
+
+# Endpoint pour supprimer un document téléversé (fichier et index)
+@app.delete("/upload_document/{filename}")
+async def delete_uploaded_document(filename: str):
+    safe_name = secure_filename(filename)
+    file_location = os.path.join(os.path.abspath("uploaded_documents"), safe_name)
+    if not safe_name or not os.path.exists(file_location):
+        raise HTTPException(404, "Document non trouvé")
+    require_ready()
+
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(retrieval_executor, pdf_indexer.remove_document, file_location)
+        os.remove(file_location)
+        await loop.run_in_executor(retrieval_executor, on_documents_changed)
+        return {"status": "success", "filename": safe_name, "message": "Document supprimé"}
+    except Exception as e:
+        logging.error(f"Erreur suppression document: {str(e)}", exc_info=True)
+        raise HTTPException(500, f"Erreur interne du serveur: {str(e)}")
+
+
+# Préparation lancée une fois toutes les routes déclarées
+warm_up.start()
+
+
 # Lancer l'application (si exécuté directement)
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,37 @@
+"""
+Benchmarks de performance du backend de l'assistant juridique. Les scénarios sont regroupés
+par domaine dans le paquet benchmarks; les vérifications de comportement sont dans tests/.
+
+Usage:
+    python benchmark.py <scenario> [options]
+
+Lancer `python benchmark.py --help` pour la liste des scénarios disponibles.
+"""
+import argparse
+import os
+
+from benchmarks import caches, chat, index, storage, text
+
+SCENARIOS = {}
+for module in (index, chat, caches, text, storage):
+    SCENARIOS.update(module.SCENARIOS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks du backend")
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--pdf-directory", default="legal_documents")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--retrieval-mode", choices=("tfidf", "bm25"), default="tfidf")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    SCENARIOS[args.scenario](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+Scénarios de benchmark, regroupés par domaine (lancés par benchmark.py)
+"""
@@ -0,0 +1,108 @@
+"""
+Benchmarks des caches de réponses: cache exact (ancienne éviction linéaire comparée au
+cache LRU) et cache sémantique
+"""
+import time
+
+
+class LegacyResponseCache:
+    """
+    Ancienne implémentation du cache (éviction par recherche linéaire), pour comparaison.
+    """
+    def __init__(self, max_size=100):
+        self.cache = {}
+        self.max_size = max_size
+        self.access_times = {}
+
+    def get(self, key):
+        if key in self.cache:
+            self.access_times[key] = time.time()
+            return self.cache[key]
+        return None
+
+    def set(self, key, value):
+        if len(self.cache) >= self.max_size:
+            oldest_key = min(self.access_times.items(), key=lambda x: x[1])[0]
+            del self.cache[oldest_key]
+            del self.access_times[oldest_key]
+        self.cache[key] = value
+        self.access_times[key] = time.time()
+
+
+def bench_response_cache(args):
+    """
+    Compare le coût d'insertion (cache plein, donc avec éviction) et de lecture entre
+    l'ancien cache et le cache LRU, pour 100, 10k et 100k entrées.
+    """
+    from response_cache import ResponseCache, make_cache_key
+
+    value = "Réponse juridique " * 50
+    print(f"{'entrées':>8} {'cache':>8} {'insertion (µs)':>15} {'lecture (µs)':>13}")
+    for size in (100, 10_000, 100_000):
+        keys = [make_cache_key(f"question {i}", []) for i in range(size)]
+        new_keys = [make_cache_key(f"nouvelle question {i}", []) for i in range(args.operations)]
+        for name, cache in (("ancien", LegacyResponseCache(max_size=size)),
+                            ("LRU", ResponseCache(max_size=size, ttl=3600))):
+            for key in keys:
+                cache.set(key, value)
+
+            start = time.perf_counter()
+            for i in range(args.operations):
+                cache.get(keys[(i * 7919) % size])
+            lookup = (time.perf_counter() - start) / args.operations
+
+            start = time.perf_counter()
+            for key in new_keys:
+                cache.set(key, value)
+            insert = (time.perf_counter() - start) / args.operations
+
+            print(f"{size:>8} {name:>8} {insert * 1e6:>15.2f} {lookup * 1e6:>13.2f}")
+
+
+def bench_semantic_cache(args):
+    """
+    Mesure le temps de recherche du cache sémantique avec 1k, 10k et 50k questions en cache,
+    pour des reformulations (succès attendu) et des questions nouvelles (échec attendu).
+    """
+    import random
+    from semantic_cache import SemanticCache
+
+    rng = random.Random(42)
+    vocabulary = [
+        "licenciement", "préavis", "salaire", "contrat", "employeur", "divorce", "pension",
+        "héritage", "loyer", "bail", "société", "capital", "impôt", "douane", "amende",
+        "accident", "assurance", "retraite", "congé", "maternité", "garde", "enfant",
+        "propriété", "terrain", "permis", "construction", "plainte", "tribunal", "appel",
+        "cassation", "avocat", "notaire", "chèque", "dette", "faillite", "marque", "brevet",
+    ] + [f"terme{i}" for i in range(2000)]
+
+    print(f"{'questions':>10} {'reformulation (µs)':>19} {'nouvelle (µs)':>14} {'succès':>7}")
+    for size in (1_000, 10_000, 50_000):
+        cache = SemanticCache(threshold=0.8, max_size=size)
+        questions = [rng.sample(vocabulary, rng.randint(3, 7)) for _ in range(size)]
+        for words in questions:
+            cache.set("Quels sont mes droits en cas de " + " ".join(words), "french", "réponse")
+
+        rephrased = []
+        for words in rng.sample(questions, args.operations):
+            shuffled = words[:]
+            rng.shuffle(shuffled)
+            rephrased.append("Mes " + " ".join(shuffled) + " droits ?")
+        unseen = [" ".join(rng.sample(vocabulary, 5)) for _ in range(args.operations)]
+
+        start = time.perf_counter()
+        found = sum(cache.get(question, "french") is not None for question in rephrased)
+        rephrased_time = (time.perf_counter() - start) / args.operations
+        start = time.perf_counter()
+        for question in unseen:
+            cache.get(question, "french")
+        unseen_time = (time.perf_counter() - start) / args.operations
+
+        print(f"{size:>10} {rephrased_time * 1e6:>19.1f} {unseen_time * 1e6:>14.1f} "
+              f"{found / args.operations:>6.0%}")
+
+
+SCENARIOS = {
+    "response_cache": bench_response_cache,
+    "semantic_cache": bench_semantic_cache,
+}
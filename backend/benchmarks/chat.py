@@ -0,0 +1,462 @@
+"""
+Benchmarks des endpoints de chat contre un faux serveur Groq: charge, streaming, requêtes
+regroupées, instrumentation, démarrage, passerelle LLM et routage entre modèles
+"""
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.common import (
+    load_app, percentile, start_app_process, start_app_server, start_fault_llm_server, start_stub_llm_server
+)
+
+
+def bench_chat_load(args):
+    """
+    Envoie N conversations simultanées à /chat/ (LLM simulé localement) et mesure
+    les latences p50/p99 ainsi que le débit.
+    """
+    import httpx
+
+    stub = start_stub_llm_server(latency=args.llm_latency)
+    app_module = load_app(stub)
+
+    async def conversation(client, conversation_id, latencies):
+        for turn in range(args.turns):
+            start = time.perf_counter()
+            response = await client.post("/chat/", json={
+                "message": f"Question {turn} sur le licenciement abusif ({conversation_id})",
+                "conversation_id": conversation_id,
+            })
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    async def run():
+        latencies = []
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                conversation(client, f"bench-{i}", latencies) for i in range(args.concurrency)
+            ))
+            elapsed = time.perf_counter() - start
+        return latencies, elapsed
+
+    latencies, elapsed = asyncio.run(run())
+    stub.shutdown()
+
+    print()
+    print(f"Conversations simultanées : {args.concurrency} x {args.turns} tours "
+          f"(latence LLM simulée {args.llm_latency * 1000:.0f} ms)")
+    print(f"Requêtes                  : {len(latencies)} en {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.1f} req/s)")
+    print(f"Latence p50               : {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"Latence p99               : {percentile(latencies, 99) * 1000:.1f} ms")
+
+
+def bench_chat_stream(args):
+    """
+    Compare le délai avant le premier token de /chat/stream/ (faux serveur de streaming) à la
+    latence totale de /chat/. Le contenu du flux est vérifié par tests/test_chat_stream.py.
+    """
+    import httpx
+
+    answer = "Selon l'article 23 bis du Code du Travail, le licenciement abusif ouvre droit à des dommages-intérêts."
+    stub = start_stub_llm_server(latency=args.llm_latency, answer=answer)
+    app_module = load_app(stub)
+    server, base_url = start_app_server(app_module.app)
+
+    try:
+        with httpx.Client(base_url=base_url, timeout=None) as client:
+            # Réponse complète (non streamée)
+            start = time.perf_counter()
+            client.post("/chat/", json={"message": "Licenciement abusif ?", "conversation_id": "bench-full"}).raise_for_status()
+            full_time = time.perf_counter() - start
+
+            # Réponse streamée: mesurer le premier token
+            tokens, first_token_time = [], None
+            start = time.perf_counter()
+            with client.stream("POST", "/chat/stream/", json={
+                "message": "Quelles indemnités en cas de licenciement abusif ?", "conversation_id": "bench-stream"
+            }) as response:
+                response.raise_for_status()
+                event = None
+                for line in response.iter_lines():
+                    if line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif line.startswith("data: "):
+                        data = json.loads(line[len("data: "):])
+                        if event == "token":
+                            if first_token_time is None:
+                                first_token_time = time.perf_counter() - start
+                            tokens.append(data["token"])
+                        elif event == "error":
+                            raise RuntimeError(data["detail"])
+            stream_time = time.perf_counter() - start
+    finally:
+        server.should_exit = True
+        stub.shutdown()
+
+    print()
+    print(f"Tokens reçus            : {len(tokens)}")
+    print(f"/chat/ (réponse entière): {full_time * 1000:.1f} ms")
+    print(f"/chat/stream/ 1er token : {first_token_time * 1000:.1f} ms")
+    print(f"/chat/stream/ complet   : {stream_time * 1000:.1f} ms")
+
+
+def bench_coalescing(args):
+    """
+    Envoie N requêtes /chat/ simultanées avec la même question (conversations différentes)
+    et compte les recherches de contexte et les appels à Groq effectivement faits. Le
+    regroupement est vérifié par tests/test_single_flight.py.
+    """
+    import httpx
+
+    stub = start_stub_llm_server(latency=args.llm_latency)
+    app_module = load_app(stub)
+
+    async def burst(question):
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.post("/chat/", json={"message": question, "conversation_id": f"bench-coalescing-{i}"})
+                for i in range(args.concurrency)
+            ))
+            elapsed = time.perf_counter() - start
+        for response in responses:
+            response.raise_for_status()
+        return [response.json()["response"] for response in responses], elapsed
+
+    async def contexts(question):
+        # Historiques différents (donc clés de cache différentes), même question: une seule recherche
+        conversations = []
+        for i in range(args.concurrency):
+            conversation = app_module.Conversation(f"bench-retrieval-{i}", app_module.SYSTEM_MESSAGE, [
+                {"role": "user", "content": f"Question précédente {i}"},
+                {"role": "assistant", "content": f"Réponse précédente {i}"},
+                {"role": "user", "content": question},
+            ])
+            conversations.append(conversation)
+        built = await asyncio.gather(*(
+            app_module.build_messages_with_context(conversation, question, "french") for conversation in conversations
+        ))
+        return [messages for messages, _, _ in built]
+
+    retrieval_before = app_module.retrieval_flight.leaders
+    answers, elapsed = asyncio.run(burst("Quels sont les délais de préavis en cas de démission ?"))
+    stub.shutdown()
+    burst_retrievals = app_module.retrieval_flight.leaders - retrieval_before
+
+    retrieval_before = app_module.retrieval_flight.leaders
+    asyncio.run(contexts("Quelle est la durée légale du congé de maternité ?"))
+    context_retrievals = app_module.retrieval_flight.leaders - retrieval_before
+
+    print(f"{args.concurrency} requêtes identiques simultanées en {elapsed * 1000:.0f} ms "
+          f"(latence LLM simulée {args.llm_latency * 1000:.0f} ms, {len(set(answers))} réponse(s) distincte(s))")
+    print(f"appels à Groq: {stub.calls}, recherches de contexte: {burst_retrievals} "
+          f"({app_module.llm_flight.coalesced} requêtes regroupées)")
+    print(f"{args.concurrency} conversations différentes, même question: {context_retrievals} recherche(s) "
+          f"de contexte ({app_module.retrieval_flight.coalesced} regroupées)")
+
+
+def bench_metrics(args):
+    """
+    Mesure le coût de l'instrumentation (étape mesurée, middleware, rendu de /metrics) par
+    rapport à une requête /chat/ contre le faux serveur Groq. Le contenu de /metrics et de
+    l'en-tête Server-Timing est vérifié par tests/test_metrics.py.
+    """
+    import httpx
+    import metrics
+
+    os.environ["TIMING_HEADER"] = "true"
+    stub = start_stub_llm_server(latency=args.llm_latency)
+    app_module = load_app(stub)
+    server, base_url = start_app_server(app_module.app)
+    try:
+        with httpx.Client(base_url=base_url, timeout=None) as client:
+            latencies = []
+            subjects = ["préavis", "divorce", "bail", "héritage", "licenciement", "pension", "succession",
+                        "chèque", "société", "contrat", "dot", "garde", "loyer", "salaire", "congé"]
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                response = client.post("/chat/", json={"message": f"Question sur {subjects[i % len(subjects)]} ?",
+                                                       "conversation_id": f"bench-metrics-{i}"})
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+                if i == 0:
+                    timing = response.headers["server-timing"]
+            exposition = client.get("/metrics").text
+    finally:
+        server.should_exit = True
+        stub.shutdown()
+
+    # Coût d'une étape mesurée (dans une requête) et du middleware (application ASGI vide)
+    stages = []
+    token = metrics._request_stages.set(stages)
+    start = time.perf_counter()
+    for _ in range(args.operations):
+        with metrics.stage("bench"):
+            pass
+    stage_cost = (time.perf_counter() - start) / args.operations
+    metrics._request_stages.reset(token)
+
+    async def empty_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def noop_send(message):
+        pass
+
+    async def run(asgi_app):
+        scope = {"type": "http", "method": "GET", "path": "/"}
+        start = time.perf_counter()
+        for _ in range(args.operations):
+            await asgi_app(scope, None, noop_send)
+        return (time.perf_counter() - start) / args.operations
+
+    bare = asyncio.run(run(empty_app))
+    wrapped = asyncio.run(run(metrics.MetricsMiddleware(empty_app, timing_header=True)))
+    render_start = time.perf_counter()
+    metrics.registry.render()
+    render_time = time.perf_counter() - render_start
+
+    median = statistics.median(latencies)
+    overhead = 8 * stage_cost + (wrapped - bare)
+    print(f"Server-Timing: {timing}")
+    print(f"étape mesurée          : {stage_cost * 1e6:.2f} µs")
+    print(f"middleware             : {(wrapped - bare) * 1e6:.2f} µs par requête")
+    print(f"rendu de /metrics      : {render_time * 1000:.2f} ms ({len(exposition.splitlines())} lignes)")
+    print(f"/chat/ médiane         : {median * 1000:.1f} ms, instrumentation ≈ {overhead * 1e6:.1f} µs "
+          f"({overhead / median * 100:.3f} %)")
+
+
+def profile_startup(env, probe=None):
+    """
+    Mesure le délai entre le lancement du processus et la première réponse de /healthz, puis
+    jusqu'à ce que /readyz réponde 200. probe(client) est appelé une fois pendant le chargement.
+
+    Returns:
+        (délai de /healthz, délai de /readyz, étapes de la préparation)
+    """
+    import httpx
+
+    process, base_url, started = start_app_process(env)
+    try:
+        with httpx.Client(base_url=base_url, timeout=5) as client:
+            while True:
+                try:
+                    if client.get("/healthz").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+            healthz = time.perf_counter() - started
+            if probe is not None:
+                probe(client)
+            while True:
+                response = client.get("/readyz")
+                if response.status_code == 200:
+                    break
+                time.sleep(0.05)
+            return healthz, time.perf_counter() - started, response.json()["steps"]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def bench_warmup(args):
+    """
+    Profil du démarrage: délai avant la première réponse HTTP (/healthz) et avant que l'index
+    soit prêt (/readyz), avec un index déjà sauvegardé puis sans index (premier démarrage).
+    Les réponses de /chat/ pendant le chargement sont vérifiées par tests/test_warmup.py.
+    """
+    from pdf_indexer import PDFIndexer
+
+    PDFIndexer(args.pdf_directory).index_documents()
+
+    def show_progress(client):
+        # Pendant le chargement: réponse de /chat/ et avancement de l'indexation
+        response = client.post("/chat/", json={"message": "Bonjour", "conversation_id": "warmup"})
+        status = client.get("/readyz")
+        print(f"pendant le chargement: /chat/ -> {response.status_code} "
+              f"(Retry-After: {response.headers.get('retry-after')} s), /readyz -> {status.json()['steps']}")
+
+    warm = [profile_startup({}) for _ in range(args.repeat)]
+    index_directory = tempfile.mkdtemp(prefix="warmup_bench_")
+    try:
+        cold = profile_startup({"INDEX_DIRECTORY": index_directory}, probe=show_progress)
+    finally:
+        shutil.rmtree(index_directory, ignore_errors=True)
+
+    def row(label, healthz, readyz, steps):
+        detail = ", ".join(f"{step['name']} {step['seconds']:.2f}s" for step in steps)
+        print(f"{label:<22} /healthz {healthz:7.2f} s   /readyz {readyz:7.2f} s   ({detail})")
+
+    print()
+    row("index sauvegardé", statistics.median(w[0] for w in warm), statistics.median(w[1] for w in warm), warm[0][2])
+    row("premier démarrage", *cold)
+
+
+def bench_llm_gateway(args):
+    """
+    Compare le client Groq par défaut (2 nouvelles tentatives du SDK, délai de 60 s) et
+    LLMGateway face à un faux serveur qui injecte des pannes: erreurs intermittentes, panne
+    totale et réponses trop lentes. Le comportement de LLMGateway est vérifié par
+    tests/test_llm_gateway.py.
+    """
+    import groq
+    from llm_gateway import LLMGateway
+
+    messages = [{"role": "user", "content": "Bonjour"}]
+    requests = args.concurrency * 2
+
+    async def load(complete):
+        latencies, failures = [], 0
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def one():
+            nonlocal failures
+            async with slots:
+                start = time.perf_counter()
+                try:
+                    await complete()
+                except Exception:
+                    failures += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return latencies, failures, time.perf_counter() - start
+
+    def measure(label, server_options, deadline=10.0):
+        results = []
+        for name in ("client par défaut", "LLMGateway"):
+            server = start_fault_llm_server(**server_options)
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+            async def run():
+                if name == "LLMGateway":
+                    gateway = LLMGateway("stub-key", base_url=base_url, max_concurrency=args.concurrency,
+                                         timeout=min(deadline, 30.0), deadline=deadline)
+                    client, complete = gateway.client, gateway.complete
+                else:
+                    client = groq.AsyncGroq(api_key="stub-key", base_url=base_url)
+                    complete = client.chat.completions.create
+                try:
+                    return await load(lambda: complete(model="stub", messages=messages))
+                finally:
+                    await client.close()
+
+            latencies, failures, elapsed = asyncio.run(run())
+            server.shutdown()
+            results.append((name, latencies, failures, elapsed, server.calls, server.connections))
+        print(f"\n{label}")
+        for name, latencies, failures, elapsed, calls, connections in results:
+            print(f"  {name:<18} p50 {percentile(latencies, 50) * 1000:7.0f} ms   "
+                  f"p99 {percentile(latencies, 99) * 1000:7.0f} ms   échecs {failures:3d}/{requests}   "
+                  f"appels à l'API {calls:4d}   connexions {connections:3d}   total {elapsed:5.1f} s")
+
+    measure("API disponible (latence 50 ms)", {"default": (200, 0.05)})
+    measure("Erreurs intermittentes (1 requête sur 3 en 503)",
+            {"plan": [(503, 0.05) if i % 3 == 0 else (200, 0.05) for i in range(requests * 3)]})
+    measure("Panne totale (503)", {"default": (503, 0.05)})
+    measure("API trop lente (5 s par réponse, délai de 1 s)", {"default": (200, 5.0)}, deadline=1.0)
+
+
+def bench_routing(args):
+    """
+    Compare un seul grand modèle et le routage entre un modèle rapide et un grand modèle sur
+    un échantillon de questions (faux serveur: latence du grand modèle --llm-latency, du
+    modèle rapide cinq fois moindre, qui ne sait pas répondre sur la garde des enfants). Les
+    règles de routage sont vérifiées par tests/test_model_router.py.
+    """
+    import httpx
+    import metrics
+
+    os.environ["GROQ_MODEL"] = "stub-large"
+    os.environ["GROQ_FAST_MODEL"] = "stub-fast"
+    questions = [
+        "Bonjour",
+        "Merci beaucoup !",
+        "taux de TVA",
+        "congé de maternité",
+        "Quelle est la durée du préavis de licenciement ?",
+        "Quelle est la peine pour vol ?",
+        "divorce garde des enfants",
+        "ما هي مدة الإشعار المسبق للطرد ؟",
+        "Je voudrais savoir si mon employeur peut me licencier pendant un arrêt maladie "
+        "et quelles indemnités je peux réclamer",
+        "Comment créer une SARL en Tunisie ?",
+        "Quels sont les délais de préavis en cas de démission ?",
+        "Mon voisin fait du bruit la nuit que faire",
+    ]
+
+    def latency(request):
+        return args.llm_latency / 5 if request["model"] == "stub-fast" else args.llm_latency
+
+    def answer(request):
+        # Le modèle rapide ne sait pas répondre à la question sur la garde des enfants
+        if request["model"] == "stub-fast" and "garde des enfants" in request["messages"][-1]["content"]:
+            return "Le contexte ne contient pas d'information pertinente sur ce point."
+        return "Selon l'article 14 du Code du travail tunisien, le délai applicable est d'un mois."
+
+    stub = start_stub_llm_server(latency=latency, answer=answer)
+    app_module = load_app(stub)
+    router = app_module.model_router
+
+    def counter_total(counter, **labels):
+        return sum(value for key, value in counter.values.items()
+                   if all(key[counter.labelnames.index(name)] == str(v) for name, v in labels.items()))
+
+    async def run(label):
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await client.post("/clear_cache/")
+            latencies = []
+            for i, question in enumerate(questions):
+                start = time.perf_counter()
+                response = await client.post("/chat/", json={"message": question, "conversation_id": f"{label}-{i}"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+        return latencies
+
+    results = []
+    for label, fast_model in (("grand modèle seul", None), ("routage", "stub-fast")):
+        router.fast_model = fast_model
+        calls = stub.calls
+        escalations = counter_total(metrics.llm_route_escalations)
+        fast_before = counter_total(metrics.llm_route_decisions, route="fast")
+        latencies = asyncio.run(run(label))
+        results.append((label, latencies, stub.calls - calls,
+                        counter_total(metrics.llm_route_decisions, route="fast") - fast_before,
+                        counter_total(metrics.llm_route_escalations) - escalations))
+
+    print()
+    for question in questions:
+        language = app_module.response_language(question)
+        _, score, cited = app_module.retrieve_context("routing", question)
+        decision = router.route(question, language, score, 1, cited)
+        score = "-" if score is None else f"{score:.2f}"
+        print(f"  {decision['route']:<6} {decision['reason']:<18} score {score:>5}  {question[:60]}")
+    print()
+    for label, latencies, calls, fast, escalated in results:
+        print(f"{label:<18} moyenne {statistics.mean(latencies) * 1000:6.0f} ms   p50 "
+              f"{percentile(latencies, 50) * 1000:6.0f} ms   total {sum(latencies):5.2f} s   "
+              f"appels à Groq {calls:2d}   modèle rapide {fast:2.0f}/{len(questions)}   reprises {escalated:.0f}")
+    stub.shutdown()
+
+
+SCENARIOS = {
+    "chat_load": bench_chat_load,
+    "chat_stream": bench_chat_stream,
+    "coalescing": bench_coalescing,
+    "metrics": bench_metrics,
+    "warmup": bench_warmup,
+    "llm_gateway": bench_llm_gateway,
+    "routing": bench_routing,
+}
@@ -0,0 +1,259 @@
+"""
+Outils partagés par les benchmarks: faux serveurs compatibles avec l'API Groq, application
+chargée dans le processus ou lancée avec uvicorn, percentiles et mémoire d'un processus
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def start_stub_llm_server(latency: float = 0.2, answer: str = "Réponse de test.",
+                          token_delay: float = 0.02):
+    """
+    Démarre un faux serveur compatible avec l'API Groq (format OpenAI) dans un thread.
+
+    Args:
+        latency: Délai simulé (en secondes) avant chaque réponse ou avant le premier token, ou
+            fonction de la requête (dictionnaire JSON) qui retourne ce délai
+        answer: Le texte renvoyé comme complétion, ou fonction de la requête qui le retourne
+        token_delay: Délai entre deux tokens lorsque la requête demande du streaming
+
+    Returns:
+        Le serveur HTTP (server.calls compte les requêtes reçues)
+    """
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            server.calls += 1
+            server.last_request = request
+            time.sleep(latency(request) if callable(latency) else latency)
+            if request.get("stream"):
+                self.stream_answer(request)
+                return
+            content = answer(request) if callable(answer) else answer
+            body = json.dumps({
+                "id": f"stub-{server.calls}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def stream_answer(self, request):
+            # Format SSE de l'API: un objet "chat.completion.chunk" par token, puis [DONE]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            content = answer(request) if callable(answer) else answer
+            tokens = [word + " " for word in content.split(" ")]
+            tokens[-1] = tokens[-1].rstrip()
+            for index, token in enumerate(tokens):
+                if index:
+                    time.sleep(token_delay)
+                chunk = {
+                    "id": f"stub-{server.calls}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.calls = 0
+    server.last_request = None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_fault_llm_server(plan=(), default=(200, 0.0)):
+    """
+    Démarre un faux serveur Groq qui injecte des erreurs et de la latence: chaque requête
+    reçoit la réponse suivante de plan, puis default une fois plan épuisé. Les connexions
+    sont persistantes (HTTP/1.1) pour mesurer leur réutilisation.
+
+    Args:
+        plan: Réponses successives: (statut HTTP, délai en secondes[, Retry-After])
+        default: Réponse une fois plan épuisé
+
+    Returns:
+        Le serveur HTTP (calls: requêtes reçues, connections: connexions TCP ouvertes,
+        max_active: requêtes traitées simultanément au plus)
+    """
+    class FaultHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with server.lock:
+                server.connections += 1
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            with server.lock:
+                server.calls += 1
+                server.active += 1
+                server.max_active = max(server.max_active, server.active)
+                status, delay, *retry_after = server.plan.pop(0) if server.plan else server.default
+            try:
+                time.sleep(delay)
+                if status != 200:
+                    self.send_json(status, {"error": {"message": f"erreur simulée {status}", "type": "stub"}},
+                                   retry_after)
+                elif request.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    self.close_connection = True
+                    for token in ("Réponse ", "en ", "flux."):
+                        chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                                 "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                else:
+                    self.send_json(200, {
+                        "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": "Réponse."},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                    })
+            except (BrokenPipeError, ConnectionResetError):
+                # Le client a abandonné la requête (délai dépassé)
+                self.close_connection = True
+            finally:
+                with server.lock:
+                    server.active -= 1
+
+        def send_json(self, status, payload, retry_after=()):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if retry_after:
+                self.send_header("Retry-After", str(retry_after[0]))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class FaultServer(ThreadingHTTPServer):
+        # File d'attente assez longue pour que les connexions simultanées ne soient pas refusées
+        request_queue_size = 128
+
+    server = FaultServer(("127.0.0.1", 0), FaultHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.plan = list(plan)
+    server.default = default
+    server.calls = server.connections = server.active = server.max_active = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_app(stub_server):
+    """
+    Importe l'application FastAPI en dirigeant le client Groq vers le faux serveur, et attend
+    que l'index soit chargé.
+    """
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{stub_server.server_address[1]}"
+    os.environ.setdefault("GROQ_API_KEY", "stub-key")
+    # Un seul modèle (les réponses courtes du faux serveur seraient redemandées au grand modèle),
+    # sauf pour le scénario de routage
+    os.environ.setdefault("GROQ_FAST_MODEL", "")
+    import app
+    app.warm_up.wait()
+    return app
+
+
+def start_app_server(app):
+    """
+    Démarre l'application FastAPI avec uvicorn dans un thread, sur un port libre.
+
+    Returns:
+        (serveur uvicorn, URL de base)
+    """
+    import socket
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def start_app_process(env):
+    """
+    Lance l'application dans un processus uvicorn, comme en production.
+
+    Returns:
+        (processus, URL de base, instant du lancement)
+    """
+    import socket
+    import subprocess
+    import sys
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "GROQ_API_KEY": "stub-key", **env},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return process, f"http://127.0.0.1:{port}", started
+
+
+def percentile(values, pct):
+    """
+    Retourne le percentile pct (0-100) d'une liste de valeurs.
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def read_memory(pid):
+    """
+    Retourne la mémoire d'un processus en Mo d'après /proc/<pid>/smaps_rollup (Linux):
+    RSS (pages résidentes, partagées comprises), PSS (pages partagées divisées entre les
+    processus qui les projettent) et USS (pages privées).
+    """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
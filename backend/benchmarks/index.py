@@ -0,0 +1,392 @@
+"""
+Benchmarks de l'index des documents: démarrage, recherche TF-IDF et BM25, cache des
+recherches, index des citations et mémoire de l'index partagé entre workers
+"""
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.common import read_memory
+
+
+def bench_startup(args):
+    """
+    Compare le démarrage à froid (extraction de tous les PDF) et le démarrage à chaud
+    (rechargement de l'index sauvegardé sur disque).
+    """
+    from pdf_indexer import PDFIndexer
+
+    index_directory = tempfile.mkdtemp(prefix="index_bench_")
+    try:
+        start = time.perf_counter()
+        cold = PDFIndexer(pdf_directory=args.pdf_directory, index_directory=index_directory)
+        cold.index_documents()
+        cold_time = time.perf_counter() - start
+
+        warm_times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            warm = PDFIndexer(pdf_directory=args.pdf_directory, index_directory=index_directory)
+            warm.index_documents()
+            warm_times.append(time.perf_counter() - start)
+
+        print()
+        print(f"Documents indexés : {len(cold.documents)}")
+        print(f"Démarrage à froid : {cold_time * 1000:.1f} ms")
+        print(f"Démarrage à chaud : {statistics.median(warm_times) * 1000:.1f} ms "
+              f"(médiane sur {args.repeat} essais)")
+    finally:
+        shutil.rmtree(index_directory, ignore_errors=True)
+
+
+def bench_retrieval(args):
+    """
+    Compare l'ancien classement (cosine_similarity + tri complet) au classement par
+    produit creux + argpartition, sur des matrices TF-IDF synthétiques de 10k, 100k et
+    1M passages, en requêtes unitaires et par lots (search_many).
+    """
+    import numpy as np
+    import scipy.sparse as sp
+    from sklearn.metrics.pairwise import cosine_similarity
+    from sklearn.preprocessing import normalize
+    from pdf_indexer import rank_passages
+
+    rng = np.random.default_rng(42)
+    vocabulary_size, terms_per_passage, terms_per_query, top_k = 50_000, 20, 4, 5
+    # Fréquences des termes en loi de Zipf, comme dans un corpus réel
+    term_weights = 1.0 / np.arange(1, vocabulary_size + 1)
+    term_weights /= term_weights.sum()
+
+    def random_matrix(rows, terms):
+        indices = rng.choice(vocabulary_size, size=rows * terms, p=term_weights).astype(np.int32)
+        data = rng.random(rows * terms, dtype=np.float32)
+        indptr = np.arange(0, rows * terms + 1, terms)
+        matrix = sp.csr_matrix((data, indices, indptr), shape=(rows, vocabulary_size))
+        matrix.sum_duplicates()
+        return normalize(matrix).astype(np.float32)
+
+    queries = random_matrix(args.operations, terms_per_query)
+    print(f"{'passages':>10} {'ancien (ms)':>12} {'nouveau (ms)':>13} {'par lot (ms/req)':>17}")
+    for size in (10_000, 100_000, 1_000_000):
+        passages = random_matrix(size, terms_per_passage)
+        scoring_matrix = passages.T.tocsr()
+        legacy_queries = min(args.operations, 20) if size >= 1_000_000 else args.operations
+
+        start = time.perf_counter()
+        for i in range(legacy_queries):
+            similarities = cosine_similarity(queries[i], passages).flatten()
+            similarities.argsort()[::-1][:top_k]
+        legacy = (time.perf_counter() - start) / legacy_queries
+
+        start = time.perf_counter()
+        for i in range(args.operations):
+            rank_passages(queries[i], scoring_matrix, top_k)
+        single = (time.perf_counter() - start) / args.operations
+
+        start = time.perf_counter()
+        rank_passages(queries, scoring_matrix, top_k)
+        batched = (time.perf_counter() - start) / args.operations
+
+        print(f"{size:>10} {legacy * 1000:>12.2f} {single * 1000:>13.3f} {batched * 1000:>17.3f}")
+
+
+def bench_bm25(args):
+    """
+    Compare les modes de recherche TF-IDF et BM25 sur le corpus fourni: latence et rappel@5
+    sur un jeu fixe de requêtes tirées des passages indexés (une suite de 6 mots d'un
+    passage; la requête est réussie si un passage retourné contient cette suite).
+    """
+    import random
+    import re
+    from pdf_indexer import PDFIndexer
+
+    indexer = PDFIndexer(pdf_directory=args.pdf_directory)
+    indexer.index_documents()
+
+    rng = random.Random(42)
+    queries = []
+    while len(queries) < args.operations:
+        passage_id = rng.randrange(len(indexer.passage_doc_ids))
+        words = re.findall(r"\w+", indexer.get_passage_text(passage_id))
+        if len(words) < 20:
+            continue
+        start = rng.randrange(len(words) - 6)
+        queries.append(" ".join(words[start:start + 6]))
+
+    def normalize(text):
+        return " ".join(re.findall(r"\w+", text.lower()))
+
+    print(f"{'mode':>6} {'construction (s)':>17} {'latence (ms)':>13} {'rappel@5':>9}")
+    for mode in ("tfidf", "bm25"):
+        indexer.retrieval_mode = mode
+        start = time.perf_counter()
+        indexer._warm_up()
+        build_time = time.perf_counter() - start
+
+        hits = 0
+        start = time.perf_counter()
+        results = [indexer.search(query, top_k=5) for query in queries]
+        latency = (time.perf_counter() - start) / len(queries)
+        for query, result in zip(queries, results):
+            phrase = normalize(query)
+            hits += any(phrase in normalize(r["content"]) for r in result)
+        print(f"{mode:>6} {build_time:>17.2f} {latency * 1000:>13.2f} {hits / len(queries):>9.1%}")
+
+
+def bench_retrieval_cache(args):
+    """
+    Mesure le cache des résultats de recherche: latence de PDFIndexer.retrieve sans cache, au
+    premier appel et en cache, taux de succès sur un flux de questions répétées ou reformulées
+    (casse, accents, espaces, mots vides). Le contexte en cache et son invalidation quand
+    l'index change sont vérifiés par tests/test_retrieval_cache.py.
+    """
+    import random
+    import unicodedata
+    from pdf_indexer import PDFIndexer
+
+    base_questions = [
+        "Quelle est la durée du préavis de licenciement ?",
+        "Quels sont les délais de préavis en cas de démission ?",
+        "Quelle est la durée légale du congé de maternité ?",
+        "Comment calculer l'indemnité de licenciement ?",
+        "Quelle est la peine pour vol ?",
+        "Quel est le taux de la TVA ?",
+        "Comment créer une SARL en Tunisie ?",
+        "Quelles sont les conditions du divorce ?",
+        "Qui a la garde des enfants après le divorce ?",
+        "Quelle est la durée de la période d'essai ?",
+        "Combien de jours de congé annuel payé ?",
+        "Quel est le salaire minimum garanti ?",
+        "Quelles sont les obligations du bailleur ?",
+        "Comment résilier un contrat de bail ?",
+        "Quelle est la prescription d'une action civile ?",
+        "Quels sont les droits du salarié en cas d'accident du travail ?",
+        "Comment contester une amende ?",
+        "Quelle est la procédure de succession ?",
+        "Quelles sont les heures supplémentaires autorisées ?",
+        "Comment déposer une plainte pour escroquerie ?",
+    ]
+
+    def reformulate(question, rng):
+        # Même question, écrite autrement: casse, accents, espaces et ponctuation
+        variants = [
+            question,
+            question.lower(),
+            question.upper(),
+            "  " + question.replace(" ", "   ") + "  ",
+            question.rstrip(" ?"),
+            "".join(c for c in unicodedata.normalize("NFKD", question) if not unicodedata.combining(c)),
+        ]
+        return rng.choice(variants)
+
+    indexer = PDFIndexer(args.pdf_directory)
+    indexer.index_documents()
+    uncached = PDFIndexer(args.pdf_directory, search_cache_size=0)
+    uncached.index_documents()
+
+    # Flux de questions: les plus fréquentes reviennent souvent (loi de Zipf), reformulées
+    rng = random.Random(42)
+    weights = [1 / (rank + 1) for rank in range(len(base_questions))]
+    stream = [reformulate(question, rng) for question in rng.choices(base_questions, weights, k=args.operations)]
+
+    def run(target):
+        latencies = []
+        for question in stream:
+            start = time.perf_counter()
+            target.retrieve(question)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    indexer.search_cache.clear()
+    before = indexer.search_cache.stats()
+    baseline = run(uncached)
+    cached = run(indexer)
+    after = indexer.search_cache.stats()
+    hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+
+    single_miss, single_hit = [], []
+    for i, question in enumerate(base_questions):
+        indexer.search_cache.clear()
+        start = time.perf_counter()
+        indexer.retrieve(question)
+        single_miss.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        indexer.retrieve(question)
+        single_hit.append(time.perf_counter() - start)
+
+    print()
+    print(f"retrieve() sans cache        : {statistics.median(single_miss) * 1000:7.3f} ms (médiane)")
+    print(f"retrieve() en cache          : {statistics.median(single_hit) * 1000:7.3f} ms (médiane)")
+    print(f"flux de {len(stream)} questions (Zipf, reformulées): sans cache {sum(baseline):.2f} s, "
+          f"avec cache {sum(cached):.2f} s; taux de succès {hits / (hits + misses):.1%} "
+          f"({misses} recherches effectuées)")
+
+
+def bench_citations(args):
+    """
+    Compare, pour des questions qui citent un article précis, la recherche TF-IDF dans tout
+    le corpus à l'index des citations (exactitude du passage retourné et latence).
+    """
+    import random
+    from pdf_indexer import PDFIndexer
+    from citation_index import ARTICLE_HEADING_PATTERN, CitationIndex, article_number
+
+    indexer = PDFIndexer(args.pdf_directory)
+    indexer.index_documents()
+    citations = CitationIndex()
+    start = time.perf_counter()
+    citations.build(indexer.document_pages())
+    build_time = time.perf_counter() - start
+
+    rng = random.Random(42)
+    keys = sorted(citations.articles)
+    sample = rng.sample(keys, min(args.operations, len(keys)))
+    questions = [f"Que prévoit l'article {article} du {code} ?" for code, article in sample]
+    def starts_article(text, article):
+        # Le passage contient l'en-tête de l'article demandé (et pas un simple renvoi)
+        for match in ARTICLE_HEADING_PATTERN.finditer(text):
+            groups = match.groups()
+            number = article_number(*groups[:2]) if groups[0] is not None else article_number(*groups[2:])
+            if number == article:
+                return True
+        return False
+
+    start = time.perf_counter()
+    search_hits = 0
+    for question, (code, article) in zip(questions, sample):
+        results = indexer.search(question, top_k=1)
+        if results and starts_article(results[0]["content"], article):
+            search_hits += 1
+    search_time = (time.perf_counter() - start) / len(questions)
+
+    start = time.perf_counter()
+    citation_hits = 0
+    for question, (code, article) in zip(questions, sample):
+        results, found = citations.lookup_query(question)
+        if found == 1 and results and starts_article(results[0]["content"], article):
+            citation_hits += 1
+    citation_time = (time.perf_counter() - start) / len(questions)
+
+    stats = citations.stats()
+    print(f"{stats['articles']} articles de {len(stats['by_code'])} codes indexés en {build_time * 1000:.0f} ms")
+    print(f"{len(questions)} questions citant un article:")
+    print(f"recherche TF-IDF   : {search_hits / len(questions) * 100:5.1f} % d'articles exacts, {search_time * 1000:.2f} ms/question")
+    print(f"index des citations: {citation_hits / len(questions) * 100:5.1f} % d'articles exacts, {citation_time * 1000:.3f} ms/question")
+
+
+def index_worker(connection, pdf_directory, index_directory, private, queries, retrieval_mode="tfidf"):
+    """
+    Processus qui imite un worker uvicorn: charge l'index, sert des recherches et lit tous
+    les passages, puis attend les commandes du benchmark ("reload" ou "stop").
+    """
+    from pdf_indexer import PDFIndexer
+
+    baseline = read_memory(os.getpid())
+    indexer = PDFIndexer(pdf_directory, index_directory=index_directory, retrieval_mode=retrieval_mode)
+    indexer.index_documents()
+    if private:
+        # Ancien fonctionnement: textes, passages et matrices recopiés dans chaque processus
+        with indexer._lock:
+            indexer._materialize()
+            indexer._warm_up()
+    for query in queries:
+        indexer.search(query)
+    for passage_id in range(len(indexer.passage_doc_ids)):
+        indexer.get_passage_text(passage_id)
+    connection.send(baseline)
+
+    while True:
+        command = connection.recv()
+        if command == "stop":
+            return
+        start = time.perf_counter()
+        reloaded = indexer.reload_if_changed(force=True)
+        connection.send((reloaded, len(indexer.passage_doc_ids), time.perf_counter() - start))
+
+
+def bench_shared_index(args):
+    """
+    Mesure la mémoire de 1, 4 et 8 workers qui chargent le même index (--retrieval-mode): copie
+    privée dans chaque processus (ancien fonctionnement) ou segments projetés en mémoire et partagés.
+    Mesure aussi le passage des workers à une nouvelle génération sans redémarrer (vérifié par
+    tests/test_index_segments.py).
+    """
+    import multiprocessing
+    from pdf_indexer import PDFIndexer
+
+    # L'index partagé est construit (ou rechargé) une fois, puis copié pour ne pas modifier index_cache
+    PDFIndexer(args.pdf_directory, retrieval_mode=args.retrieval_mode).index_documents()
+    index_directory = tempfile.mkdtemp(prefix="shared_index_bench_")
+    shutil.rmtree(index_directory)
+    shutil.copytree("index_cache", index_directory)
+    extra_document = os.path.join(index_directory, "nouveau_document.txt")
+    queries = [
+        "licenciement abusif indemnité", "divorce garde des enfants", "contrat de bail loyer",
+        "société anonyme capital", "impôt sur le revenu", "الفصل 14 من مجلة الشغل",
+    ] * 20
+    context = multiprocessing.get_context("spawn")
+
+    try:
+        results = []
+        for private in (True, False):
+            for workers in (1, 4, 8):
+                processes, connections = [], []
+                for _ in range(workers):
+                    parent, child = context.Pipe()
+                    process = context.Process(target=index_worker, args=(
+                        child, args.pdf_directory, index_directory, private, queries, args.retrieval_mode))
+                    process.start()
+                    processes.append(process)
+                    connections.append(parent)
+                baselines = [connection.recv() for connection in connections]
+                memory = [read_memory(process.pid) for process in processes]
+                results.append({
+                    "mode": "copie privée" if private else "segments partagés",
+                    "workers": workers,
+                    "rss": sum(m["rss"] for m in memory),
+                    "pss": sum(m["pss"] for m in memory),
+                    "index_pss": sum(m["pss"] - b["pss"] for m, b in zip(memory, baselines)),
+                    "uss": statistics.mean(m["uss"] for m in memory),
+                })
+
+                if not private and workers == 8:
+                    # Un worker publie une nouvelle génération: tous les autres la projettent sans redémarrer
+                    with open(extra_document, "w", encoding="utf-8") as f:
+                        f.write("Redevance zorglub due chaque mois par le preneur.\n" * 50)
+                    publisher = PDFIndexer(args.pdf_directory, index_directory=index_directory,
+                                           retrieval_mode=args.retrieval_mode)
+                    publisher.index_documents()
+                    publisher.add_document(extra_document)
+                    for connection in connections:
+                        connection.send("reload")
+                    reloads = [connection.recv() for connection in connections]
+                    reloaded_workers = sum(reloaded and passages == len(publisher.passage_doc_ids)
+                                           for reloaded, passages, _ in reloads)
+                    reload_time = max(seconds for _, _, seconds in reloads)
+
+                for connection in connections:
+                    connection.send("stop")
+                for process in processes:
+                    process.join()
+
+        print()
+        print(f"{'mode':<18} {'workers':>7} {'RSS total':>10} {'PSS total':>10} {'PSS index':>10} {'USS/worker':>11}")
+        for r in results:
+            print(f"{r['mode']:<18} {r['workers']:>7} {r['rss']:>8.0f} Mo {r['pss']:>8.0f} Mo "
+                  f"{r['index_pss']:>8.0f} Mo {r['uss']:>8.0f} Mo")
+        print(f"Nouvelle génération installée par {reloaded_workers}/8 workers sans redémarrage "
+              f"(au plus {reload_time * 1000:.1f} ms)")
+    finally:
+        shutil.rmtree(index_directory, ignore_errors=True)
+
+
+SCENARIOS = {
+    "startup": bench_startup,
+    "retrieval": bench_retrieval,
+    "bm25": bench_bm25,
+    "retrieval_cache": bench_retrieval_cache,
+    "citations": bench_citations,
+    "shared_index": bench_shared_index,
+}
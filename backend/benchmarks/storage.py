@@ -0,0 +1,260 @@
+"""
+Benchmarks du stockage: conversations (mémoire et SQLite partagé entre processus), retours
+des utilisateurs et file d'ingestion des documents téléversés
+"""
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.common import start_stub_llm_server, load_app, start_app_server
+
+
+def _sqlite_conversation_turn(task):
+    """
+    Un tour de conversation traité par un processus du pool (voir bench_conversations).
+    """
+    from conversation_store import SQLiteConversationStore
+
+    path, conversation_id, turn = task
+    store = SQLiteConversationStore({"role": "system", "content": "prompt"}, path=path)
+
+    def add_turn(conversation):
+        conversation.messages.append({"role": "user", "content": f"question {turn}"})
+        conversation.messages.append({"role": "assistant", "content": f"réponse {turn} " * 50})
+        conversation.update_last_activity()
+
+    store.update(conversation_id, add_turn)
+    return os.getpid()
+
+
+def bench_conversations(args):
+    """
+    Compare la mémoire occupée par l'ancien dictionnaire de conversations et par le stockage
+    borné après 100k sessions, puis traite les tours de conversations SQLite dans plusieurs
+    processus. Les mises à jour simultanées sont vérifiées par tests/test_conversation_store.py.
+    """
+    import tracemalloc
+    from multiprocessing import Pool
+    from conversation_store import Conversation, MemoryConversationStore, SQLiteConversationStore
+
+    system_message = {"role": "system", "content": "Tu es un assistant juridique. " * 60}
+    sessions = 100_000
+    answer = "Selon l'article 14 du Code du travail, " * 20
+
+    def run(get_or_create, save):
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(sessions):
+            conversation = get_or_create(f"session-{i}")
+            conversation.messages.append({"role": "user", "content": f"Question {i} ?"})
+            conversation.messages.append({"role": "assistant", "content": answer + str(i)})
+            conversation.update_last_activity()
+            save(conversation)
+        elapsed = time.perf_counter() - start
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, current
+
+    legacy = {}
+
+    def legacy_get_or_create(conversation_id):
+        if conversation_id not in legacy:
+            legacy[conversation_id] = Conversation(conversation_id, dict(system_message))
+        return legacy[conversation_id]
+
+    print(f"{'stockage':>10} {'sessions':>9} {'mémoire (Mo)':>13} {'tour (µs)':>10}")
+    elapsed, memory = run(legacy_get_or_create, lambda conversation: None)
+    print(f"{'ancien':>10} {len(legacy):>9} {memory / 1e6:>13.1f} {elapsed / sessions * 1e6:>10.1f}")
+    legacy.clear()
+
+    store = MemoryConversationStore(system_message, max_conversations=10_000)
+    elapsed, memory = run(store.get_or_create, store.save)
+    stats = store.stats()
+    print(f"{'mémoire':>10} {stats['sessions']:>9} {memory / 1e6:>13.1f} {elapsed / sessions * 1e6:>10.1f}"
+          f"   (evictions: {stats['evictions']}, estimation: {stats['memory_bytes'] / 1e6:.1f} Mo)")
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "conversations.db")
+        store = SQLiteConversationStore(system_message, path=path, max_conversations=10_000)
+        start = time.perf_counter()
+        for i in range(args.operations):
+            conversation = store.get_or_create(f"session-{i}")
+            conversation.messages.append({"role": "user", "content": f"Question {i} ?"})
+            conversation.messages.append({"role": "assistant", "content": answer})
+            store.save(conversation)
+        elapsed = time.perf_counter() - start
+        print(f"{'sqlite':>10} {store.stats()['sessions']:>9} {'-':>13} {elapsed / args.operations * 1e6:>10.1f}")
+
+        # Chaque tour d'une conversation est traité par un processus quelconque du pool
+        conversations, turns = 20, args.turns
+        pids = set()
+        with Pool(4) as pool:
+            for turn in range(turns):
+                tasks = [(path, f"shared-{c}", turn) for c in range(conversations)]
+                pids.update(pool.map(_sqlite_conversation_turn, tasks, chunksize=1))
+        complete = sum(
+            len(store.get_or_create(f"shared-{c}").turns) == 2 * turns for c in range(conversations)
+        )
+        print(f"SQLite partagé: {complete}/{conversations} conversations complètes "
+              f"({turns} tours traités par {len(pids)} processus)")
+    finally:
+        shutil.rmtree(directory)
+
+
+def legacy_feedback_stats(feedback_file):
+    """
+    Ancien calcul des statistiques (relecture complète du CSV), pour comparaison.
+    """
+    ratings = []
+    with open(feedback_file, "r", encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) >= 4:
+                try:
+                    ratings.append(int(parts[3]))
+                except ValueError:
+                    continue
+    return {
+        "total_feedbacks": len(ratings),
+        "average_rating": sum(ratings) / len(ratings),
+        "rating_distribution": {i: ratings.count(i) for i in range(1, 6)},
+    }
+
+
+def bench_feedback(args):
+    """
+    Compare, avec un million de retours, l'ancien journal CSV (ajout avec ouverture du fichier,
+    statistiques par relecture) au FeedbackStore (file d'écriture par lots, agrégats SQLite).
+    """
+    import random
+    from feedback_store import FeedbackStore
+
+    rows = 1_000_000
+    rng = random.Random(42)
+    languages = ["french", "arabic", "tunisian_latin", "tunisian_arabic"]
+    directory = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(directory, "feedback_log.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("timestamp,conversation_id,message_id,rating,comment\n")
+            for i in range(rows):
+                day = 1 + i * 365 // rows
+                f.write(f"2025-{1 + (day - 1) // 31 % 12:02d}-{1 + (day - 1) % 28:02d} 12:00:00,"
+                        f"conv-{rng.randrange(50_000)},{i},{rng.randint(1, 5)},commentaire\\, numéro {i}\n")
+
+        # Coût d'une soumission
+        start = time.perf_counter()
+        for i in range(args.operations):
+            with open(csv_path, "a", encoding="utf-8") as f:
+                f.write(f"2025-12-31 12:00:00,conv-1,{i},5,merci\n")
+        legacy_submit = (time.perf_counter() - start) / args.operations
+
+        start = time.perf_counter()
+        legacy_feedback_stats(csv_path)
+        legacy_stats = time.perf_counter() - start
+
+        store = FeedbackStore(os.path.join(directory, "feedback.db"))
+        start = time.perf_counter()
+        imported = store.import_csv(csv_path)
+        import_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(args.operations):
+            store.submit("conv-1", str(i), 5, "merci", rng.choice(languages))
+        submit_time = (time.perf_counter() - start) / args.operations
+        start = time.perf_counter()
+        store.flush()
+        flush_time = time.perf_counter() - start
+
+        queries = {
+            "global": {},
+            "conversation": {"conversation_id": "conv-1"},
+            "période": {"start": "2025-03-01", "end": "2025-06-30"},
+            "période + langue": {"start": "2025-03-01", "end": "2025-06-30", "language": "french"},
+            "conversation + période": {"conversation_id": "conv-1", "start": "2025-03-01"},
+        }
+        print(f"{imported} retours importés en {import_time:.1f} s")
+        print(f"soumission: ancien {legacy_submit * 1e6:.1f} µs, file {submit_time * 1e6:.1f} µs "
+              f"(+ {flush_time * 1000:.1f} ms pour écrire {args.operations} retours)")
+        print(f"statistiques ancien (relecture du CSV): {legacy_stats * 1000:.0f} ms")
+        for name, filters in queries.items():
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                stats = store.stats(**filters)
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f"statistiques {name:<24}: {elapsed * 1000:8.2f} ms ({stats['total_feedbacks']} retours)")
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_ingestion(args):
+    """
+    Compare le temps de réponse de /upload_document/ (file d'ingestion) au traitement du
+    même document dans la requête, et le délai d'indexation des documents envoyés. L'extraction
+    DOCX/TXT et la portée des documents d'une conversation sont vérifiées par
+    tests/test_ingestion_queue.py.
+    """
+    import httpx
+    from pdf_indexer import chunk_pages, extract_pdf_worker
+
+    pdf_path = max(
+        (os.path.join(args.pdf_directory, name) for name in os.listdir(args.pdf_directory) if name.endswith(".pdf")),
+        key=os.path.getsize
+    )
+    stub = start_stub_llm_server(latency=args.llm_latency)
+    app_module = load_app(stub)
+    server, base_url = start_app_server(app_module.app)
+
+    def wait_for(client, job_id):
+        while True:
+            job = client.get(f"/upload_status/{job_id}").raise_for_status().json()
+            if job["status"] in ("done", "failed"):
+                return job
+            time.sleep(0.01)
+
+    try:
+        # Ancien traitement: extraction et découpage pendant la requête
+        start = time.perf_counter()
+        result = extract_pdf_worker(pdf_path, None)
+        chunk_pages(result["pages"])
+        inline_time = time.perf_counter() - start
+
+        with httpx.Client(base_url=base_url, timeout=None) as client:
+            upload_times, jobs = [], []
+            for i in range(args.repeat):
+                with open(pdf_path, "rb") as f:
+                    start = time.perf_counter()
+                    response = client.post("/upload_document/", files={"file": (f"document-{i}.pdf", f)},
+                                           data={"conversation_id": f"bench-ingestion-{i}", "scope": "conversation"})
+                    upload_times.append(time.perf_counter() - start)
+                response.raise_for_status()
+                jobs.append(response.json()["job_id"])
+            start = time.perf_counter()
+            finished = [wait_for(client, job_id) for job_id in jobs]
+            drain_time = time.perf_counter() - start
+    finally:
+        server.should_exit = True
+        stub.shutdown()
+        for conversation_id in [f"bench-ingestion-{i}" for i in range(args.repeat)]:
+            shutil.rmtree(os.path.join("uploaded_documents", "conversations", conversation_id), ignore_errors=True)
+
+    failed = [job for job in finished if job["status"] != "done"]
+    print(f"Document: {os.path.basename(pdf_path)} ({os.path.getsize(pdf_path) / 1024:.0f} Ko, "
+          f"{finished[0]['pages']} pages, {finished[0]['passages']} passages)")
+    print(f"traitement dans la requête : {inline_time * 1000:8.1f} ms")
+    print(f"/upload_document/ (file)   : médiane {statistics.median(upload_times) * 1000:8.1f} ms, "
+          f"max {max(upload_times) * 1000:.1f} ms")
+    print(f"{args.repeat - len(failed)} documents indexés {drain_time * 1000:.0f} ms après le dernier envoi"
+          + (f", {len(failed)} en échec: {failed[0]['error']}" if failed else ""))
+
+
+SCENARIOS = {
+    "conversations": bench_conversations,
+    "feedback": bench_feedback,
+    "ingestion": bench_ingestion,
+}
@@ -0,0 +1,253 @@
+"""
+Benchmarks du traitement du texte: liens juridiques, détection de la langue, historique
+des conversations et modèles de documents
+"""
+import os
+import shutil
+import tempfile
+import time
+
+
+def legacy_enrich_text_with_links(text, tables):
+    """
+    Ancien enrichissement (un str.replace par référence), pour comparaison.
+    """
+    for table in tables:
+        for reference, link in table.items():
+            replacement = f'<a href="{link}" target="_blank" rel="noopener noreferrer">{reference}</a>'
+            text = text.replace(reference, replacement)
+    return text
+
+
+def bench_linker(args):
+    """
+    Compare le coût par réponse de l'ancien enrichissement par str.replace et de l'automate
+    LegalLinker, avec les tables actuelles puis des tables de 1k et 5k articles.
+    """
+    from legal_links_database import ARTICLE_LINKS, LEGAL_LINKS, RESOURCE_LINKS, LegalLinker
+
+    response = (
+        "Selon l'article 14 du code du travail, le licenciement doit respecter un préavis. "
+        "Le Code du travail et la loi n° 83-112 prévoient des indemnités; la sécurité sociale "
+        "(CNSS) et les syndicats peuvent accompagner le salarié. Voir aussi l'article 33 du "
+        "décret n° 97-83 et le code des obligations et des contrats.\n"
+    ) * 8
+
+    codes = ["code du travail", "code pénal", "code de commerce", "code du statut personnel",
+             "code des obligations et des contrats"]
+    print(f"{'références':>11} {'ancien (ms)':>12} {'automate (ms)':>14} {'construction (ms)':>18}")
+    for articles in (0, 1_000, 5_000):
+        generated = {
+            f"article {i // len(codes) + 1} du {codes[i % len(codes)]}": f"https://example.tn/{i}"
+            for i in range(articles)
+        }
+        tables = (ARTICLE_LINKS, generated, LEGAL_LINKS, RESOURCE_LINKS)
+        references = len(set().union(*tables))
+
+        start = time.perf_counter()
+        linker = LegalLinker(*tables)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            legacy_enrich_text_with_links(response, tables)
+        legacy_time = (time.perf_counter() - start) / args.repeat
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            linker.link(response)
+        linker_time = (time.perf_counter() - start) / args.repeat
+
+        print(f"{references:>11} {legacy_time * 1000:>12.2f} {linker_time * 1000:>14.2f} "
+              f"{build_time * 1000:>18.1f}")
+    print(f"(réponse de {len(response)} caractères)")
+
+
+LEGACY_TUNISIAN_MARKERS = [
+    "chneya", "شنية", "kifech", "كيفاش", "3la", "على", "fi", "في", "enti", "انتي",
+    "ena", "انا", "mte3", "متاع", "barcha", "برشا", "yezzi", "يزي", "tawa", "توا",
+    "chkoun", "شكون", "waqteh", "وقتاه", "lahna", "لهنا", "fama", "فما", "mech", "مش",
+    "bellehi", "بالهي", "ya3tik", "يعطيك", "sahbi", "صاحبي", "3andi", "عندي",
+    "9oli", "قولي", "7aja", "حاجة", "barcha", "برشا", "3lech", "علاش", "chnowa", "شنوة",
+    "bech", "باش", "ma3neha", "معناها", "khalini", "خليني", "na3ref", "نعرف",
+    "lazem", "لازم", "mawjoud", "موجود", "9anoun", "قانون", "7a9", "حق", "chghol", "شغل"
+]
+
+
+def legacy_detect_language(text):
+    """
+    Anciens détecteurs (regex recompilée à chaque appel, puis une recherche par marqueur
+    tunisien), pour comparaison.
+    """
+    import re
+    arabic = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF]+').search(text)
+    lower_text = text.lower()
+    tunisian = sum(marker in lower_text for marker in LEGACY_TUNISIAN_MARKERS) >= 2
+    return "arabic" if arabic else "french", "tunisian" if tunisian else "french"
+
+
+def bench_language(args):
+    """
+    Mesure le débit (textes par seconde) des anciens détecteurs et de identify_language
+    sur des questions courtes et des réponses longues, et celui de detect_many.
+    """
+    from language_detector import detect_many, identify_language
+
+    samples = {
+        "questions": [
+            "Quels sont mes droits en cas de licenciement abusif ?",
+            "ما هي حقوقي في حالة الطرد التعسفي؟",
+            "chneya el 7a9 mte3i ki ytard3ouni mel khedma",
+            "شنية حقي كيفاش نعمل باش نشكي",
+        ],
+        "réponses": [
+            "Selon l'article 14 du Code du travail, le licenciement doit reposer sur une cause "
+            "réelle et sérieuse. Le salarié peut saisir le conseil de prud'hommes. " * 20,
+            "وفقا للفصل 14 من مجلة الشغل، يجب أن يستند الطرد إلى سبب حقيقي وجدي. " * 20,
+        ],
+    }
+    operations = args.operations * 10
+    print(f"{'textes':>10} {'anciens (textes/s)':>19} {'nouveau (textes/s)':>19}")
+    for name, texts in samples.items():
+        batch = [texts[i % len(texts)] for i in range(operations)]
+
+        start = time.perf_counter()
+        for text in batch:
+            legacy_detect_language(text)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for text in batch:
+            identify_language(text)
+        new_time = time.perf_counter() - start
+
+        print(f"{name:>10} {operations / legacy_time:>19,.0f} {operations / new_time:>19,.0f}")
+
+    batch = [samples["questions"][i % 4] for i in range(operations)]
+    start = time.perf_counter()
+    labels = detect_many(batch)
+    elapsed = time.perf_counter() - start
+    print(f"detect_many: {operations} questions en {elapsed * 1000:.1f} ms "
+          f"({operations / elapsed:,.0f} textes/s) -> {sorted(set(labels))}")
+
+
+def bench_history(args):
+    """
+    Compare, au fil d'une longue conversation, les tokens envoyés et le coût de préparation
+    du prompt: historique complet (ancien comportement), recomptage complet à chaque tour,
+    et HistoryManager (comptage des seuls nouveaux messages).
+    """
+    from conversation_store import Conversation
+    from history_manager import HistoryManager, load_token_counter
+
+    count_tokens = load_token_counter()
+    system_message = {"role": "system", "content": "Tu es un assistant juridique. " * 60}
+    manager = HistoryManager(system_message, token_budget=4096, summary_budget=512, count_tokens=count_tokens)
+    question = "Quelles sont les indemnités prévues en cas de licenciement abusif ? "
+    answer = "Selon l'article 23 bis du Code du travail, le salarié a droit à des dommages-intérêts. " * 15
+
+    turns = args.operations
+    legacy, recount, incremental = Conversation("legacy", system_message), [], Conversation("new", system_message)
+    checkpoints = {10, 100, turns}
+    print(f"{'tour':>6} {'tokens envoyés (ancien)':>24} {'tokens envoyés (budget)':>24} "
+          f"{'recomptage (ms)':>16} {'incrémental (ms)':>17}")
+    for turn in range(1, turns + 1):
+        message = {"role": "user", "content": f"{question} ({turn})"}
+
+        legacy.messages.append(message)
+        legacy_messages = list(legacy.messages)
+
+        # Recomptage de tout l'historique à chaque tour, puis sélection des messages les plus récents
+        start = time.perf_counter()
+        recount.append(message)
+        total, kept = manager.system_tokens, 0
+        for tokens in reversed([manager.message_tokens(m) for m in recount]):
+            if kept and total + tokens > manager.token_budget:
+                break
+            total, kept = total + tokens, kept + 1
+        recount_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        incremental.messages.append(message)
+        manager.trim(incremental)
+        messages = manager.build_messages(incremental)
+        incremental_time = time.perf_counter() - start
+
+        if turn in checkpoints:
+            legacy_tokens = sum(manager.message_tokens(m) for m in legacy_messages)
+            sent_tokens = sum(manager.message_tokens(m) for m in messages)
+            print(f"{turn:>6} {legacy_tokens:>24} {sent_tokens:>24} "
+                  f"{recount_time * 1000:>16.3f} {incremental_time * 1000:>17.3f}")
+
+        reply = {"role": "assistant", "content": answer}
+        legacy.messages.append(reply)
+        recount.append(reply)
+        incremental.messages.append(reply)
+
+
+def legacy_render_template(template_file, parameters):
+    """
+    Ancienne génération: lecture du modèle à chaque requête et un remplacement par paramètre.
+    """
+    with open(template_file, "r", encoding="utf-8") as f:
+        template = f.read()
+    for key, value in parameters.items():
+        template = template.replace(f"{{{{{key}}}}}", str(value))
+    return template
+
+
+def bench_templates(args):
+    """
+    Compare le remplissage d'une mise en demeure (ancien: lecture et remplacements successifs,
+    nouveau: modèle compilé en cache) et mesure la génération d'un lot de 500 documents en zip.
+    Le rendu et l'archive sont vérifiés par tests/test_template_engine.py.
+    """
+    from template_engine import TemplateStore, write_batch_zip
+
+    names = ["creancier_nom", "creancier_adresse", "debiteur_nom", "debiteur_adresse", "montant",
+             "date_echeance", "objet", "delai_jours", "ville", "date", "reference", "avocat_nom"]
+    body = "\n".join(f"Paragraphe {i}: " + "texte fixe de la lettre de mise en demeure. " * 6
+                     + f"{{{{{names[i % len(names)]}}}}}" for i in range(40))
+    directory = tempfile.mkdtemp()
+    try:
+        template_file = os.path.join(directory, "lettre_mise_en_demeure_fr.txt")
+        with open(template_file, "w", encoding="utf-8") as f:
+            f.write(body)
+        parameters = {name: f"valeur de {name}" for name in names}
+        store = TemplateStore(directory)
+
+        start = time.perf_counter()
+        for _ in range(args.operations):
+            legacy_render_template(template_file, parameters)
+        legacy_time = (time.perf_counter() - start) / args.operations
+        start = time.perf_counter()
+        for _ in range(args.operations):
+            store.get("lettre_mise_en_demeure", "fr").render(parameters)
+        compiled_time = (time.perf_counter() - start) / args.operations
+
+        batch = [{**parameters, "reference": f"MED-{i}"} for i in range(500)]
+        start = time.perf_counter()
+        for i, document in enumerate(batch):
+            with open(os.path.join(directory, f"legacy_{i}.txt"), "w", encoding="utf-8") as f:
+                f.write(legacy_render_template(template_file, document))
+        legacy_batch = time.perf_counter() - start
+        zip_path = os.path.join(directory, "lot.zip")
+        start = time.perf_counter()
+        report = write_batch_zip(zip_path, store.get("lettre_mise_en_demeure", "fr"), batch, "med")
+        batch_time = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"Modèle: {len(body) / 1024:.1f} Ko, {len(names)} paramètres")
+    print(f"ancien (lecture + remplacements): {legacy_time * 1e6:8.1f} µs/document")
+    print(f"modèle compilé en cache         : {compiled_time * 1e6:8.1f} µs/document")
+    print(f"lot de 500: ancien (500 fichiers) {legacy_batch * 1000:.0f} ms, "
+          f"zip {batch_time * 1000:.0f} ms ({len(report)} documents)")
+
+
+SCENARIOS = {
+    "linker": bench_linker,
+    "language": bench_language,
+    "history": bench_history,
+    "templates": bench_templates,
+}
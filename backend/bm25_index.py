@@ -0,0 +1,116 @@
+"""
+Index inversé BM25 sur les passages des documents juridiques
+"""
+from typing import Iterable, List, Mapping, Tuple
+
+import numpy as np
+
+from pdf_indexer import INDEX_STOPWORDS
+
+# Les mots d'un caractère (numéros d'articles "5", "9") sont conservés, contrairement au TF-IDF
+TOKEN_PATTERN = r"(?u)\b\w+\b"
+
+
+def _build_vectorizer():
+    # Import différé: scikit-learn n'est chargé qu'à la construction du premier index
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    return CountVectorizer(
+        lowercase=True,
+        strip_accents="unicode",
+        stop_words=INDEX_STOPWORDS,
+        token_pattern=TOKEN_PATTERN,
+        dtype=np.float32
+    )
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialise l'index BM25.
+
+        Args:
+            k1: Saturation de la fréquence des termes
+            b: Normalisation par la longueur des passages
+        """
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        self.analyzer = None
+        # Listes de postings: la colonne t contient les passages où apparaît le terme t et,
+        # pour chacun, le nombre d'occurrences du terme. Les poids BM25 sont calculés à la
+        # recherche, pour les seuls termes de la requête: les tableaux peuvent être projetés
+        # en mémoire depuis un segment d'index (voir from_arrays)
+        self.postings = None
+        self.lengths = np.empty(0, dtype=np.float32)  # Nombre de termes de chaque passage
+        self.average_length = 1.0
+
+    @classmethod
+    def from_arrays(cls, vocabulary: Mapping[str, int], postings, lengths: np.ndarray,
+                    k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """
+        Crée un index à partir de tableaux déjà calculés (par build), sans les recopier.
+
+        Args:
+            vocabulary: Terme -> colonne des postings
+            postings: Matrice creuse CSC passages x termes des nombres d'occurrences
+            lengths: Nombre de termes de chaque passage
+        """
+        index = cls(k1, b)
+        index.vocabulary = vocabulary
+        index.analyzer = _build_vectorizer().build_analyzer()
+        index.postings = postings
+        index.lengths = lengths
+        index.average_length = float(lengths.mean()) if len(lengths) else 1.0
+        return index
+
+    def build(self, texts: Iterable[str]) -> None:
+        """
+        Construit l'index à partir des textes des passages.
+
+        Contrairement au vectoriseur TF-IDF, aucun terme n'est écarté pour sa rareté:
+        les références exactes ("83-112", "licenciement") restent interrogeables.
+        """
+        vectorizer = _build_vectorizer()
+        counts = vectorizer.fit_transform(texts).tocsr()
+        self.lengths = np.asarray(counts.sum(axis=1), dtype=np.float32).ravel()
+        self.average_length = float(self.lengths.mean()) if len(self.lengths) else 1.0
+        self.postings = counts.tocsc()
+        self.postings.sort_indices()
+        self.vocabulary = vectorizer.vocabulary_
+        self.analyzer = vectorizer.build_analyzer()
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """
+        Recherche les passages de meilleur score BM25. Seules les listes de postings des
+        termes de la requête sont parcourues.
+
+        Returns:
+            La liste des (indice du passage, score) par score décroissant
+        """
+        if self.postings is None:
+            return []
+        terms = {self.vocabulary[token] for token in self.analyzer(query) if token in self.vocabulary}
+        if not terms:
+            return []
+
+        passage_count = self.postings.shape[0]
+        indptr = self.postings.indptr
+        rows, weights = [], []
+        for t in terms:
+            start, end = indptr[t], indptr[t + 1]
+            passages = self.postings.indices[start:end]
+            tf = self.postings.data[start:end].astype(np.float64)
+            # idf * tf saturé et normalisé par la longueur du passage
+            idf = np.log1p((passage_count - (end - start) + 0.5) / ((end - start) + 0.5))
+            length_norm = self.k1 * (1 - self.b + self.b * self.lengths[passages] / self.average_length)
+            rows.append(passages)
+            weights.append(idf * tf * (self.k1 + 1) / (tf + length_norm))
+        passages, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            passages, scores = passages[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(passages[i]), float(scores[i])) for i in order]
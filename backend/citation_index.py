@@ -0,0 +1,338 @@
+"""
+Index des citations d'articles: chaque code du corpus est découpé en articles à
+l'indexation, et une question qui cite "l'article 14 du code du travail" (ou "الفصل 14 من
+مجلة الشغل") reçoit directement le texte de l'article, sans recherche vectorielle
+"""
+import os
+import re
+import bisect
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Codes reconnus: nom de référence (celui de LEGAL_LINKS quand il existe), autres noms
+# français et arabes, et fragments du nom de fichier (sans accents) des documents du code
+CODES = {
+    "code du travail": {
+        "aliases": ["code de travail", "مجلة الشغل"],
+        "files": ["code du travail", "codedetravail"],
+    },
+    "code des obligations et des contrats": {
+        "aliases": ["coc", "مجلة الالتزامات والعقود", "مجلة الالتزامات و العقود"],
+        "files": ["obligations et des contrats"],
+    },
+    "code de commerce": {
+        "aliases": ["المجلة التجارية"],
+        "files": ["code 2010 commerce"],
+    },
+    "code des sociétés commerciales": {
+        "aliases": ["code des societes", "مجلة الشركات التجارية"],
+        "files": ["code societes"],
+    },
+    "code pénal": {
+        "aliases": ["المجلة الجزائية"],
+        "files": ["code 2011 penal"],
+    },
+    "code de procédure pénale": {
+        "aliases": ["مجلة الإجراءات الجزائية", "مجلة الاجراءات الجزائية"],
+        "files": ["procedure penale"],
+    },
+    "code de procédure civile": {
+        "aliases": ["code de procédure civile et commerciale", "مجلة المرافعات المدنية والتجارية"],
+        "files": ["procedure civile"],
+    },
+    "code des droits réels": {
+        "aliases": ["مجلة الحقوق العينية"],
+        "files": ["droits reels"],
+    },
+    "code du statut personnel": {
+        "aliases": ["csp", "مجلة الأحوال الشخصية", "مجلة الاحوال الشخصية"],
+        "files": ["statut personnel"],
+    },
+    "code de droit international privé": {
+        "aliases": ["مجلة القانون الدولي الخاص"],
+        "files": ["droit international prive"],
+    },
+    "code de l'arbitrage": {
+        "aliases": ["مجلة التحكيم"],
+        "files": ["code 2017 arbitrage"],
+    },
+    "code des douanes": {
+        "aliases": ["مجلة الديوانة"],
+        "files": ["code 2017 douanes"],
+    },
+    "code de la route": {
+        "aliases": ["مجلة الطرقات"],
+        "files": ["code 2017 route"],
+    },
+    "code forestier": {
+        "aliases": ["مجلة الغابات"],
+        "files": ["code 2017 forestier"],
+    },
+    "code de la nationalité": {
+        "aliases": ["مجلة الجنسية"],
+        "files": ["code nationalite"],
+    },
+    "code des assurances": {
+        "aliases": ["مجلة التأمين"],
+        "files": ["code assurance"],
+    },
+    "code de la protection de l'enfant": {
+        "aliases": ["مجلة حماية الطفل"],
+        "files": ["protection de l enfance"],
+    },
+}
+
+# Taille maximale du texte conservé pour un article
+MAX_ARTICLE_CHARS = 6000
+
+# En-tête d'article en début de ligne: "Article 14", "Art. 6-2", "Article 5 bis", "Article premier", "الفصل 5"
+ARTICLE_HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?:(?:article|art\.)[ \t]*(\d+|premier|1er)(?:[ \t]*(-[ \t]*\d+|bis|ter|quater|quinquies)\b)?"
+    r"|الفصل[ \t]+(\d+)(?:[ \t]+(مكرر|ثالثا|رابعا))?)",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Début de chapitre: "Livre", "Titre", "Chapitre", "Section", "الباب", "القسم", "العنوان", "الكتاب"
+CHAPTER_HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?:livre|titre|chapitre|section|sous-section|الباب|القسم|العنوان|الكتاب)\b[^\n]*",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Citation dans une question: "article 14 du code du travail", "art. 6-2 du CSP", "الفصل 5 من مجلة الشغل"
+CITATION_PATTERN = re.compile(
+    r"(?:\b(?:article|art\.?)[ \t]*(\d+|premier|1er)(?:[ \t]*(-[ \t]*\d+|bis|ter|quater|quinquies)\b)?"
+    r"[ \t,]+(?:(?:du|de[ \t]+la|de[ \t]+l['’]|des|de)[ \t]*)?"
+    r"|الفصل[ \t]+(?:عدد[ \t]+)?(\d+)(?:[ \t]+(مكرر|ثالثا|رابعا))?[ \t]+(?:من[ \t]+)?)",
+    re.IGNORECASE
+)
+
+_ARABIC_SUFFIXES = {"مكرر": "bis", "ثالثا": "ter", "رابعا": "quater"}
+
+
+def fold(text: str) -> str:
+    """
+    Minuscules sans accents ni ponctuation répétée, pour comparer des noms de code et de fichier.
+    """
+    text = unicodedata.normalize("NFKD", text.lower().replace("’", "'"))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w']+", " ", text).split())
+
+
+def article_number(number: str, suffix: Optional[str] = None) -> str:
+    """
+    Numéro d'article normalisé: "premier" -> "1", ("6", "- 2") -> "6-2", ("5", "Bis") -> "5 bis".
+    """
+    number = "1" if number.lower() in ("premier", "1er") else str(int(number))
+    if not suffix:
+        return number
+    suffix = _ARABIC_SUFFIXES.get(suffix, suffix)
+    if suffix.startswith("-"):
+        return f"{number}-{int(suffix[1:].strip())}"
+    return f"{number} {suffix.lower()}"
+
+
+_SUFFIX_ORDER = {"bis": 2, "ter": 3, "quater": 4, "quinquies": 5}
+
+
+def _article_order(article: str) -> Tuple[int, int]:
+    # "6" < "6 bis" / "6-2" < "6 ter" / "6-3" < "7"
+    number, _, suffix = article.replace("-", " ").partition(" ")
+    if not suffix:
+        return int(number), 0
+    return int(number), int(suffix) if suffix.isdigit() else _SUFFIX_ORDER[suffix]
+
+
+def code_for_file(path: str) -> Optional[str]:
+    """
+    Retourne le code dont le fichier contient le texte (d'après son nom), ou None.
+    """
+    name = fold(os.path.splitext(os.path.basename(path))[0].replace("_", " ").replace("-", " "))
+    for code, entry in CODES.items():
+        if any(fragment in name for fragment in entry["files"]):
+            return code
+    return None
+
+
+def extract_articles(text: str) -> List[Tuple[str, int, int, str]]:
+    """
+    Découpe le texte d'un code en articles.
+
+    La loi de promulgation qui précède souvent un code a ses propres articles 1, 2...: la
+    numérotation qui repart de 1 ouvre un nouveau segment, et seul le segment le plus long
+    (le corps du code) est retenu. Dans un segment, un en-tête dont le numéro recule est un
+    renvoi en début de ligne, pas un nouvel article.
+
+    Returns:
+        La liste des (numéro normalisé, début, fin, chapitre) de chaque article
+    """
+    chapters = [(match.start(), match.group(0).strip()) for match in CHAPTER_HEADING_PATTERN.finditer(text)]
+    chapter_starts = [start for start, _ in chapters]
+
+    segments, current, last = [], [], None
+    for match in ARTICLE_HEADING_PATTERN.finditer(text):
+        if match.group(1) is not None:
+            article = article_number(match.group(1), match.group(2))
+        else:
+            article = article_number(match.group(3), match.group(4))
+        order = _article_order(article)
+        if order == (1, 0) and current:
+            segments.append(current)
+            current, last = [], None
+        if last is not None and order <= last:
+            continue
+        current.append((article, match.start()))
+        last = order
+    if current:
+        segments.append(current)
+    if not segments:
+        return []
+
+    body = max(segments, key=len)
+    articles = []
+    for index, (article, start) in enumerate(body):
+        end = body[index + 1][1] if index + 1 < len(body) else len(text)
+        # Un changement de chapitre termine aussi l'article
+        chapter_index = bisect.bisect_right(chapter_starts, start)
+        if chapter_index < len(chapter_starts) and chapter_starts[chapter_index] < end:
+            end = chapter_starts[chapter_index]
+        end = min(end, start + MAX_ARTICLE_CHARS)
+        chapter = chapters[chapter_index - 1][1] if chapter_index else ""
+        articles.append((article, start, end, chapter))
+    return articles
+
+
+class CitationIndex:
+    def __init__(self):
+        # (code, numéro) -> {"path", "content", "pages", "chapter"}
+        self.articles: Dict[Tuple[str, str], Dict] = {}
+        self.documents: Dict[str, str] = {}  # Chemin -> code des documents découpés
+        self._lock = threading.Lock()
+
+        # Noms de code (normalisés) -> code, du plus long au plus court
+        names = {}
+        for code, entry in CODES.items():
+            for name in [code] + entry["aliases"]:
+                names[fold(name)] = code
+        self._names = sorted(names.items(), key=lambda item: len(item[0]), reverse=True)
+
+    @staticmethod
+    def _extract(code: str, path: str, pages: List[str]) -> Dict[Tuple[str, str], Dict]:
+        offsets = []
+        position = 0
+        for page in pages:
+            offsets.append(position)
+            position += len(page) + 2
+        text = "".join(page + "\n\n" for page in pages)
+
+        articles = {}
+        for article, start, end, chapter in extract_articles(text):
+            articles[(code, article)] = {
+                "path": path,
+                "content": text[start:end].strip(),
+                "pages": (bisect.bisect_right(offsets, start), bisect.bisect_right(offsets, end - 1)),
+                "chapter": chapter,
+            }
+        return articles
+
+    def build(self, documents: Iterable[Tuple[str, List[str]]]) -> int:
+        """
+        Reconstruit l'index à partir des documents indexés. Quand plusieurs documents
+        contiennent le même code, le premier (par chemin) qui a l'article l'emporte.
+
+        Args:
+            documents: (chemin, texte de chaque page) des documents
+
+        Returns:
+            Le nombre d'articles indexés
+        """
+        articles, paths = {}, {}
+        for path, pages in sorted(documents, key=lambda document: document[0]):
+            code = code_for_file(path)
+            if code is None:
+                continue
+            extracted = self._extract(code, path, pages)
+            if extracted:
+                paths[path] = code
+                for key, entry in extracted.items():
+                    articles.setdefault(key, entry)
+        with self._lock:
+            self.articles = articles
+            self.documents = paths
+        return len(articles)
+
+    def find_citations(self, query: str) -> List[Tuple[str, str]]:
+        """
+        Retourne les (code, numéro d'article) cités explicitement dans la question, dans
+        l'ordre, sans doublon.
+        """
+        citations = []
+        for match in CITATION_PATTERN.finditer(query):
+            if match.group(1) is not None:
+                article = article_number(match.group(1), match.group(2))
+            else:
+                article = article_number(match.group(3), match.group(4))
+            rest = fold(query[match.end():match.end() + 80])
+            for name, code in self._names:
+                if rest.startswith(name) and (len(rest) == len(name) or not rest[len(name)].isalnum()):
+                    if (code, article) not in citations:
+                        citations.append((code, article))
+                    break
+        return citations
+
+    def lookup(self, code: str, article: str) -> Optional[Dict]:
+        with self._lock:
+            return self.articles.get((code, article))
+
+    def lookup_query(self, query: str) -> Tuple[List[Dict], int]:
+        """
+        Cherche les articles cités dans la question.
+
+        Returns:
+            (articles trouvés au format de PDFIndexer.search, nombre de citations détectées)
+        """
+        citations = self.find_citations(query)
+        results = []
+        for code, article in citations:
+            entry = self.lookup(code, article)
+            if entry is not None:
+                results.append({
+                    "path": entry["path"],
+                    "content": entry["content"],
+                    "pages": entry["pages"],
+                    "score": 1.0,
+                })
+        return results, len(citations)
+
+    def article_links(self, code_links: Dict[str, str], anchors: Dict[str, str]) -> Dict[str, str]:
+        """
+        Génère les liens "article N du code X" (et "الفصل N من مجلة ...") des articles
+        indexés, pour les codes dont le lien figure dans code_links. Le lien pointe sur
+        l'article pour les codes dont le format d'ancre est connu, sinon sur le texte du code.
+
+        Args:
+            code_links: Code -> lien de son texte (LEGAL_LINKS)
+            anchors: Code -> format de l'ancre d'un article (ARTICLE_ANCHORS)
+        """
+        with self._lock:
+            keys = list(self.articles)
+        links = {}
+        for code, article in keys:
+            base = code_links.get(code)
+            if base is None:
+                continue
+            anchor = anchors.get(code)
+            link = base + anchor.format(article=article.replace(" ", "-")) if anchor else base
+            links[f"article {article} du {code}"] = link
+            if article.isdigit():
+                for alias in CODES[code]["aliases"]:
+                    if alias.startswith(("مجلة", "المجلة")):
+                        links[f"الفصل {article} من {alias}"] = link
+        return links
+
+    def stats(self) -> Dict:
+        with self._lock:
+            codes = {}
+            for code, _ in self.articles:
+                codes[code] = codes.get(code, 0) + 1
+            return {"articles": len(self.articles), "documents": len(self.documents), "by_code": codes}
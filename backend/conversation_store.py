@@ -0,0 +1,396 @@
+"""
+Stockage des conversations: capacité bornée, suppression des sessions inactives et
+backend au choix (mémoire du processus ou base SQLite partagée entre workers)
+"""
+import sys
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Conversation:
+    def __init__(self, conversation_id: str, system_message: Dict[str, str],
+                 turns: Optional[List[Dict[str, str]]] = None, last_activity: Optional[float] = None,
+                 history: Optional[Dict[str, Any]] = None):
+        """
+        Initialise une conversation.
+
+        Args:
+            conversation_id: Identifiant de la conversation
+            system_message: Message système, partagé par référence entre toutes les conversations
+            turns: Messages échangés (sans le message système)
+            last_activity: Date de la dernière activité (maintenant par défaut)
+            history: État de la fenêtre d'historique (voir history_state)
+        """
+        self.conversation_id = conversation_id
+        self.messages: List[Dict[str, str]] = [system_message] + (turns or [])
+        self.last_activity: float = last_activity if last_activity is not None else time.time()
+
+        # Fenêtre d'historique (history_manager): tokens de chaque message déjà compté,
+        # résumé des messages supprimés et nombre de messages supprimés
+        history = history or {}
+        self.token_counts: List[int] = history.get("token_counts", [])
+        self.history_tokens: int = sum(self.token_counts)
+        self.summary: str = history.get("summary", "")
+        self.summary_tokens: int = history.get("summary_tokens", 0)
+        self.dropped_messages: int = history.get("dropped_messages", 0)
+        # Version des documents téléversés dans la conversation, lue au début de chaque tour
+        # (hors de la boucle d'événements, voir app.start_chat_turn); non enregistrée
+        self.scope_version: int = 0
+
+    @property
+    def turns(self) -> List[Dict[str, str]]:
+        return self.messages[1:]
+
+    def history_state(self) -> Dict[str, Any]:
+        return {
+            "token_counts": self.token_counts,
+            "summary": self.summary,
+            "summary_tokens": self.summary_tokens,
+            "dropped_messages": self.dropped_messages,
+        }
+
+    def update_last_activity(self):
+        self.last_activity = time.time()
+
+    def approximate_bytes(self) -> int:
+        """
+        Taille mémoire approximative de la conversation, message système partagé exclu.
+        """
+        size = (sys.getsizeof(self) + sys.getsizeof(self.messages) + sys.getsizeof(self.token_counts)
+                + sys.getsizeof(self.summary))
+        for message in self.turns:
+            size += sys.getsizeof(message) + sum(sys.getsizeof(value) for value in message.values())
+        return size
+
+
+class ConversationStore:
+    """
+    Interface commune des backends: get, get_or_create, update, save, delete, sweep et stats.
+    """
+
+    def __init__(self, system_message: Dict[str, str], max_conversations: int = 10000,
+                 idle_timeout: float = 3600):
+        """
+        Args:
+            system_message: Message système ajouté en tête de chaque conversation
+            max_conversations: Nombre maximum de conversations conservées (les moins récemment
+                utilisées sont supprimées)
+            idle_timeout: Durée d'inactivité en secondes au-delà de laquelle une conversation expire
+        """
+        self.system_message = system_message
+        self.max_conversations = max_conversations
+        self.idle_timeout = idle_timeout
+        self.evictions = 0
+        self.expirations = 0
+        self._sweeper = None
+        self._stop_sweeper = threading.Event()
+
+    def _is_expired(self, last_activity: float, now: float) -> bool:
+        return now - last_activity > self.idle_timeout
+
+    def new_conversation(self, conversation_id: str) -> Conversation:
+        return Conversation(conversation_id, self.system_message)
+
+    def start_sweeper(self, interval: float = 60) -> None:
+        """
+        Lance un thread qui supprime périodiquement les conversations inactives.
+        """
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while not self._stop_sweeper.wait(interval):
+                try:
+                    removed = self.sweep()
+                    if removed:
+                        print(f"{removed} conversation(s) inactive(s) supprimée(s)")
+                except Exception as e:
+                    print(f"Erreur lors du nettoyage des conversations: {str(e)}")
+
+        self._sweeper = threading.Thread(target=run, name="conversation-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        self._stop_sweeper.set()
+
+
+class MemoryConversationStore(ConversationStore):
+    """
+    Conversations en mémoire du processus, dans un OrderedDict ordonné du moins au plus
+    récemment utilisé.
+    """
+
+    def __init__(self, system_message: Dict[str, str], max_conversations: int = 10000,
+                 idle_timeout: float = 3600):
+        super().__init__(system_message, max_conversations, idle_timeout)
+        self.conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        """
+        Retourne la conversation si elle existe et n'a pas expiré, sans la créer.
+        """
+        with self._lock:
+            conversation = self.conversations.get(conversation_id)
+        if conversation is None or self._is_expired(conversation.last_activity, time.time()):
+            return None
+        return conversation
+
+    def _get_or_create(self, conversation_id: str) -> Conversation:
+        # Appelée avec self._lock
+        conversation = self.conversations.get(conversation_id)
+        if conversation is not None and self._is_expired(conversation.last_activity, time.time()):
+            del self.conversations[conversation_id]
+            self.expirations += 1
+            conversation = None
+        if conversation is None:
+            conversation = self.new_conversation(conversation_id)
+            self.conversations[conversation_id] = conversation
+            while len(self.conversations) > self.max_conversations:
+                self.conversations.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.conversations.move_to_end(conversation_id)
+        return conversation
+
+    def get_or_create(self, conversation_id: str) -> Conversation:
+        """
+        Retourne la conversation, ou une nouvelle conversation si elle n'existe pas ou a expiré.
+        """
+        with self._lock:
+            return self._get_or_create(conversation_id)
+
+    def update(self, conversation_id: str, change: Callable[[Conversation], None]) -> Conversation:
+        """
+        Applique change à la conversation (créée si elle n'existe pas ou a expiré) sous le
+        verrou du stockage: deux tours simultanés de la même conversation ne s'entremêlent pas.
+
+        Returns:
+            La conversation modifiée
+        """
+        with self._lock:
+            conversation = self._get_or_create(conversation_id)
+            change(conversation)
+            return conversation
+
+    def save(self, conversation: Conversation) -> None:
+        # Les conversations en mémoire sont modifiées en place: seul l'ordre LRU est mis à jour
+        with self._lock:
+            if conversation.conversation_id in self.conversations:
+                self.conversations.move_to_end(conversation.conversation_id)
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            self.conversations.pop(conversation_id, None)
+
+    def sweep(self) -> int:
+        """
+        Supprime les conversations inactives.
+
+        Returns:
+            Le nombre de conversations supprimées
+        """
+        now = time.time()
+        with self._lock:
+            expired = [
+                conversation_id for conversation_id, conversation in self.conversations.items()
+                if self._is_expired(conversation.last_activity, now)
+            ]
+            for conversation_id in expired:
+                del self.conversations[conversation_id]
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conversations = list(self.conversations.values())
+        return {
+            "backend": "memory",
+            "sessions": len(conversations),
+            "max_sessions": self.max_conversations,
+            "messages": sum(len(conversation.messages) - 1 for conversation in conversations),
+            "memory_bytes": sum(conversation.approximate_bytes() for conversation in conversations),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Conversations dans une base SQLite en mode WAL, partagée par tous les workers uvicorn:
+    chaque requête relit la conversation et chaque tour l'enregistre. Le nombre de
+    conversations est tenu à jour par des triggers (table conversation_count), sans COUNT(*)
+    à chaque enregistrement.
+    """
+
+    def __init__(self, system_message: Dict[str, str], path: str = "conversations.db",
+                 max_conversations: int = 10000, idle_timeout: float = 3600):
+        super().__init__(system_message, max_conversations, idle_timeout)
+        self.path = path
+        self._local = threading.local()
+        connection = self._connect()
+        with connection:
+            # Un seul worker crée le schéma et initialise le compteur
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id TEXT PRIMARY KEY, turns TEXT NOT NULL, last_activity REAL NOT NULL, history TEXT)"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(conversations)")}
+            if "history" not in columns:
+                connection.execute("ALTER TABLE conversations ADD COLUMN history TEXT")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS conversations_last_activity ON conversations (last_activity)"
+            )
+            if connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'conversation_count'"
+            ).fetchone() is None:
+                connection.execute("CREATE TABLE conversation_count (n INTEGER NOT NULL)")
+                connection.execute("INSERT INTO conversation_count SELECT COUNT(*) FROM conversations")
+                connection.execute(
+                    "CREATE TRIGGER conversations_inserted AFTER INSERT ON conversations "
+                    "BEGIN UPDATE conversation_count SET n = n + 1; END"
+                )
+                connection.execute(
+                    "CREATE TRIGGER conversations_deleted AFTER DELETE ON conversations "
+                    "BEGIN UPDATE conversation_count SET n = n - 1; END"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Une connexion par thread (boucle d'événements, threads du serveur, nettoyage)
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _read(self, connection: sqlite3.Connection, conversation_id: str) -> Optional[Conversation]:
+        row = connection.execute(
+            "SELECT turns, last_activity, history FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        turns, last_activity, history = row
+        if self._is_expired(last_activity, time.time()):
+            connection.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+            self.expirations += 1
+            return None
+        return Conversation(conversation_id, self.system_message, json.loads(turns), last_activity,
+                            json.loads(history) if history else None)
+
+    def _write(self, connection: sqlite3.Connection, conversation: Conversation) -> None:
+        connection.execute(
+            "INSERT INTO conversations (id, turns, last_activity, history) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET turns = excluded.turns, last_activity = excluded.last_activity, "
+            "history = excluded.history",
+            (conversation.conversation_id, json.dumps(conversation.turns, ensure_ascii=False),
+             conversation.last_activity, json.dumps(conversation.history_state(), ensure_ascii=False))
+        )
+        excess = connection.execute("SELECT n FROM conversation_count").fetchone()[0] - self.max_conversations
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM conversations WHERE id IN "
+                "(SELECT id FROM conversations ORDER BY last_activity LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        """
+        Retourne la conversation si elle existe et n'a pas expiré, sans la créer.
+        """
+        with self._connect() as connection:
+            return self._read(connection, conversation_id)
+
+    def get_or_create(self, conversation_id: str) -> Conversation:
+        """
+        Retourne la conversation, ou une nouvelle conversation si elle n'existe pas ou a expiré.
+        """
+        return self.get(conversation_id) or self.new_conversation(conversation_id)
+
+    def update(self, conversation_id: str, change: Callable[[Conversation], None]) -> Conversation:
+        """
+        Relit la conversation (créée si elle n'existe pas ou a expiré), lui applique change et
+        l'enregistre dans une seule transaction: deux tours simultanés de la même conversation,
+        dans deux workers, ne s'écrasent pas.
+
+        Returns:
+            La conversation modifiée
+        """
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            conversation = self._read(connection, conversation_id) or self.new_conversation(conversation_id)
+            change(conversation)
+            self._write(connection, conversation)
+        return conversation
+
+    def save(self, conversation: Conversation) -> None:
+        """
+        Enregistre la conversation (sans le message système) et supprime les plus anciennes
+        au-delà de la capacité.
+        """
+        with self._connect() as connection:
+            self._write(connection, conversation)
+
+    def delete(self, conversation_id: str) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    def sweep(self) -> int:
+        """
+        Supprime les conversations inactives.
+
+        Returns:
+            Le nombre de conversations supprimées
+        """
+        with self._connect() as connection:
+            removed = connection.execute(
+                "DELETE FROM conversations WHERE last_activity < ?", (time.time() - self.idle_timeout,)
+            ).rowcount
+        self.expirations += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        connection = self._connect()
+        sessions, stored_bytes = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(turns)), 0) FROM conversations"
+        ).fetchone()
+        page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        # Les compteurs d'évictions et d'expirations sont ceux de ce worker
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": sessions,
+            "max_sessions": self.max_conversations,
+            "stored_bytes": stored_bytes,
+            "database_bytes": page_count * page_size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def create_conversation_store(backend: str, system_message: Dict[str, str], **options) -> ConversationStore:
+    """
+    Crée le stockage des conversations.
+
+    Args:
+        backend: "memory" ou "sqlite"
+        system_message: Message système partagé par les conversations
+        options: Options du backend (max_conversations, idle_timeout, path pour SQLite)
+
+    Returns:
+        Le stockage des conversations
+    """
+    if backend == "sqlite":
+        return SQLiteConversationStore(system_message, **options)
+    if backend == "memory":
+        options.pop("path", None)
+        return MemoryConversationStore(system_message, **options)
+    raise ValueError(f"Backend de conversations inconnu: {backend}")
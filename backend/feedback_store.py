@@ -0,0 +1,277 @@
+"""
+Stockage des retours des utilisateurs: écriture par lots dans SQLite et agrégats tenus à
+jour à chaque lot, pour des statistiques qui ne relisent pas l'historique des retours
+"""
+import os
+import sys
+import time
+import atexit
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from language_detector import detect_many
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+RATINGS = range(1, 6)
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS feedback ("
+    "id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, conversation_id TEXT NOT NULL, "
+    "message_id TEXT NOT NULL, rating INTEGER NOT NULL, comment TEXT NOT NULL, language TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS feedback_conversation ON feedback (conversation_id)",
+    # Agrégats: nombre de retours par jour, langue et note, et par conversation, langue et note
+    "CREATE TABLE IF NOT EXISTS feedback_daily ("
+    "day TEXT NOT NULL, language TEXT NOT NULL, rating INTEGER NOT NULL, count INTEGER NOT NULL, "
+    "PRIMARY KEY (day, language, rating))",
+    "CREATE TABLE IF NOT EXISTS feedback_conversations ("
+    "conversation_id TEXT NOT NULL, language TEXT NOT NULL, rating INTEGER NOT NULL, count INTEGER NOT NULL, "
+    "PRIMARY KEY (conversation_id, language, rating))",
+    "CREATE TABLE IF NOT EXISTS feedback_imports (path TEXT PRIMARY KEY, rows INTEGER NOT NULL, imported_at TEXT NOT NULL)",
+]
+
+# (timestamp, conversation_id, message_id, rating, comment, language)
+FeedbackRow = Tuple[str, str, str, int, str, str]
+
+
+def _summarize_counts(counts: Iterable[Tuple[int, int]]) -> Dict[str, Any]:
+    distribution = {rating: 0 for rating in RATINGS}
+    total = weighted = 0
+    for rating, count in counts:
+        total += count
+        weighted += rating * count
+        if rating in distribution:
+            distribution[rating] += count
+    return {
+        "total_feedbacks": total,
+        "average_rating": weighted / total if total else None,
+        "rating_distribution": distribution,
+    }
+
+
+class FeedbackStore:
+    def __init__(self, path: str = os.path.join("feedback_data", "feedback.db"),
+                 flush_interval: float = 1.0, batch_size: int = 500):
+        """
+        Initialise le stockage des retours.
+
+        Args:
+            path: Chemin de la base SQLite
+            flush_interval: Délai maximum en secondes avant l'écriture d'un retour reçu
+            batch_size: Nombre de retours en attente qui déclenche une écriture immédiate
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pending: List[FeedbackRow] = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+
+        self._writer = threading.Thread(target=self._run_writer, name="feedback-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Une connexion par thread (requêtes, thread d'écriture)
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _run_writer(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erreur lors de l'écriture des retours: {str(e)}")
+
+    def submit(self, conversation_id: str, message_id: str, rating: int, comment: str = "",
+               language: str = "unknown", timestamp: Optional[str] = None) -> None:
+        """
+        Ajoute un retour à la file d'écriture (écrit au plus tard après flush_interval secondes).
+        """
+        row = (timestamp or time.strftime(TIMESTAMP_FORMAT), conversation_id, message_id, rating, comment, language)
+        with self._pending_lock:
+            self.pending.append(row)
+            if len(self.pending) >= self.batch_size:
+                self._wake.set()
+
+    @staticmethod
+    def _insert(connection: sqlite3.Connection, rows: List[FeedbackRow]) -> None:
+        """
+        Insère les retours et met à jour les agrégats (dans la transaction en cours).
+        """
+        daily = Counter((row[0][:10], row[5], row[3]) for row in rows)
+        by_conversation = Counter((row[1], row[5], row[3]) for row in rows)
+        connection.executemany(
+            "INSERT INTO feedback (timestamp, conversation_id, message_id, rating, comment, language) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+        connection.executemany(
+            "INSERT INTO feedback_daily (day, language, rating, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(day, language, rating) DO UPDATE SET count = count + excluded.count",
+            [(*key, count) for key, count in daily.items()]
+        )
+        connection.executemany(
+            "INSERT INTO feedback_conversations (conversation_id, language, rating, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(conversation_id, language, rating) DO UPDATE SET count = count + excluded.count",
+            [(*key, count) for key, count in by_conversation.items()]
+        )
+
+    def _write(self, rows: List[FeedbackRow]) -> None:
+        """
+        Insère les retours et met à jour les agrégats dans la même transaction.
+        """
+        with self._write_lock, self._connect() as connection:
+            self._insert(connection, rows)
+
+    def flush(self) -> int:
+        """
+        Écrit les retours en attente.
+
+        Returns:
+            Le nombre de retours écrits
+        """
+        with self._pending_lock:
+            rows, self.pending = self.pending, []
+        if rows:
+            self._write(rows)
+        return len(rows)
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self, conversation_id: Optional[str] = None, start: Optional[str] = None,
+              end: Optional[str] = None, language: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Calcule les statistiques des retours à partir des agrégats, sans attendre l'écriture
+        des retours en attente: ceux de ce processus sont comptés en mémoire.
+
+        Args:
+            conversation_id: Limiter à une conversation
+            start: Premier jour inclus (AAAA-MM-JJ)
+            end: Dernier jour inclus (AAAA-MM-JJ)
+            language: Limiter à une langue détectée
+
+        Returns:
+            Le nombre de retours, la note moyenne, la distribution des notes et la
+            répartition par langue
+        """
+        conditions, parameters = [], []
+        if conversation_id is not None and start is None and end is None:
+            table = "feedback_conversations"
+            conditions.append("conversation_id = ?")
+            parameters.append(conversation_id)
+        elif conversation_id is not None:
+            # Les agrégats par conversation n'ont pas de date: lecture des retours par l'index
+            table = ("(SELECT substr(timestamp, 1, 10) AS day, language, rating, 1 AS count "
+                     "FROM feedback WHERE conversation_id = ?)")
+            parameters.append(conversation_id)
+        else:
+            table = "feedback_daily"
+        if start is not None:
+            conditions.append("day >= ?")
+            parameters.append(start)
+        if end is not None:
+            conditions.append("day <= ?")
+            parameters.append(end)
+        if language is not None:
+            conditions.append("language = ?")
+            parameters.append(language)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._pending_lock:
+            pending = list(self.pending)
+        rows = self._connect().execute(
+            f"SELECT language, rating, SUM(count) FROM {table}{where} GROUP BY language, rating", parameters
+        ).fetchall()
+        # Retours reçus mais pas encore écrits (au plus flush_interval secondes)
+        pending = Counter(
+            (row[5], row[3]) for row in pending
+            if (conversation_id is None or row[1] == conversation_id)
+            and (start is None or row[0][:10] >= start) and (end is None or row[0][:10] <= end)
+            and (language is None or row[5] == language)
+        )
+        rows += [(row_language, rating, count) for (row_language, rating), count in pending.items()]
+
+        stats = _summarize_counts((rating, count) for _, rating, count in rows)
+        by_language = Counter()
+        for row_language, _, count in rows:
+            by_language[row_language] += count
+        stats["by_language"] = dict(by_language)
+        return stats
+
+    def import_csv(self, csv_path: str) -> int:
+        """
+        Importe l'ancien journal feedback_log.csv (virgules et sauts de ligne échappés par
+        une barre oblique inverse). Les retours et la marque d'import sont écrits dans une
+        seule transaction: un fichier déjà importé n'est pas réimporté, et un import
+        interrompu ne laisse aucun retour (il est repris en entier au démarrage suivant).
+
+        Returns:
+            Le nombre de retours importés
+        """
+        path = os.path.abspath(csv_path)
+        connection = self._connect()
+        if connection.execute("SELECT 1 FROM feedback_imports WHERE path = ?", (path,)).fetchone():
+            return 0
+
+        parsed = []
+        with open(csv_path, "r", encoding="utf-8") as f:
+            next(f, None)  # En-tête
+            for line in f:
+                parts = line.rstrip("\n").split(",", 4)
+                if len(parts) < 4:
+                    continue
+                try:
+                    rating = int(parts[3])
+                except ValueError:
+                    continue
+                # Le commentaire est le dernier champ: ses virgules échappées restent dans parts[4]
+                comment = parts[4] if len(parts) == 5 else ""
+                comment = comment.replace("\\,", ",").replace("\\n", "\n")
+                parsed.append((parts[0], parts[1], parts[2], rating, comment))
+
+        languages = detect_many(comment for *_, comment in parsed)
+        rows = [
+            (*row, language if row[4] else "unknown")
+            for row, language in zip(parsed, languages)
+        ]
+        with self._write_lock, connection:
+            connection.execute("BEGIN IMMEDIATE")
+            # Un autre worker a importé le fichier pendant la lecture
+            if connection.execute("SELECT 1 FROM feedback_imports WHERE path = ?", (path,)).fetchone():
+                return 0
+            for start in range(0, len(rows), 10000):
+                self._insert(connection, rows[start:start + 10000])
+            connection.execute(
+                "INSERT INTO feedback_imports (path, rows, imported_at) VALUES (?, ?, ?)",
+                (path, len(rows), time.strftime(TIMESTAMP_FORMAT))
+            )
+        return len(rows)
+
+
+if __name__ == "__main__":
+    # Import ponctuel de l'ancien journal: python feedback_store.py feedback_data/feedback_log.csv
+    if len(sys.argv) != 2:
+        print("Usage: python feedback_store.py <feedback_log.csv>")
+        sys.exit(1)
+    store = FeedbackStore()
+    print(f"{store.import_csv(sys.argv[1])} retours importés dans {store.path}")
@@ -0,0 +1,170 @@
+"""
+Fenêtre de l'historique envoyé au LLM: nombre de tokens de chaque message mis en cache,
+historique réduit au budget configuré et anciens échanges résumés
+"""
+import re
+import math
+import logging
+import threading
+from functools import cached_property
+from typing import Callable, Dict, List, Optional
+
+from conversation_store import Conversation
+
+# Tokens ajoutés par le format de chat pour chaque message (rôle et séparateurs)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_HEADER = "Résumé des échanges précédents de cette conversation:"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?؟])\s")
+
+logger = logging.getLogger(__name__)
+
+
+def load_token_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """
+    Retourne une fonction qui compte les tokens d'un texte avec tiktoken.
+
+    Si l'encodage ne peut pas être chargé (tiktoken absent ou téléchargement impossible),
+    le nombre de tokens est estimé à un token pour 4 caractères.
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(f"Encodage {encoding_name} indisponible, estimation du nombre de tokens: {str(e)[:100]}")
+        return lambda text: math.ceil(len(text) / 4)
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+class TokenCounter:
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        """
+        Compteur de tokens dont l'encodage n'est chargé qu'au premier appel (ou par load,
+        étape de la préparation en arrière-plan): au premier démarrage, tiktoken télécharge
+        l'encodage, ce qui ne doit pas retarder l'import de l'application.
+
+        Args:
+            encoding_name: Nom de l'encodage tiktoken
+        """
+        self.encoding_name = encoding_name
+        self._count: Optional[Callable[[str], int]] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Callable[[str], int]:
+        """
+        Charge l'encodage s'il ne l'est pas encore (voir load_token_counter).
+        """
+        with self._lock:
+            if self._count is None:
+                self._count = load_token_counter(self.encoding_name)
+            return self._count
+
+    def __call__(self, text: str) -> int:
+        return (self._count or self.load())(text)
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    sentence = _SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "…"
+
+
+class HistoryManager:
+    def __init__(self, system_message: Dict[str, str], token_budget: int = 4096,
+                 summary_budget: int = 512, count_tokens: Callable[[str], int] = None):
+        """
+        Initialise le gestionnaire d'historique.
+
+        Args:
+            system_message: Message système placé en tête de chaque requête
+            token_budget: Nombre maximum de tokens de l'historique envoyé (message système,
+                résumé et messages), hors contexte juridique ajouté à la question
+            summary_budget: Nombre maximum de tokens du résumé des échanges supprimés
+                (0 pour supprimer les anciens échanges sans les résumer)
+            count_tokens: Fonction de comptage des tokens (tiktoken par défaut, chargé au
+                premier comptage)
+        """
+        self.system_message = system_message
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.count_tokens = count_tokens or TokenCounter()
+
+    # Comptés au premier appel à trim, pas à la création: l'encodage n'est pas chargé à l'import
+    @cached_property
+    def system_tokens(self) -> int:
+        return self.message_tokens(self.system_message)
+
+    @cached_property
+    def summary_header_tokens(self) -> int:
+        return self.count_tokens(SUMMARY_HEADER) + 1 + MESSAGE_OVERHEAD_TOKENS
+
+    def message_tokens(self, message: Dict[str, str]) -> int:
+        return self.count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+    def _summarize(self, conversation: Conversation, removed: List[Dict[str, str]]) -> None:
+        """
+        Ajoute au résumé glissant une ligne par message supprimé (la question, ou la première
+        phrase de la réponse), puis retire les lignes les plus anciennes au-delà du budget.
+        """
+        lines = conversation.summary.split("\n") if conversation.summary else []
+        for message in removed:
+            if message["role"] == "user":
+                lines.append(f"- Question: {_first_sentence(message['content'], 300)}")
+            elif message["role"] == "assistant":
+                lines.append(f"- Réponse: {_first_sentence(message['content'], 300)}")
+
+        line_tokens = [self.count_tokens(line) + 1 for line in lines]
+        total = self.summary_header_tokens + sum(line_tokens)
+        start = 0
+        while start < len(lines) and total > self.summary_budget:
+            total -= line_tokens[start]
+            start += 1
+        conversation.summary = "\n".join(lines[start:])
+        conversation.summary_tokens = total if conversation.summary else 0
+
+    def trim(self, conversation: Conversation) -> int:
+        """
+        Compte les tokens des nouveaux messages puis supprime les plus anciens tant que
+        l'historique dépasse le budget. Le message système et le dernier message sont
+        toujours conservés.
+
+        Returns:
+            Le nombre de tokens de l'historique après réduction
+        """
+        messages = conversation.messages
+        counts = conversation.token_counts
+        # Seuls les messages ajoutés depuis le dernier appel sont comptés
+        for message in messages[1 + len(counts):]:
+            tokens = self.message_tokens(message)
+            counts.append(tokens)
+            conversation.history_tokens += tokens
+
+        # Dès qu'un message est supprimé, le résumé peut occuper jusqu'à summary_budget tokens
+        limit = self.token_budget - self.system_tokens
+        reserve = conversation.summary_tokens
+        removed = 0
+        while len(counts) - removed > 1 and reserve + conversation.history_tokens > limit:
+            conversation.history_tokens -= counts[removed]
+            removed += 1
+            reserve = max(reserve, self.summary_budget)
+
+        if removed:
+            dropped = messages[1:1 + removed]
+            del messages[1:1 + removed]
+            del counts[:removed]
+            conversation.dropped_messages += removed
+            if self.summary_budget > 0:
+                self._summarize(conversation, dropped)
+
+        return self.system_tokens + conversation.summary_tokens + conversation.history_tokens
+
+    def build_messages(self, conversation: Conversation) -> List[Dict[str, str]]:
+        """
+        Construit la liste des messages à envoyer: message système, résumé éventuel puis
+        l'historique conservé. Les messages sont partagés avec la conversation (ne pas les modifier).
+        """
+        messages = [self.system_message]
+        if conversation.summary:
+            messages.append({"role": "system", "content": f"{SUMMARY_HEADER}\n{conversation.summary}"})
+        messages.extend(conversation.messages[1:])
+        return messages
@@ -0,0 +1,310 @@
+"""
+Segments d'index immuables et projetés en mémoire (mmap): texte des documents, passages,
+vocabulaire, matrice CSR et postings BM25 sont stockés dans des fichiers que tous les workers uvicorn
+projettent en lecture seule, si bien que leurs pages sont partagées entre processus au
+lieu d'être copiées dans chacun
+"""
+import os
+import json
+import mmap
+import time
+import bisect
+import shutil
+from collections.abc import Mapping, Sequence
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import scipy.sparse as sp
+    from bm25_index import BM25Index
+
+SEGMENTS_DIRECTORY = "segments"
+
+
+def _byte_positions(text: str, positions: Iterable[int]) -> dict:
+    """
+    Convertit des positions en caractères dans text en positions en octets (UTF-8).
+
+    Returns:
+        Un dictionnaire position en caractères -> position en octets
+    """
+    positions = sorted(set(positions))
+    if text.isascii():
+        return {position: position for position in positions}
+    converted = {}
+    previous, offset = 0, 0
+    for position in positions:
+        offset += len(text[previous:position].encode("utf-8"))
+        converted[position] = offset
+        previous = position
+    return converted
+
+
+def _save_array(directory: str, name: str, array: np.ndarray) -> None:
+    with open(os.path.join(directory, name + ".npy"), "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+
+
+def _save_vocabulary(directory: str, prefix: str, vocabulary: Mapping) -> None:
+    # Vocabulaire trié (ordre des octets UTF-8) pour la recherche dichotomique
+    terms = sorted((term.encode("utf-8"), int(column)) for term, column in vocabulary.items())
+    with open(os.path.join(directory, prefix + ".bin"), "wb") as f:
+        f.write(b"".join(term for term, _ in terms))
+    _save_array(directory, prefix + "_offsets", np.cumsum([0] + [len(term) for term, _ in terms], dtype=np.int64))
+    _save_array(directory, prefix + "_columns", np.array([column for _, column in terms], dtype=np.int64))
+
+
+def write_segment(root: str, documents: List[str], page_offsets: List[List[int]],
+                  passages: np.ndarray, vocabulary: Mapping, idf: np.ndarray,
+                  scoring_matrix: "sp.csr_matrix", bm25: Optional["BM25Index"] = None) -> str:
+    """
+    Écrit un nouveau segment dans root/segments/<nom>. Le segment est écrit dans un dossier
+    temporaire puis renommé: un segment visible est toujours complet, et il n'est plus
+    jamais modifié ensuite.
+
+    Args:
+        root: Répertoire de l'index
+        documents: Texte de chaque document (pages suivies de deux sauts de ligne)
+        page_offsets: Position (en caractères) du début de chaque page, par document
+        passages: (document, début, fin, première page, dernière page) de chaque passage
+        vocabulary: Terme -> colonne de la matrice
+        idf: Poids IDF de chaque terme
+        scoring_matrix: Matrice des passages transposée (termes x passages), au format CSR
+        bm25: Index BM25 des passages, enregistré s'il est fourni (postings, longueurs et vocabulaire)
+
+    Returns:
+        Le nom du segment
+    """
+    directory = os.path.join(root, SEGMENTS_DIRECTORY)
+    name = f"{time.time_ns():x}-{os.getpid()}"
+    tmp_path = os.path.join(directory, name + ".tmp")
+    os.makedirs(tmp_path)
+    try:
+        # Texte de tous les documents à la suite, adressé par positions en octets
+        document_bounds = [0]
+        page_bounds, page_indptr = [], [0]
+        passage_bytes = np.zeros((len(passages), 2), dtype=np.int64)
+        # Passages regroupés par document
+        order = np.argsort(passages[:, 0], kind="stable")
+        groups = np.searchsorted(passages[order, 0], np.arange(len(documents) + 1))
+        with open(os.path.join(tmp_path, "text.bin"), "wb") as f:
+            for doc_id, text in enumerate(documents):
+                rows = order[groups[doc_id]:groups[doc_id + 1]]
+                spans = passages[rows, 1:3]
+                converted = _byte_positions(text, list(page_offsets[doc_id]) + spans.ravel().tolist())
+                start = document_bounds[-1]
+                page_bounds.extend(start + converted[offset] for offset in page_offsets[doc_id])
+                page_indptr.append(len(page_bounds))
+                passage_bytes[rows] = [[start + converted[a], start + converted[b]] for a, b in spans.tolist()]
+                data = text.encode("utf-8")
+                f.write(data)
+                document_bounds.append(start + len(data))
+
+        _save_array(tmp_path, "documents", np.array(document_bounds, dtype=np.int64))
+        _save_array(tmp_path, "pages", np.array(page_bounds, dtype=np.int64))
+        _save_array(tmp_path, "page_indptr", np.array(page_indptr, dtype=np.int64))
+        _save_array(tmp_path, "passages", np.column_stack([passages, passage_bytes]).astype(np.int64))
+
+        _save_vocabulary(tmp_path, "terms", vocabulary)
+        _save_array(tmp_path, "idf", idf)
+
+        scoring_matrix = scoring_matrix.tocsr()
+        scoring_matrix.sort_indices()
+        _save_array(tmp_path, "scoring_indptr", scoring_matrix.indptr)
+        _save_array(tmp_path, "scoring_indices", scoring_matrix.indices)
+        _save_array(tmp_path, "scoring_data", scoring_matrix.data)
+        info = {"shape": list(scoring_matrix.shape), "documents": len(documents), "passages": len(passages)}
+
+        # Postings BM25 (passages x termes, CSC): nombres d'occurrences et longueur des passages
+        if bm25 is not None and bm25.postings is not None:
+            _save_vocabulary(tmp_path, "bm25_terms", bm25.vocabulary)
+            _save_array(tmp_path, "bm25_indptr", bm25.postings.indptr)
+            _save_array(tmp_path, "bm25_indices", bm25.postings.indices)
+            _save_array(tmp_path, "bm25_data", bm25.postings.data)
+            _save_array(tmp_path, "bm25_lengths", bm25.lengths)
+            info["bm25_shape"] = list(bm25.postings.shape)
+
+        with open(os.path.join(tmp_path, "segment.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f)
+
+        os.replace(tmp_path, os.path.join(directory, name))
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return name
+
+
+def remove_stale_segments(root: str, keep: Iterable[str]) -> None:
+    """
+    Supprime les segments qui ne sont plus référencés. Un worker qui projette encore un
+    segment supprimé continue de le lire (le fichier n'est libéré qu'à la fin de la
+    projection); sous Windows, la suppression d'un fichier projeté échoue et elle est
+    simplement retentée à la prochaine publication.
+    """
+    directory = os.path.join(root, SEGMENTS_DIRECTORY)
+    keep = set(keep)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if name not in keep and not name.endswith(".tmp"):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def _map_file(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _SortedTerms(Sequence):
+    """
+    Vue des termes triés (en octets) pour bisect.
+    """
+
+    def __init__(self, blob, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        return self.blob[self.offsets[index]:self.offsets[index + 1]]
+
+
+class SegmentVocabulary(Mapping):
+    """
+    Vocabulaire (terme -> colonne) lu directement dans le segment, utilisable comme
+    vocabulary_ d'un TfidfVectorizer sans recopier le dictionnaire dans chaque worker.
+    """
+
+    def __init__(self, blob, offsets: np.ndarray, columns: np.ndarray):
+        self.terms = _SortedTerms(blob, offsets)
+        self.columns = columns
+
+    def __getitem__(self, term: str) -> int:
+        key = term.encode("utf-8")
+        index = bisect.bisect_left(self.terms, key)
+        if index == len(self.terms) or self.terms[index] != key:
+            raise KeyError(term)
+        return int(self.columns[index])
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self.terms)):
+            yield self.terms[index].decode("utf-8")
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(zip(self, self.columns.tolist()))
+
+
+class IndexSegment:
+    def __init__(self, root: str, name: str):
+        """
+        Projette un segment en lecture seule. Seuls les en-têtes des tableaux sont lus:
+        les pages ne sont chargées (et partagées entre processus) qu'à la lecture.
+
+        Args:
+            root: Répertoire de l'index
+            name: Nom du segment (voir write_segment)
+        """
+        import scipy.sparse as sp
+
+        self.name = name
+        self.path = os.path.join(root, SEGMENTS_DIRECTORY, name)
+        with open(os.path.join(self.path, "segment.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+
+        def load(array_name: str) -> np.ndarray:
+            return np.load(os.path.join(self.path, array_name + ".npy"), mmap_mode="r")
+
+        def load_vocabulary(prefix: str) -> SegmentVocabulary:
+            return SegmentVocabulary(
+                _map_file(os.path.join(self.path, prefix + ".bin")), load(prefix + "_offsets"), load(prefix + "_columns")
+            )
+
+        self.text = _map_file(os.path.join(self.path, "text.bin"))
+        self.document_bounds = load("documents")
+        self.page_bounds = load("pages")
+        self.page_indptr = load("page_indptr")
+        passages = load("passages")
+        self.passage_doc_ids = passages[:, 0]
+        self.passage_spans = passages[:, 1:3]  # Positions en caractères dans le document
+        self.passage_pages = passages[:, 3:5]
+        self.passage_bytes = passages[:, 5:7]  # Positions en octets dans text.bin
+        self.vocabulary = load_vocabulary("terms")
+        self.idf = load("idf")
+        # Les tableaux projetés sont utilisés tels quels par scipy (copy=False): aucune copie
+        self.scoring_matrix = sp.csr_matrix(
+            (load("scoring_data"), load("scoring_indices"), load("scoring_indptr")),
+            shape=tuple(info["shape"]), copy=False
+        )
+        # Index BM25 (None si le segment a été écrit sans): postings et longueurs projetés
+        self.bm25 = None
+        if "bm25_shape" in info:
+            from bm25_index import BM25Index
+
+            postings = sp.csc_matrix(
+                (load("bm25_data"), load("bm25_indices"), load("bm25_indptr")),
+                shape=tuple(info["bm25_shape"]), copy=False
+            )
+            self.bm25 = BM25Index.from_arrays(load_vocabulary("bm25_terms"), postings, load("bm25_lengths"))
+
+    def __len__(self) -> int:
+        return len(self.document_bounds) - 1
+
+    def page_count(self, doc_id: int) -> int:
+        return int(self.page_indptr[doc_id + 1] - self.page_indptr[doc_id])
+
+    def document_text(self, doc_id: int) -> str:
+        return self.text[self.document_bounds[doc_id]:self.document_bounds[doc_id + 1]].decode("utf-8")
+
+    def document_pages(self, doc_id: int) -> List[str]:
+        """
+        Retourne le texte de chaque page d'un document.
+        """
+        bounds = self.page_bounds[self.page_indptr[doc_id]:self.page_indptr[doc_id + 1]].tolist()
+        bounds.append(int(self.document_bounds[doc_id + 1]))
+        # Chaque page est suivie de deux sauts de ligne (deux octets)
+        return [self.text[start:end - 2].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+    def passage_text(self, passage_id: int) -> str:
+        start, end = self.passage_bytes[passage_id]
+        return self.text[start:end].decode("utf-8")
+
+
+class SegmentDocuments(Sequence):
+    """
+    Textes des documents d'un segment, décodés à la demande (remplace la liste de chaînes
+    de PDFIndexer.documents quand l'index est projeté).
+    """
+
+    def __init__(self, segment: IndexSegment):
+        self.segment = segment
+
+    def __len__(self) -> int:
+        return len(self.segment)
+
+    def __getitem__(self, doc_id: int) -> str:
+        if not 0 <= doc_id < len(self.segment):
+            raise IndexError(doc_id)
+        return self.segment.document_text(doc_id)
+
+
+def open_segment(root: str, name: Optional[str]) -> Optional[IndexSegment]:
+    """
+    Ouvre un segment, ou retourne None s'il est absent ou illisible.
+    """
+    if not name:
+        return None
+    try:
+        return IndexSegment(root, name)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Segment d'index {name} illisible: {str(e)}")
+        return None
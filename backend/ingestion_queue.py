@@ -0,0 +1,152 @@
+"""
+File d'ingestion des documents téléversés: extraction et indexation en arrière-plan, avec
+suivi de l'avancement de chaque tâche dans une base SQLite partagée par tous les workers
+uvicorn (le statut d'une tâche peut être demandé à n'importe quel worker)
+"""
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from pdf_indexer import PDFIndexer, extract_pdf_worker
+from scoped_index import ScopedDocumentIndex
+
+# Portée d'un document: index partagé, ou uniquement la conversation qui l'a téléversé
+SCOPE_SHARED = "shared"
+SCOPE_CONVERSATION = "conversation"
+
+# Champs du statut d'une tâche, dans l'ordre des colonnes de la table ingestion_jobs
+JOB_FIELDS = ("job_id", "filename", "conversation_id", "scope", "status", "progress", "pages", "passages",
+              "error", "created_at", "updated_at")
+
+
+class IngestionQueue:
+    def __init__(self, indexer: PDFIndexer, scoped_index: ScopedDocumentIndex, path: str = "uploads.db",
+                 workers: int = 2, extraction_timeout: Optional[float] = 120.0, max_jobs: int = 1000,
+                 on_indexed: Optional[Callable[[], None]] = None):
+        """
+        Initialise la file d'ingestion.
+
+        Args:
+            indexer: L'index partagé
+            scoped_index: L'index des documents propres à une conversation
+            path: Base SQLite du statut des tâches (partagée par les workers)
+            workers: Nombre de documents traités simultanément (un processus d'extraction chacun)
+            extraction_timeout: Délai maximum d'extraction d'un document en secondes
+            max_jobs: Nombre de tâches dont le statut est conservé
+            on_indexed: Fonction appelée après l'ajout d'un document à l'index partagé
+        """
+        self.indexer = indexer
+        self.scoped_index = scoped_index
+        self.path = path
+        self.workers = workers
+        self.extraction_timeout = extraction_timeout
+        self.max_jobs = max_jobs
+        self.on_indexed = on_indexed
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingestion")
+        self._extraction_pool = None
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ingestion_jobs ("
+                "job_id TEXT PRIMARY KEY, filename TEXT NOT NULL, conversation_id TEXT, scope TEXT NOT NULL, "
+                "status TEXT NOT NULL, progress REAL NOT NULL, pages INTEGER, passages INTEGER, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ingestion_jobs_created_at ON ingestion_jobs (created_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Une connexion par thread (boucle d'événements, threads d'ingestion)
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _get_extraction_pool(self) -> ProcessPoolExecutor:
+        # Le pool de processus est créé au premier téléversement et réutilisé ensuite
+        with self._lock:
+            if self._extraction_pool is None:
+                self._extraction_pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._extraction_pool
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                f"UPDATE ingestion_jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def submit(self, path: str, filename: str, conversation_id: str, scope: str = SCOPE_SHARED) -> str:
+        """
+        Ajoute un document à la file.
+
+        Returns:
+            L'identifiant de la tâche
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                f"INSERT INTO ingestion_jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' * len(JOB_FIELDS))})",
+                (job_id, filename, conversation_id, scope, "queued", 0.0, None, None, None, now, now)
+            )
+            connection.execute(
+                "DELETE FROM ingestion_jobs WHERE job_id IN "
+                "(SELECT job_id FROM ingestion_jobs ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_jobs,)
+            )
+        self._executor.submit(self._run, job_id, path, filename, conversation_id, scope)
+        return job_id
+
+    def _run(self, job_id: str, path: str, filename: str, conversation_id: str, scope: str) -> None:
+        start = time.perf_counter()
+        try:
+            self._update(job_id, status="extracting", progress=0.1)
+            result = self._get_extraction_pool().submit(extract_pdf_worker, path, self.extraction_timeout).result()
+            pages = result["pages"]
+            if result["status"] != "extracted" or not any(page.strip() for page in pages):
+                self._update(job_id, status="failed", progress=1.0, pages=len(pages),
+                             error=result["error"] or "Aucun texte n'a pu être extrait du document")
+                return
+
+            self._update(job_id, status="indexing", progress=0.6, pages=len(pages))
+            if scope == SCOPE_CONVERSATION:
+                passages = self.scoped_index.add(conversation_id, filename, pages)
+            else:
+                self.indexer.add_document(path, pages=pages)
+                passages = None
+                if self.on_indexed:
+                    self.on_indexed()
+            self._update(job_id, status="done", progress=1.0, passages=passages)
+            print(f"Document ingéré ({scope}): {filename} ({len(pages)} pages, {time.perf_counter() - start:.2f}s)")
+        except Exception as e:
+            print(f"Erreur lors de l'ingestion de {filename}: {str(e)}")
+            self._update(job_id, status="failed", progress=1.0, error=str(e))
+        finally:
+            # Le texte d'un document de conversation est conservé dans son index: le fichier n'est plus nécessaire
+            if scope == SCOPE_CONVERSATION and os.path.exists(path):
+                os.remove(path)
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """
+        Retourne l'état d'une tâche (None si elle est inconnue), quel que soit le worker qui
+        la traite.
+        """
+        row = self._connect().execute(
+            f"SELECT {', '.join(JOB_FIELDS)} FROM ingestion_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return dict(zip(JOB_FIELDS, row)) if row is not None else None
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+        if self._extraction_pool is not None:
+            self._extraction_pool.shutdown()
@@ -1,38 +1,123 @@
-def detect_language(text):
+"""
+Identification de la langue des messages: français, arabe, dialecte tunisien en
+caractères latins (arabizi) ou en caractères arabes
+"""
+import re
+from typing import Iterable, List
+
+FRENCH = "french"
+ARABIC = "arabic"
+TUNISIAN_LATIN = "tunisian_latin"
+TUNISIAN_ARABIC = "tunisian_arabic"
+
+# Langue de réponse de l'assistant pour chaque variété détectée
+RESPONSE_LANGUAGES = {
+    FRENCH: FRENCH,
+    TUNISIAN_LATIN: FRENCH,
+    ARABIC: ARABIC,
+    TUNISIAN_ARABIC: ARABIC,
+}
+
+# Mots caractéristiques du dialecte tunisien. Les mots aussi courants en arabe standard
+# ("في", "على", "قانون", "حق"...) ne sont pas retenus: ils ne distinguent pas le dialecte
+TUNISIAN_LATIN_MARKERS = frozenset([
+    "chneya", "chnia", "kifech", "kifeh", "3la", "fi", "enti", "inti", "ena", "mte3", "mta3",
+    "barcha", "yezzi", "tawa", "chkoun", "waqteh", "wa9teh", "lahna", "fama", "famma", "mech",
+    "bellehi", "ya3tik", "sahbi", "3andi", "9oli", "9olli", "7aja", "3lech", "chnowa", "chnouwa",
+    "bech", "ma3neha", "khalini", "na3ref", "lazem", "lezem", "mawjoud", "9anoun", "7a9", "chghol",
+])
+TUNISIAN_ARABIC_MARKERS = frozenset([
+    "شنية", "كيفاش", "انتي", "متاع", "برشا", "يزي", "توا", "شكون", "وقتاه", "لهنا", "فما",
+    "مش", "بالهي", "يعطيك", "صاحبي", "قولي", "علاش", "شنوة", "باش", "معناها", "خليني", "لازم",
+])
+
+# Nombre de mots du dialecte à partir duquel un message est considéré comme tunisien
+MIN_TUNISIAN_MARKERS = 2
+
+# Seul le début des textes longs est analysé: quelques centaines de mots suffisent à
+# reconnaître la langue d'une réponse
+MAX_ANALYZED_CHARS = 1000
+
+# Chiffres utilisés en arabizi pour les lettres sans équivalent latin (2 = ء, 3 = ع, 5 = خ,
+# 7 = ح, 9 = ق), reconnus seulement entre deux lettres ("ya3tik", "ma3neha"): les références
+# ("covid19", "L1234", "art5") et les ordinaux ("2eme") ne sont pas de l'arabizi. Les mots qui
+# commencent par un chiffre ("3andi", "9anoun") sont reconnus par TUNISIAN_LATIN_MARKERS
+_ARABIZI_PATTERN = re.compile(r"[a-z][23579]+[a-z]")
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def _is_arabic(char: str) -> bool:
+    return "\u0600" <= char <= "\u08ff"
+
+
+def _is_arabizi(token: str) -> bool:
+    """
+    Un mot latin (en minuscules) avec un chiffre arabizi entre deux lettres ("ya3tik", "ma3neha").
+    """
+    return token.isascii() and not token.isalpha() and _ARABIZI_PATTERN.search(token) is not None
+
+
+def identify_language(text: str) -> str:
+    """
+    Identifie la langue d'un texte en un seul parcours de ses mots.
+
+    Args:
+        text (str): Le texte à analyser
+
+    Returns:
+        str: FRENCH, ARABIC, TUNISIAN_LATIN ou TUNISIAN_ARABIC
+    """
+    arabic_words = latin_words = 0
+    arabic_markers = latin_markers = 0
+    for token in _TOKEN_PATTERN.findall(text[:MAX_ANALYZED_CHARS].lower()):
+        if _is_arabic(token[0]):
+            arabic_words += 1
+            if token in TUNISIAN_ARABIC_MARKERS:
+                arabic_markers += 1
+        elif not token.isdigit():
+            latin_words += 1
+            if token in TUNISIAN_LATIN_MARKERS or _is_arabizi(token):
+                latin_markers += 1
+
+    # L'écriture majoritaire décide de la langue; à égalité, l'arabe l'emporte
+    if arabic_words and arabic_words >= latin_words:
+        return TUNISIAN_ARABIC if arabic_markers >= MIN_TUNISIAN_MARKERS else ARABIC
+    return TUNISIAN_LATIN if latin_markers >= MIN_TUNISIAN_MARKERS else FRENCH
+
+
+def detect_many(texts: Iterable[str]) -> List[str]:
+    """
+    Identifie la langue d'une série de textes (journal des retours, corpus à l'indexation).
+
+    Returns:
+        La liste des langues, dans l'ordre des textes
+    """
+    return [identify_language(text) for text in texts]
+
+
+def detect_language(text: str) -> str:
     """
     Détecte si le texte est en français ou en dialecte tunisien.
-    
+
+    Args:
+        text (str): Le texte à analyser
+
+    Returns:
+        str: "tunisian" (dialecte en caractères latins ou arabes) ou "french"
+    """
+    language = identify_language(text)
+    return "tunisian" if language in (TUNISIAN_LATIN, TUNISIAN_ARABIC) else "french"
+
+
+def response_language(text: str) -> str:
+    """
+    Détecte la langue dans laquelle l'assistant doit répondre.
+
     Args:
         text (str): Le texte à analyser
-        
+
     Returns:
-        str: "french" ou "tunisian"
-    """
-    # Mots et expressions caractéristiques du dialecte tunisien
-    tunisian_markers = [
-        "chneya", "شنية", "kifech", "كيفاش", "3la", "على", "fi", "في", "enti", "انتي",
-        "ena", "انا", "mte3", "متاع", "barcha", "برشا", "yezzi", "يزي", "tawa", "توا",
-        "chkoun", "شكون", "waqteh", "وقتاه", "lahna", "لهنا", "fama", "فما", "mech", "مش",
-        "bellehi", "بالهي", "ya3tik", "يعطيك", "sahbi", "صاحبي", "3andi", "عندي",
-        "9oli", "قولي", "7aja", "حاجة", "barcha", "برشا", "3lech", "علاش", "chnowa", "شنوة",
-        "bech", "باش", "ma3neha", "معناها", "khalini", "خليني", "na3ref", "نعرف",
-        "lazem", "لازم", "mawjoud", "موجود", "9anoun", "قانون", "7a9", "حق", "chghol", "شغل"
-    ]
-    
-    # Compteur pour les marqueurs tunisiens
-    tunisian_count = 0
-    
-    # Convertir le texte en minuscules pour la comparaison
-    lower_text = text.lower()
-    
-    # Vérifier la présence de marqueurs tunisiens
-    for marker in tunisian_markers:
-        if marker in lower_text:
-            tunisian_count += 1
-    
-    # Si au moins 2 marqueurs tunisiens sont présents, considérer comme du tunisien
-    if tunisian_count >= 2:
-        return "tunisian"
-    
-    # Par défaut, considérer comme du français
-    return "french"
+        str: "arabic" (arabe ou dialecte tunisien en caractères arabes) ou "french"
+    """
+    return RESPONSE_LANGUAGES[identify_language(text)]
@@ -31,7 +31,15 @@ LEGAL_LINKS = {
     "droit tunisien": "https://www.droitunisien.com/"
 }
 
-# Dictionnaire des liens vers des articles spécifiques
+# Ancres des articles sur la page de chaque code, pour les codes dont le format a été vérifié
+# ({article}: numéro de l'article, espaces remplacés par des tirets). Les articles des autres
+# codes sont liés au texte complet du code (LEGAL_LINKS)
+ARTICLE_ANCHORS = {
+    "code du travail": "#article-{article}",
+}
+
+# Dictionnaire des liens vers des articles spécifiques (les articles des codes présents dans
+# legal_documents sont aussi générés à l'indexation, voir citation_index.article_links)
 ARTICLE_LINKS = {
     # Code du travail
     "article 1 du code du travail": "https://legislation-securite.tn/fr/law/43968#article-1",
@@ -112,6 +120,220 @@ RESOURCE_LINKS = {
     "registre de commerce": "https://www.registre-commerce.tn/"
 }
 
+ANCHOR_TEMPLATE = '<a href="{link}" target="_blank" rel="noopener noreferrer">{text}</a>'
+
+
+def _fold(char):
+    """
+    Met un caractère en minuscule sans changer la longueur du texte (les positions des
+    correspondances restent celles du texte original).
+    """
+    lowered = char.lower()
+    return lowered if len(lowered) == 1 else char
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class LegalLinker:
+    """
+    Automate d'Aho-Corasick construit une seule fois à partir des tables de liens: le texte
+    est parcouru en une seule passe, sans distinction de casse, et la référence la plus longue
+    l'emporte ("article 5 du code du travail" plutôt que "code du travail").
+    """
+
+    def __init__(self, *tables):
+        """
+        Construit l'automate.
+
+        Args:
+            tables: Dictionnaires référence -> lien, par ordre de priorité en cas de doublon
+        """
+        self.goto = [{}]      # Transitions de chaque état
+        self.fail = [0]       # Plus long suffixe propre qui est aussi un préfixe d'une référence
+        self.depth = [0]      # Longueur du préfixe représenté par l'état
+        self.output = [None]  # Lien de la référence se terminant exactement sur l'état
+        self.dict_link = [0]  # Prochain état de la chaîne d'échec portant une référence
+        self.max_length = 0
+
+        for table in tables:
+            for reference, link in table.items():
+                self._insert("".join(_fold(c) for c in reference), link)
+        self._build_failure_links()
+
+    def _insert(self, reference, link):
+        state = 0
+        for char in reference:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.depth.append(self.depth[state] + 1)
+                self.output.append(None)
+                self.dict_link.append(0)
+                self.goto[state][char] = next_state
+            state = next_state
+        if self.output[state] is None:
+            self.output[state] = link
+            self.max_length = max(self.max_length, len(reference))
+
+    def _build_failure_links(self):
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                failed = self.fail[child]
+                self.dict_link[child] = failed if self.output[failed] is not None else self.dict_link[failed]
+                queue.append(child)
+
+    def _scan(self, text, previous="", final=True):
+        """
+        Parcourt le texte et sélectionne les références à lier.
+
+        Args:
+            text: Le texte à parcourir
+            previous: Le caractère qui précède le texte (pour la limite de mot)
+            final: False si la suite du texte n'est pas encore connue
+
+        Returns:
+            Les correspondances (début, fin, lien) retenues, sans chevauchement, et la
+            profondeur de l'état final de l'automate
+        """
+        goto, fail, output, dict_link, depth = self.goto, self.fail, self.output, self.dict_link, self.depth
+        longest = {}  # Début -> (fin, lien) de la plus longue référence trouvée
+        length = len(text)
+        state = 0
+        for position, char in enumerate(text):
+            char = _fold(char)
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            match = state if output[state] is not None else dict_link[state]
+            if not match:
+                continue
+            end = position + 1
+            # Sans la suite du texte, une référence en fin de morceau n'est pas confirmée
+            if end == length and not final:
+                continue
+            if end < length and _is_word_char(text[end]):
+                continue
+            while match:
+                start = end - depth[match]
+                before = text[start - 1] if start else previous
+                if not (before and _is_word_char(before)):
+                    best = longest.get(start)
+                    if best is None or best[0] < end:
+                        longest[start] = (end, output[match])
+                match = dict_link[match]
+
+        matches = []
+        covered = 0
+        for start in sorted(longest):
+            if start >= covered:
+                end, link = longest[start]
+                matches.append((start, end, link))
+                covered = end
+        return matches, depth[state]
+
+    @staticmethod
+    def _render(text, matches, start, end):
+        parts = []
+        position = start
+        for match_start, match_end, link in matches:
+            parts.append(text[position:match_start])
+            parts.append(ANCHOR_TEMPLATE.format(link=link, text=text[match_start:match_end]))
+            position = match_end
+        parts.append(text[position:end])
+        return "".join(parts)
+
+    def link(self, text):
+        """
+        Remplace les références juridiques du texte par des liens HTML.
+
+        Args:
+            text (str): Le texte à enrichir
+
+        Returns:
+            str: Le texte enrichi avec des liens HTML
+        """
+        matches, _ = self._scan(text)
+        return self._render(text, matches, 0, len(text))
+
+    def stream(self):
+        """
+        Crée un lieur pour une réponse reçue morceau par morceau.
+        """
+        return LinkStream(self)
+
+
+class LinkStream:
+    """
+    Applique un LegalLinker à un texte reçu en plusieurs morceaux: seuls les caractères qui ne
+    peuvent plus faire partie d'une référence sont renvoyés, le reste attend le morceau suivant.
+    """
+
+    def __init__(self, linker):
+        self.linker = linker
+        self.pending = ""
+        self.previous = ""
+
+    def feed(self, chunk):
+        """
+        Ajoute un morceau de texte.
+
+        Returns:
+            str: La partie du texte désormais définitive, enrichie avec des liens HTML
+        """
+        self.pending += chunk
+        matches, depth = self.linker._scan(self.pending, self.previous, final=False)
+        # Une référence encore incomplète commence au plus tôt à len(pending) - depth
+        cut = len(self.pending) - depth
+        ready = [match for match in matches if match[0] < cut]
+        if ready:
+            cut = max(cut, ready[-1][1])
+        return self._emit(ready, cut)
+
+    def flush(self):
+        """
+        Termine le flux.
+
+        Returns:
+            str: La fin du texte, enrichie avec des liens HTML
+        """
+        matches, _ = self.linker._scan(self.pending, self.previous)
+        return self._emit(matches, len(self.pending))
+
+    def _emit(self, matches, cut):
+        if not cut:
+            return ""
+        output = self.linker._render(self.pending, matches, 0, cut)
+        self.previous = self.pending[cut - 1]
+        self.pending = self.pending[cut:]
+        return output
+
+
+# Automate construit une seule fois au chargement du module
+def build_legal_linker(generated_article_links=None):
+    """
+    Construit l'automate à partir des tables de liens et des liens d'articles générés.
+
+    Args:
+        generated_article_links: Liens "article N du code X" générés depuis le corpus
+            (les entrées de ARTICLE_LINKS restent prioritaires)
+    """
+    return LegalLinker(ARTICLE_LINKS, generated_article_links or {}, LEGAL_LINKS, RESOURCE_LINKS)
+
+
+legal_linker = build_legal_linker()
+
+
 def enrich_text_with_links(text):
     """
     Enrichit le texte avec des liens vers des ressources juridiques.
@@ -122,31 +344,4 @@ def enrich_text_with_links(text):
     Returns:
         str: Le texte enrichi avec des liens HTML
     """
-    # Copie du texte original
-    enriched_text = text
-    
-    # Enrichir avec des liens vers des articles spécifiques
-    for article, link in ARTICLE_LINKS.items():
-        # Recherche insensible à la casse
-        pattern = article
-        replacement = f'<a href="{link}" target="_blank" rel="noopener noreferrer">{article}</a>'
-        # Remplacer uniquement les occurrences complètes (pas les sous-chaînes)
-        enriched_text = enriched_text.replace(pattern, replacement)
-    
-    # Enrichir avec des liens vers des codes et lois
-    for code, link in LEGAL_LINKS.items():
-        # Recherche insensible à la casse
-        pattern = code
-        replacement = f'<a href="{link}" target="_blank" rel="noopener noreferrer">{code}</a>'
-        # Remplacer uniquement les occurrences complètes (pas les sous-chaînes)
-        enriched_text = enriched_text.replace(pattern, replacement)
-    
-    # Enrichir avec des liens vers des ressources spécifiques
-    for resource, link in RESOURCE_LINKS.items():
-        # Recherche insensible à la casse
-        pattern = resource
-        replacement = f'<a href="{link}" target="_blank" rel="noopener noreferrer">{resource}</a>'
-        # Remplacer uniquement les occurrences complètes (pas les sous-chaînes)
-        enriched_text = enriched_text.replace(pattern, replacement)
-    
-    return enriched_text
+    return legal_linker.link(text)
@@ -0,0 +1,284 @@
+"""
+Passerelle vers l'API Groq: connexions HTTP persistantes partagées par tous les appels, délai
+maximum par appel, nouvelles tentatives avec attente exponentielle aléatoire sur les erreurs
+429/5xx, disjoncteur qui échoue immédiatement quand l'API est en panne, et limite du nombre
+d'appels simultanés
+"""
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import groq
+import httpx
+
+import metrics
+
+# États du disjoncteur
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Erreurs pour lesquelles l'appel est retenté: limite de débit (429), erreur du serveur (5xx),
+# connexion impossible ou délai dépassé
+RETRYABLE_ERRORS = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError)
+
+
+class LLMUnavailableError(Exception):
+    """
+    L'API n'a pas répondu dans le délai imparti, a échoué à chaque tentative, ou le
+    disjoncteur est ouvert. retry_after est le délai conseillé (en secondes) avant de réessayer.
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Après failure_threshold échecs consécutifs (5xx, délai dépassé, connexion impossible),
+        le disjoncteur s'ouvre: les appels échouent immédiatement pendant reset_timeout
+        secondes, puis un seul appel d'essai est autorisé. S'il réussit le disjoncteur se
+        referme, sinon il se rouvre. Les erreurs 429 ne comptent pas: l'API répond.
+
+        Args:
+            failure_threshold: Nombre d'échecs consécutifs avant l'ouverture
+            reset_timeout: Durée d'ouverture en secondes
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.rejected = 0
+
+    def before_call(self) -> None:
+        """
+        Autorise un appel, ou lève LLMUnavailableError si le disjoncteur est ouvert (ou si
+        l'appel d'essai est déjà en cours).
+        """
+        if self.state == OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise LLMUnavailableError("API Groq indisponible (disjoncteur ouvert)", retry_after=remaining)
+            self.state = HALF_OPEN
+            self.trial_in_flight = False
+        if self.state == HALF_OPEN:
+            if self.trial_in_flight:
+                self.rejected += 1
+                raise LLMUnavailableError("API Groq indisponible (essai en cours)", retry_after=1.0)
+            self.trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                print(f"Disjoncteur Groq ouvert après {self.failures} échec(s)")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def release(self) -> None:
+        """
+        Appel terminé sans verdict sur l'état de l'API (annulé, ou limité par une erreur 429):
+        un autre appel d'essai peut être tenté.
+        """
+        self.trial_in_flight = False
+
+    def stats(self) -> Dict:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+def _retry_after_header(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_reason(error: Exception) -> str:
+    if isinstance(error, groq.RateLimitError):
+        return "rate_limit"
+    if isinstance(error, groq.InternalServerError):
+        return "server_error"
+    if isinstance(error, (groq.APITimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    return "connection"
+
+
+class LLMGateway:
+    def __init__(self, api_key: str, base_url: Optional[str] = None, max_concurrency: int = 16,
+                 timeout: float = 30.0, deadline: float = 60.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, max_connections: int = 32,
+                 keepalive_expiry: float = 60.0, breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            api_key: Clé de l'API Groq
+            base_url: URL de l'API (None: GROQ_BASE_URL ou l'URL par défaut du SDK)
+            max_concurrency: Nombre maximum d'appels simultanés (les suivants attendent leur tour)
+            timeout: Délai maximum d'une tentative en secondes
+            deadline: Délai maximum d'un appel en secondes, attente et nouvelles tentatives comprises
+            max_retries: Nombre maximum de nouvelles tentatives après le premier essai
+            backoff_base: Attente maximale avant la première nouvelle tentative (doublée à chaque essai)
+            backoff_max: Plafond de l'attente entre deux tentatives
+            max_connections: Taille du pool de connexions HTTP persistantes
+            keepalive_expiry: Durée de conservation d'une connexion inutilisée en secondes
+            breaker: Disjoncteur (par défaut: 5 échecs, 30 secondes)
+        """
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # Les nouvelles tentatives sont gérées ici (max_retries=0 dans le SDK); un seul client
+        # HTTP réutilise les connexions TLS entre les appels
+        self.client = groq.AsyncGroq(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            timeout=timeout,
+            http_client=groq.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections,
+                                    keepalive_expiry=keepalive_expiry)
+            ),
+        )
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """
+        Attente avant la nouvelle tentative numéro attempt + 1: tirée au hasard entre 0 et
+        backoff_base * 2^attempt (plafonnée), pour que les appels en échec ne reviennent pas
+        tous en même temps. Le délai Retry-After d'une erreur 429 est respecté.
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = _retry_after_header(error) if isinstance(error, groq.RateLimitError) else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @asynccontextmanager
+    async def _slot(self, deadline_at: float):
+        # L'attente d'une place compte dans le délai de l'appel
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(deadline_at - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            metrics.llm_rejections.inc(reason="overloaded")
+            raise LLMUnavailableError("Trop d'appels à l'API Groq en cours", retry_after=1.0) from None
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def _call(self, create, deadline_at: float):
+        """
+        Appelle create(timeout) en retentant les erreurs 429/5xx et les délais dépassés, dans la
+        limite de max_retries et du délai de l'appel.
+        """
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except LLMUnavailableError:
+                metrics.llm_rejections.inc(reason="circuit_open")
+                raise
+            remaining = deadline_at - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                # Le délai d'une tentative est aussi une limite sur sa durée totale (réponse lente
+                # envoyée par petits morceaux comprise)
+                result = await asyncio.wait_for(create(min(self.timeout, remaining)), remaining)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except RETRYABLE_ERRORS + (asyncio.TimeoutError,) as e:
+                if isinstance(e, groq.RateLimitError):
+                    self.breaker.release()
+                else:
+                    self.breaker.record_failure()
+                reason = _retry_reason(e)
+                delay = self.backoff(attempt, e)
+                attempt += 1
+                if attempt > self.max_retries or time.monotonic() + delay >= deadline_at:
+                    metrics.llm_rejections.inc(reason="deadline" if reason == "timeout" else "exhausted")
+                    raise LLMUnavailableError(
+                        f"API Groq indisponible après {attempt} tentative(s) ({reason}): {str(e) or reason}",
+                        retry_after=max(delay, 1.0)
+                    ) from e
+                metrics.llm_retries.inc(reason=reason)
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                # Erreur de la requête (400, 401...): l'API répond, elle n'est pas retentée
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def complete(self, deadline: Optional[float] = None, **params):
+        """
+        Demande une complétion (chat.completions.create sans streaming).
+
+        Args:
+            deadline: Délai maximum de l'appel en secondes (par défaut self.deadline)
+            params: Paramètres de chat.completions.create (model, messages...)
+
+        Returns:
+            La complétion de l'API
+
+        Raises:
+            LLMUnavailableError: Si l'API ne répond pas dans le délai, après les nouvelles
+                tentatives, ou si le disjoncteur est ouvert
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        async with self._slot(deadline_at):
+            return await self._call(
+                lambda timeout: self.client.chat.completions.create(timeout=timeout, **params), deadline_at
+            )
+
+    async def stream(self, deadline: Optional[float] = None, **params) -> AsyncIterator:
+        """
+        Variante en streaming de complete: renvoie les morceaux de la réponse. L'appel n'est
+        retenté qu'avant le premier morceau (les suivants ont pu être envoyés au client); le
+        délai s'applique jusqu'à la réception des en-têtes, puis timeout entre deux morceaux.
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        async with self._slot(deadline_at):
+            response = await self._call(
+                lambda timeout: self.client.chat.completions.create(stream=True, timeout=timeout, **params),
+                deadline_at
+            )
+            try:
+                async for chunk in response:
+                    yield chunk
+            except RETRYABLE_ERRORS + (httpx.HTTPError,) as e:
+                self.breaker.record_failure()
+                raise LLMUnavailableError(f"Flux de l'API Groq interrompu: {str(e)}") from e
+            finally:
+                await response.close()
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "circuit": self.breaker.stats(),
+        }
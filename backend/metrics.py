@@ -0,0 +1,253 @@
+"""
+Mesures de performance du backend: compteurs et histogrammes exposés au format texte de
+Prometheus (/metrics), et durée de chaque étape d'une requête (en-tête Server-Timing)
+"""
+import time
+import bisect
+import threading
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Bornes des histogrammes de durée, en secondes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Durée de chaque étape de la requête en cours: [(étape, secondes)], None hors d'une requête HTTP
+_request_stages: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_stages", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Valeurs des labels -> [effectif de chaque intervalle (+Inf compris), somme]
+        self.series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        self.observe_key(tuple(str(labels[name]) for name in self.labelnames), value)
+
+    def observe_key(self, key: Tuple[str, ...], value: float) -> None:
+        """
+        Variante de observe avec les valeurs des labels déjà dans l'ordre de labelnames.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self.series.items())
+        for key, counts, total in series:
+            # Les intervalles Prometheus sont cumulatifs
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Retourne toutes les mesures au format texte de Prometheus (version 0.0.4).
+        """
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "chat_stage_seconds", "Durée de chaque étape du traitement d'une question", ["stage"]
+)
+request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP", ["method", "route", "status"]
+)
+cache_lookups = registry.counter(
+    "chat_cache_lookups_total", "Recherches dans les caches de réponses", ["result"]
+)
+retrieval_cache_lookups = registry.counter(
+    "retrieval_cache_lookups_total", "Recherches dans le cache des résultats de l'index", ["result"]
+)
+llm_requests = registry.counter(
+    "llm_requests_total", "Appels à l'API Groq", ["mode", "outcome"]
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens facturés par l'API Groq", ["kind"]
+)
+llm_retries = registry.counter(
+    "llm_retries_total", "Nouvelles tentatives d'appel à l'API Groq", ["reason"]
+)
+llm_rejections = registry.counter(
+    "llm_rejections_total", "Appels à l'API Groq abandonnés (disjoncteur ouvert, délai dépassé...)", ["reason"]
+)
+llm_route_seconds = registry.histogram(
+    "llm_route_seconds", "Durée des appels à Groq par route (modèle rapide ou grand modèle)", ["route"]
+)
+llm_route_tokens = registry.counter(
+    "llm_route_tokens_total", "Tokens facturés par l'API Groq par route", ["route", "kind"]
+)
+llm_route_decisions = registry.counter(
+    "llm_route_decisions_total", "Questions envoyées à chaque route, par motif", ["route", "reason"]
+)
+llm_route_escalations = registry.counter(
+    "llm_route_escalations_total", "Réponses du modèle rapide redemandées au grand modèle", ["reason"]
+)
+coalesced_requests = registry.counter(
+    "coalesced_requests_total", "Requêtes qui ont attendu un calcul identique déjà en cours", ["kind"]
+)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """
+    Enregistre la durée d'une étape dans l'histogramme et dans le détail de la requête en cours.
+    """
+    stage_seconds.observe_key((stage,), seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+
+class stage:
+    """
+    Mesure la durée du bloc comme étape `name` de la requête en cours:
+
+        with metrics.stage("retrieval"):
+            ...
+    """
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def record_llm_usage(usage) -> None:
+    """
+    Compte les tokens d'une réponse Groq (objet usage de l'API, absent si None).
+    """
+    if usage is None:
+        return
+    llm_tokens.inc(getattr(usage, "prompt_tokens", 0) or 0, kind="prompt")
+    llm_tokens.inc(getattr(usage, "completion_tokens", 0) or 0, kind="completion")
+
+
+def server_timing(stages: List[Tuple[str, float]]) -> str:
+    """
+    Formate le détail des étapes pour l'en-tête Server-Timing (durées en millisecondes,
+    étapes répétées additionnées).
+    """
+    totals: Dict[str, float] = {}
+    for name, seconds in stages:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items())
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: mesure la durée de chaque requête HTTP et, si timing_header est vrai,
+    ajoute l'en-tête Server-Timing avec les étapes mesurées avant l'envoi des en-têtes.
+    """
+
+    def __init__(self, app, timing_header: bool = False):
+        self.app = app
+        self.timing_header = timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages: List[Tuple[str, float]] = []
+        token = _request_stages.set(stages)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if self.timing_header and stages:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(stages).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+            # Le modèle de route (/upload_status/{job_id}) évite une série par identifiant
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            request_seconds.observe(time.perf_counter() - start, method=scope["method"],
+                                    route=route, status=status[0])
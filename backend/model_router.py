@@ -0,0 +1,150 @@
+"""
+Choix du modèle Groq pour chaque question: les questions simples (salutations, remerciements,
+questions courtes bien couvertes par les documents) vont à un modèle rapide, les autres au grand
+modèle. Une réponse peu sûre du modèle rapide est redemandée au grand modèle
+"""
+import re
+import logging
+from typing import Dict, Iterable, Optional
+
+import metrics
+
+# Routes
+FAST = "fast"
+LARGE = "large"
+
+# Salutations et remerciements (message entier, ponctuation et formules de politesse comprises)
+_SMALL_TALK_PATTERN = re.compile(
+    r"^\W*(?:(?:bonjour|bonsoir|salut|coucou|hello|merci|ok|d'accord|au revoir|bonne (?:journée|soirée)"
+    r"|beaucoup|bien|très|parfait|super|top|cordialement"
+    r"|مرحبا|السلام عليكم|أهلا|اهلا|صباح الخير|مساء الخير|شكرا|شكرًا|جزيلا|بارك الله فيك|مع السلامة|حسنا)\W*)+$",
+    re.IGNORECASE
+)
+
+# Formules d'une réponse qui ne s'appuie pas sur le contexte ou reconnaît son incertitude
+_UNCERTAIN_PATTERN = re.compile(
+    r"ne contient pas d'information|pas d'information (?:pertinente|spécifique|précise)"
+    r"|je ne (?:sais|connais) pas|je ne suis pas (?:sûr|certain)|je ne peux pas (?:répondre|vous aider)"
+    r"|لا يحتوي|لا تتوفر|لا أعرف|لست متأكد|لا أستطيع الإجابة",
+    re.IGNORECASE
+)
+
+
+class ModelRouter:
+    def __init__(self, fast_model: Optional[str], large_model: str, max_fast_words: int = 20,
+                 max_fast_depth: int = 4, min_fast_score: float = 0.3,
+                 fast_languages: Iterable[str] = ("french",), min_answer_chars: int = 40):
+        """
+        Args:
+            fast_model: Modèle rapide (vide ou None: toutes les questions vont au grand modèle)
+            large_model: Grand modèle
+            max_fast_words: Nombre de mots au-delà duquel une question va au grand modèle
+            max_fast_depth: Nombre de questions de la conversation au-delà duquel le grand modèle répond
+            min_fast_score: Score minimal du meilleur passage (PDFIndexer.search) pour le modèle rapide
+            fast_languages: Langues (response_language) traitées par le modèle rapide
+            min_answer_chars: Longueur minimale d'une réponse du modèle rapide (hors salutations)
+        """
+        self.fast_model = fast_model or None
+        self.large_model = large_model
+        self.max_fast_words = max_fast_words
+        self.max_fast_depth = max_fast_depth
+        self.min_fast_score = min_fast_score
+        self.fast_languages = set(fast_languages)
+        self.min_answer_chars = min_answer_chars
+
+    @property
+    def enabled(self) -> bool:
+        return self.fast_model is not None and self.fast_model != self.large_model
+
+    def route(self, query: str, language: str, retrieval_score: Optional[float], depth: int,
+              cited_articles: int = 0) -> Dict:
+        """
+        Choisit le modèle d'une question. Les règles sont appliquées dans l'ordre, la première
+        qui s'applique l'emporte.
+
+        Args:
+            query: La question
+            language: Sa langue (response_language)
+            retrieval_score: Score du meilleur passage trouvé, None sans recherche
+            depth: Nombre de questions posées dans la conversation, celle-ci comprise
+            cited_articles: Nombre d'articles cités dans la question et trouvés dans l'index
+                (leur texte est dans le contexte, sans score de recherche comparable)
+
+        Returns:
+            {"route", "model", "reason", "words", "score", "language", "depth"}
+        """
+        words = len(query.split())
+        if not self.enabled:
+            route, reason = LARGE, "single_model"
+        elif _SMALL_TALK_PATTERN.match(query):
+            route, reason = FAST, "small_talk"
+        elif cited_articles:
+            route, reason = LARGE, "citation"
+        elif language not in self.fast_languages:
+            route, reason = LARGE, "language"
+        elif words > self.max_fast_words:
+            route, reason = LARGE, "long_query"
+        elif depth > self.max_fast_depth:
+            route, reason = LARGE, "deep_conversation"
+        elif retrieval_score is None:
+            route, reason = LARGE, "no_context"
+        elif retrieval_score < self.min_fast_score:
+            route, reason = LARGE, "weak_retrieval"
+        else:
+            route, reason = FAST, "simple_lookup"
+        metrics.llm_route_decisions.inc(route=route, reason=reason)
+        return {
+            "route": route,
+            "model": self.fast_model if route == FAST else self.large_model,
+            "reason": reason,
+            "words": words,
+            "score": retrieval_score,
+            "language": language,
+            "depth": depth,
+        }
+
+    def escalation_reason(self, decision: Dict, response: Optional[str],
+                          finish_reason: Optional[str]) -> Optional[str]:
+        """
+        Indique si la réponse du modèle rapide doit être redemandée au grand modèle.
+
+        Returns:
+            Le motif ("truncated", "too_short", "uncertain"), ou None si la réponse est conservée
+        """
+        if decision["route"] != FAST:
+            return None
+        response = (response or "").strip()
+        if finish_reason == "length":
+            return "truncated"
+        if decision["reason"] == "small_talk":
+            return None
+        if len(response) < self.min_answer_chars:
+            return "too_short"
+        if _UNCERTAIN_PATTERN.search(response):
+            return "uncertain"
+        return None
+
+    def escalate(self, decision: Dict, reason: str) -> Dict:
+        """
+        Retourne la décision pour le grand modèle après une réponse peu sûre du modèle rapide.
+        """
+        metrics.llm_route_escalations.inc(reason=reason)
+        return {**decision, "route": LARGE, "model": self.large_model, "reason": "escalated_" + reason}
+
+    def record(self, decision: Dict, seconds: float, usage) -> None:
+        """
+        Enregistre la durée et les tokens d'un appel (métriques par route et ligne de journal
+        avec les critères de la décision, pour ajuster les seuils sur le trafic réel).
+        """
+        route = decision["route"]
+        metrics.llm_route_seconds.observe(seconds, route=route)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        metrics.llm_route_tokens.inc(prompt_tokens, route=route, kind="prompt")
+        metrics.llm_route_tokens.inc(completion_tokens, route=route, kind="completion")
+        score = "-" if decision["score"] is None else f"{decision['score']:.3f}"
+        logging.info(
+            f"Route {route} ({decision['reason']}, {decision['model']}): {seconds:.2f}s, "
+            f"{prompt_tokens}+{completion_tokens} tokens; mots={decision['words']} score={score} "
+            f"langue={decision['language']} profondeur={decision['depth']}"
+        )
@@ -1,27 +1,612 @@
 import os
+import re
 import glob
-from typing import List, Dict, Optional
+import json
+import copy
+import time
+import bisect
+import signal
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+# numpy (environ 0,1 s d'import) reste importé au chargement du module: PDFIndexer.__init__,
+# les segments et l'index BM25 en ont besoin, et l'indexation démarre aussitôt en arrière-plan
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from retrieval_cache import RetrievalCache, strip_accents
+from index_segments import IndexSegment, SegmentDocuments, open_segment, remove_stale_segments, write_segment
+
+# scipy.sparse et scikit-learn (plus d'une seconde d'import) ne sont importés qu'à la première
+# indexation: l'application démarre sans les attendre
+if TYPE_CHECKING:
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+logger = logging.getLogger(__name__)
+
+# Version du format de l'index sur disque (à incrémenter à chaque changement de format)
+INDEX_FORMAT_VERSION = 5
+
+# État de l'index remplacé par une copie de travail modifiée (voir PDFIndexer._commit)
+STAGED_ATTRIBUTES = (
+    "documents", "document_paths", "page_offsets", "passage_doc_ids", "passage_spans", "passage_pages",
+    "vectorizer", "document_vectors", "file_signatures", "failed_files", "extra_files",
+    "pending_changes", "generation", "segment", "_scoring_matrix", "_bm25_index",
+)
+
+# Fichiers des anciens formats d'index, supprimés lors de la première sauvegarde
+LEGACY_INDEX_FILES = ("texts.json", "vocabulary.json", "idf.npy", "vectors.npz", "passages.npy")
+
+# Taille cible des passages indexés et chevauchement entre deux fenêtres consécutives
+PASSAGE_MAX_CHARS = 1500
+PASSAGE_OVERLAP = 200
+
+# Début d'article dans les codes: "Article 14", "Art. 21-2", "Article premier", "الفصل 5"
+ARTICLE_BOUNDARY_PATTERN = re.compile(
+    r"^[ \t]*(?:(?:article|art\.)[ \t]*(?:\d+|premier|1er)|الفصل[ \t]+\d+)",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Liste de mots vides français courants
+FRENCH_STOPWORDS = [
+    "a", "à", "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "elle", "en", 
+    "et", "eux", "il", "ils", "je", "la", "le", "les", "leur", "lui", "ma", "mais", "me", 
+    "même", "mes", "moi", "mon", "ni", "notre", "nous", "ou", "par", "pas", "pour", "qu", 
+    "que", "qui", "s", "sa", "se", "si", "son", "sur", "ta", "te", "tes", "toi", "ton", 
+    "tu", "un", "une", "votre", "vous", "c", "d", "j", "l", "m", "n", "s", "t", "y", "est", 
+    "été", "étée", "étées", "étés", "étant", "suis", "es", "est", "sommes", "êtes", "sont", 
+    "serai", "seras", "sera", "serons", "serez", "seront", "serais", "serait", "serions", 
+    "seriez", "seraient", "étais", "était", "étions", "étiez", "étaient", "fus", "fut", 
+    "fûmes", "fûtes", "furent", "sois", "soit", "soyons", "soyez", "soient", "fusse", 
+    "fusses", "fût", "fussions", "fussiez", "fussent"
+]
+
+# Les passages et les requêtes sont indexés en minuscules et sans accents ("préavis" et "preavis"
+# sont le même terme, comme dans les clés du cache des recherches): les mots vides aussi
+INDEX_STOPWORDS = sorted({strip_accents(word) for word in FRENCH_STOPWORDS})
+
+
+def rank_passages(query_vectors: "sp.csr_matrix", scoring_matrix: "sp.csr_matrix",
+                  top_k: int) -> List[List[Tuple[int, float]]]:
+    """
+    Sélectionne les top_k passages de plus grand score pour chaque requête.
+    
+    Les vecteurs des passages et des requêtes étant normalisés (L2), le produit scalaire
+    est directement la similarité cosinus. Le produit creux ne produit que les scores non
+    nuls, et la sélection se fait par argpartition (O(n)) avant de trier les k meilleurs.
+    
+    Args:
+        query_vectors: Les requêtes vectorisées (une ligne par requête)
+        scoring_matrix: La matrice des passages transposée (termes x passages), au format CSR
+        top_k: Le nombre de passages à retourner par requête
+        
+    Returns:
+        Pour chaque requête, la liste des (indice du passage, score) par score décroissant
+    """
+    scores = (query_vectors @ scoring_matrix).tocsr()
+    rankings = []
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        indices = scores.indices[start:end]
+        values = scores.data[start:end]
+        positive = values > 0.0
+        indices, values = indices[positive], values[positive]
+        if len(values) > top_k:
+            best = np.argpartition(-values, top_k - 1)[:top_k]
+            indices, values = indices[best], values[best]
+        order = np.argsort(-values, kind="stable")
+        rankings.append([(int(indices[i]), float(values[i])) for i in order])
+    return rankings
+
+
+class ExtractionTimeout(Exception):
+    """Levée lorsque l'extraction d'un PDF dépasse le délai autorisé."""
+
+
+def read_pdf_pages(pdf_path: str) -> List[str]:
+    """
+    Lit le texte de chaque page d'un fichier PDF avec PyPDF2 (compatible Windows).
+    Les erreurs de lecture sont propagées à l'appelant.
+    """
+    import PyPDF2
+    
+    pages = []
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page_num in range(len(reader.pages)):
+            page = reader.pages[page_num]
+            pages.append(page.extract_text() or "")
+    return pages
+
+
+# Formats dont le texte peut être extrait et indexé
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
+
+_DOCX_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def read_docx_pages(docx_path: str) -> List[str]:
+    """
+    Lit le texte d'un document Word (.docx) directement dans son XML, paragraphe par
+    paragraphe. Les pages sont délimitées par les sauts de page explicites.
+    """
+    import zipfile
+    from xml.etree import ElementTree
+    
+    with zipfile.ZipFile(docx_path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    
+    pages, paragraphs = [], []
+    for paragraph in root.iter(f"{_DOCX_NAMESPACE}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{_DOCX_NAMESPACE}t":
+                parts.append(node.text or "")
+            elif node.tag == f"{_DOCX_NAMESPACE}tab":
+                parts.append("\t")
+            elif node.tag == f"{_DOCX_NAMESPACE}br" and node.get(f"{_DOCX_NAMESPACE}type") == "page":
+                paragraphs.append("".join(parts))
+                pages.append("\n".join(paragraphs))
+                parts, paragraphs = [], []
+        paragraphs.append("".join(parts))
+    pages.append("\n".join(paragraphs))
+    return pages
+
+
+def read_text_pages(text_path: str) -> List[str]:
+    """
+    Lit un fichier texte (UTF-8); les sauts de page (\\f) délimitent les pages.
+    """
+    with open(text_path, "r", encoding="utf-8-sig", errors="replace") as file:
+        return file.read().split("\f")
+
+
+def read_document_pages(path: str) -> List[str]:
+    """
+    Lit le texte de chaque page d'un document selon son extension (PDF, DOCX ou TXT).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        return read_pdf_pages(path)
+    if extension == ".docx":
+        return read_docx_pages(path)
+    if extension == ".txt":
+        return read_text_pages(path)
+    raise ValueError(f"Format non pris en charge pour l'extraction: {extension}")
+
+
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout()
+
+
+def extract_pdf_worker(pdf_path: str, timeout: Optional[float]) -> Dict:
+    """
+    Extrait un document (PDF, DOCX ou TXT) dans un processus du pool d'ingestion.
+    
+    Le délai est appliqué par le processus lui-même (SIGALRM), ce qui interrompt un PDF
+    pathologique sans bloquer le reste de l'ingestion. Sous Windows (pas de SIGALRM),
+    aucun délai n'est appliqué.
+    
+    Returns:
+        Un dictionnaire avec le chemin, les pages, la durée et le statut de l'extraction
+    """
+    start = time.perf_counter()
+    use_alarm = timeout and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        pages = read_document_pages(pdf_path)
+        status, error = "extracted", None
+    except ExtractionTimeout:
+        pages, status, error = [], "timeout", f"délai de {timeout}s dépassé"
+    except Exception as e:
+        pages, status, error = [], "error", str(e)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return {
+        "path": pdf_path,
+        "pages": pages,
+        "seconds": time.perf_counter() - start,
+        "status": status,
+        "error": error,
+    }
+
+
+def _split_window(text: str, start: int, end: int, max_chars: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Découpe text[start:end] en fenêtres chevauchantes d'au plus max_chars caractères,
+    en coupant de préférence sur un espace.
+    """
+    spans = []
+    while end - start > max_chars:
+        cut = text.rfind(" ", start + max_chars // 2, start + max_chars)
+        if cut == -1:
+            cut = start + max_chars
+        spans.append((start, cut))
+        start = max(cut - overlap, start + 1)
+    spans.append((start, end))
+    return spans
+
+
+def chunk_text(text: str, max_chars: int = PASSAGE_MAX_CHARS,
+               overlap: int = PASSAGE_OVERLAP) -> List[Tuple[int, int]]:
+    """
+    Découpe un texte juridique en passages, de préférence sur les débuts d'articles.
+    
+    Les articles courts consécutifs sont regroupés jusqu'à max_chars caractères; les
+    articles trop longs (ou les textes sans articles) sont découpés en fenêtres qui se
+    chevauchent de overlap caractères.
+    
+    Args:
+        text: Le texte à découper
+        max_chars: La taille maximale d'un passage
+        overlap: Le chevauchement entre deux fenêtres d'un même article
+        
+    Returns:
+        La liste des positions (début, fin) des passages dans le texte
+    """
+    boundaries = [m.start() for m in ARTICLE_BOUNDARY_PATTERN.finditer(text)]
+    if not boundaries or boundaries[0] != 0:
+        boundaries.insert(0, 0)
+    boundaries.append(len(text))
+    
+    spans = []
+    group_start = None
+    for seg_start, seg_end in zip(boundaries, boundaries[1:]):
+        if seg_end - seg_start > max_chars:
+            if group_start is not None:
+                spans.append((group_start, seg_start))
+                group_start = None
+            spans.extend(_split_window(text, seg_start, seg_end, max_chars, overlap))
+        elif group_start is not None and seg_end - group_start > max_chars:
+            spans.append((group_start, seg_start))
+            group_start = seg_start
+        elif group_start is None:
+            group_start = seg_start
+    if group_start is not None:
+        spans.append((group_start, len(text)))
+    
+    # Ignorer les passages vides (pages blanches, espaces)
+    return [(start, end) for start, end in spans if text[start:end].strip()]
+
+
+def chunk_pages(pages: List[str]) -> List[Tuple[str, int, int]]:
+    """
+    Découpe un document (liste de pages) en passages.
+    
+    Returns:
+        La liste des (texte du passage, première page, dernière page), pages numérotées à partir de 1
+    """
+    offsets = []
+    position = 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + 2
+    text = "".join(page + "\n\n" for page in pages)
+    return [
+        (text[start:end], bisect.bisect_right(offsets, start), bisect.bisect_right(offsets, end - 1))
+        for start, end in chunk_text(text)
+    ]
+
 
 class PDFIndexer:
-    def __init__(self, pdf_directory: str):
+    def __init__(self, pdf_directory: str, index_directory: Optional[str] = "index_cache",
+                 max_workers: Optional[int] = None, extraction_timeout: Optional[float] = 120.0,
+                 retrieval_mode: str = "tfidf", reload_interval: float = 2.0,
+                 search_cache_size: int = 1000):
         """
         Initialise l'indexeur de PDF.
         
         Args:
             pdf_directory: Chemin vers le répertoire contenant les fichiers PDF juridiques
+                (les sous-répertoires sont parcourus)
+            index_directory: Répertoire où l'index est sauvegardé entre deux démarrages
+                (None pour désactiver la persistance)
+            max_workers: Nombre de processus d'extraction en parallèle (par défaut, le nombre de cœurs)
+            extraction_timeout: Délai maximum d'extraction d'un PDF en secondes (None pour aucun)
+            retrieval_mode: "tfidf" (similarité cosinus) ou "bm25" (index inversé BM25)
+            reload_interval: Délai minimum en secondes entre deux vérifications d'une nouvelle
+                génération de l'index publiée par un autre processus (voir reload_if_changed)
+            search_cache_size: Nombre de requêtes dont le classement est conservé (0 pour désactiver)
         """
+        if retrieval_mode not in ("tfidf", "bm25"):
+            raise ValueError(f"Mode de recherche inconnu: {retrieval_mode}")
         self.pdf_directory = pdf_directory
-        self.documents = []  # Liste pour stocker le contenu des documents
+        self.retrieval_mode = retrieval_mode
+        self.index_directory = index_directory
+        self.reload_interval = reload_interval
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.extraction_timeout = extraction_timeout
+        self.ingestion_report = []  # Durée, pages et statut de l'extraction de chaque fichier
+        self.indexing_files = 0  # Nombre de fichiers de l'indexation en cours ou de la dernière
+        self.documents = []  # Contenu des documents (liste, ou vue sur le segment projeté)
         self.document_paths = []  # Liste pour stocker les chemins des documents
         self.vectorizer = None  # Sera initialisé lors de l'indexation
-        self.document_vectors = None  # Sera initialisé lors de l'indexation
+        self.page_offsets = []  # Position de début de chaque page, par document
+        self.passage_doc_ids = np.empty(0, dtype=np.int64)  # Document de chaque passage
+        self.passage_spans = np.empty((0, 2), dtype=np.int64)  # Positions (début, fin) des passages
+        self.passage_pages = np.empty((0, 2), dtype=np.int64)  # Pages (première, dernière) des passages
+        self.document_vectors = None  # Vecteurs TF-IDF des passages, initialisés lors de l'indexation
+        self.file_signatures = {}  # Chemin -> (taille, mtime) des fichiers indexés
+        self.failed_files = {}  # Chemin -> (taille, mtime) des fichiers dont l'extraction a échoué
+        self.extra_files = {}  # Chemin -> (taille, mtime) des documents ajoutés hors de pdf_directory
+        self.pending_changes = 0  # Ajouts/suppressions depuis le dernier entraînement du vectoriseur
+        self.generation = 0  # Incrémenté à chaque modification de l'index
+        self._scoring_matrix = None  # (génération, matrice transposée) utilisée pour la recherche
+        self._bm25_index = None  # (génération, index BM25) en mode "bm25"
+        # Classement des passages des requêtes déjà vues, vidé à chaque nouvelle génération
+        self.search_cache = RetrievalCache(search_cache_size, INDEX_STOPWORDS)
+        self._lock = threading.RLock()  # Protège l'index pendant les recherches et les modifications
+        self._write_lock = threading.Lock()  # Une seule modification à la fois (voir _commit)
+        # Segment projeté en mémoire dont sont lus les textes, passages et la matrice (None tant
+        # que l'index est en cours de modification ou si la persistance est désactivée)
+        self.segment: Optional[IndexSegment] = None
+        self._manifest_stamp = None  # (inode, taille, mtime) du manifeste chargé
+        self._reload_checked_at = 0.0
+        
+    @staticmethod
+    def file_signature(path: str) -> List[int]:
+        """
+        Calcule la signature d'un fichier (taille et date de modification).
+        
+        Args:
+            path: Chemin vers le fichier
+            
+        Returns:
+            [taille en octets, mtime en nanosecondes]
+        """
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    
+    def _build_vectorizer(self) -> "TfidfVectorizer":
+        """
+        Crée le vectoriseur TF-IDF utilisé pour l'indexation.
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
+        return TfidfVectorizer(
+            lowercase=True,
+            strip_accents="unicode",
+            stop_words=INDEX_STOPWORDS,  # Utiliser notre liste de mots vides français
+            max_df=0.85,
+            min_df=2,
+            norm="l2",  # Vecteurs normalisés une fois pour toutes: le produit scalaire est le cosinus
+            dtype=np.float32
+        )
+    
+    def _manifest_path(self) -> str:
+        return os.path.join(self.index_directory, "manifest.json")
+    
+    @staticmethod
+    def _stamp(stat: os.stat_result) -> Tuple[int, int, int]:
+        # Un manifeste remplacé par os.replace change d'inode même si sa taille et sa date sont identiques
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    
+    def _read_manifest(self) -> Tuple[Dict, Tuple[int, int, int]]:
+        """
+        Returns:
+            (manifeste, identité du fichier lu)
+        """
+        with open(self._manifest_path(), "r", encoding="utf-8") as f:
+            stamp = self._stamp(os.fstat(f.fileno()))
+            return json.load(f), stamp
+    
+    def load_index(self) -> Optional[Dict]:
+        """
+        Charge le manifeste de l'index sauvegardé sur disque et projette le segment qu'il désigne.
         
+        Returns:
+            Un dictionnaire contenant le manifeste, son identité ("stamp") et le segment
+            (None s'il est absent ou illisible). None si aucun index valide n'existe.
+        """
+        if not self.index_directory:
+            return None
+        
+        try:
+            manifest, stamp = self._read_manifest()
+        except (OSError, ValueError) as e:
+            print(f"Aucun index réutilisable dans {self.index_directory}: {str(e)}")
+            return None
+        if manifest.get("version") != INDEX_FORMAT_VERSION:
+            print(f"Format d'index obsolète ({manifest.get('version')}), reconstruction nécessaire")
+            return None
+        
+        return {"manifest": manifest, "stamp": stamp,
+                "segment": open_segment(self.index_directory, manifest.get("segment"))}
+    
+    def save_index(self) -> None:
+        """
+        Publie l'index courant sur disque: un nouveau segment immuable (voir _write_segment),
+        puis le manifeste qui le désigne (voir _publish).
+        """
+        if not self.index_directory:
+            return
+        try:
+            self._publish(self.segment if self.segment is not None else self._write_segment())
+        except OSError as e:
+            logger.error(f"Erreur lors de la sauvegarde de l'index: {str(e)}")
+    
+    def _write_segment(self) -> Optional[IndexSegment]:
+        """
+        Écrit l'index en mémoire dans un nouveau segment immuable (textes, passages,
+        vocabulaire, IDF, matrice et, en mode "bm25", postings BM25), sans le publier. Ne
+        nécessite pas le verrou si l'index n'est modifié par aucun autre thread (copie de
+        travail, voir _staging_copy).
+        
+        Returns:
+            Le segment projeté en mémoire, ou None si l'index est vide
+        """
+        if self.vectorizer is None or self.document_vectors is None:
+            return None
+        os.makedirs(self.index_directory, exist_ok=True)
+        passages = np.column_stack([self.passage_doc_ids, self.passage_spans, self.passage_pages])
+        bm25 = self._get_bm25_index() if self.retrieval_mode == "bm25" else None
+        name = write_segment(self.index_directory, self.documents, self.page_offsets, passages,
+                             self.vectorizer.vocabulary_, self.vectorizer.idf_, self._get_scoring_matrix(),
+                             bm25)
+        return IndexSegment(self.index_directory, name)
+    
+    def _publish(self, segment: Optional[IndexSegment]) -> None:
+        """
+        Écrit le manifeste qui désigne le segment (le verrou doit être détenu). Le manifeste est
+        remplacé atomiquement: c'est lui qui fait passer les autres processus à la nouvelle
+        génération (voir reload_if_changed). L'index de ce processus est ensuite lu dans le
+        segment, ce qui libère sa copie privée.
+        """
+        os.makedirs(self.index_directory, exist_ok=True)
+        manifest_path = self._manifest_path()
+        try:
+            previous = self._read_manifest()[0].get("segment")
+        except (OSError, ValueError):
+            previous = None
+        
+        manifest = {
+            "version": INDEX_FORMAT_VERSION,
+            "segment": segment.name if segment is not None else None,
+            "document_paths": self.document_paths,
+            "files": self.file_signatures,
+            "failed": self.failed_files,
+            "extra_files": self.extra_files,
+            "pending_changes": self.pending_changes,
+        }
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        stamp = self._stamp(os.stat(tmp_path))
+        os.replace(tmp_path, manifest_path)
+        self._manifest_stamp = stamp
+        if segment is not None and segment is not self.segment:
+            self._attach(segment, manifest)
+        
+        # Le segment précédent reste disponible pour les processus qui ne l'ont pas encore quitté
+        remove_stale_segments(self.index_directory, keep={manifest["segment"], previous})
+        for name in LEGACY_INDEX_FILES:
+            legacy_path = os.path.join(self.index_directory, name)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+        logger.info(f"Index sauvegardé dans {self.index_directory}")
+    
+    def _attach(self, segment: IndexSegment, manifest: Dict) -> None:
+        """
+        Lit désormais l'index dans un segment projeté en mémoire (le verrou doit être détenu).
+        Aucun tableau n'est recopié: textes, passages, vocabulaire et matrice restent dans
+        les pages du segment, partagées avec les autres processus.
+        """
+        vectorizer = self._build_vectorizer()
+        vectorizer.vocabulary_ = segment.vocabulary
+        vectorizer.idf_ = segment.idf
+        self.segment = segment
+        self.documents = SegmentDocuments(segment)
+        self.page_offsets = []
+        self.document_paths = list(manifest["document_paths"])
+        self.file_signatures = manifest["files"]
+        self.failed_files = manifest.get("failed", {})
+        self.extra_files = manifest.get("extra_files", {})
+        self.pending_changes = manifest.get("pending_changes", 0)
+        self.passage_doc_ids = segment.passage_doc_ids
+        self.passage_spans = segment.passage_spans
+        self.passage_pages = segment.passage_pages
+        self.vectorizer = vectorizer
+        # Transposée de la matrice du segment: une vue (CSC), sans copie
+        self.document_vectors = segment.scoring_matrix.T
+        self._scoring_matrix = None
+        self._bm25_index = None
+    
+    def _materialize(self) -> None:
+        """
+        Recopie l'index projeté en mémoire privée avant de le modifier (sur une copie de
+        travail, voir _staging_copy). Le segment n'est jamais modifié: la sauvegarde suivante
+        en publie un nouveau.
+        """
+        segment = self.segment
+        if segment is None:
+            return
+        self.documents, self.page_offsets = [], []
+        for doc_id in range(len(segment)):
+            text, offsets = self._join_pages(segment.document_pages(doc_id))
+            self.documents.append(text)
+            self.page_offsets.append(offsets)
+        self.passage_doc_ids = np.array(segment.passage_doc_ids)
+        self.passage_spans = np.array(segment.passage_spans)
+        self.passage_pages = np.array(segment.passage_pages)
+        self.vectorizer = self._build_vectorizer()
+        self.vectorizer.vocabulary_ = segment.vocabulary.to_dict()
+        self.vectorizer.idf_ = np.array(segment.idf)
+        self.document_vectors = segment.scoring_matrix.T.tocsr()
+        self.segment = None
+        self._scoring_matrix = None
+    
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """
+        Passe à la dernière génération de l'index publiée sur disque (par un autre worker,
+        après un ajout de document ou une réindexation), sans redémarrage: le nouveau
+        segment est projeté hors du verrou puis installé d'un coup, et les recherches en
+        cours se terminent sur l'ancien.
+        
+        Le manifeste n'est examiné (un stat) qu'une fois par reload_interval secondes au plus,
+        sauf si force est vrai.
+        
+        Returns:
+            True si une nouvelle génération a été installée
+        """
+        if not self.index_directory:
+            return False
+        now = time.monotonic()
+        if not force and now - self._reload_checked_at < self.reload_interval:
+            return False
+        self._reload_checked_at = now
+        
+        seen = self._manifest_stamp
+        try:
+            if self._stamp(os.stat(self._manifest_path())) == seen:
+                return False
+            manifest, stamp = self._read_manifest()
+        except (OSError, ValueError):
+            return False
+        name = manifest.get("segment")
+        if manifest.get("version") != INDEX_FORMAT_VERSION or not name:
+            return False
+        
+        segment = self.segment if self.segment is not None and self.segment.name == name else None
+        if segment is None:
+            segment = open_segment(self.index_directory, name)
+            if segment is None:
+                return False
+        
+        with self._lock:
+            # Ce processus a publié une génération plus récente entre-temps
+            if self._manifest_stamp != seen:
+                return False
+            self._manifest_stamp = stamp
+            self.generation += 1
+            self._attach(segment, manifest)
+            self._warm_up()
+        logger.info(f"Index rechargé depuis le segment {name}: {len(self.document_paths)} documents, "
+                    f"{len(self.passage_doc_ids)} passages")
+        return True
+        
+    def extract_pages_from_pdf(self, pdf_path: str) -> List[str]:
+        """
+        Extrait le texte de chaque page d'un fichier PDF en utilisant PyPDF2 (compatible Windows).
+        
+        Args:
+            pdf_path: Chemin vers le fichier PDF
+            
+        Returns:
+            La liste des textes des pages (vide en cas d'erreur)
+        """
+        try:
+            return read_pdf_pages(pdf_path)
+        except Exception as e:
+            print(f"Erreur lors de l'extraction du texte de {pdf_path}: {str(e)}")
+            return []
+    
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """
-        Extrait le texte d'un fichier PDF en utilisant PyPDF2 (compatible Windows).
+        Extrait le texte d'un fichier PDF.
         
         Args:
             pdf_path: Chemin vers le fichier PDF
@@ -29,116 +614,681 @@ class PDFIndexer:
         Returns:
             Le texte extrait du PDF
         """
-        try:
-            import PyPDF2
+        return "".join(page + "\n\n" for page in self.extract_pages_from_pdf(pdf_path))
+    
+    def document_pages(self) -> List[Tuple[str, List[str]]]:
+        """
+        Retourne (chemin, texte de chaque page) de tous les documents indexés.
+        """
+        with self._lock:
+            return [(path, self.get_pages(doc_id)) for doc_id, path in enumerate(self.document_paths)]
+    
+    def get_pages(self, doc_id: int) -> List[str]:
+        """
+        Retourne le texte de chaque page d'un document indexé.
+        """
+        if self.segment is not None:
+            return self.segment.document_pages(doc_id)
+        text = self.documents[doc_id]
+        offsets = self.page_offsets[doc_id] + [len(text)]
+        # Chaque page est suivie de deux sauts de ligne ajoutés lors de l'extraction
+        return [text[start:end - 2] for start, end in zip(offsets, offsets[1:])]
+    
+    @staticmethod
+    def _join_pages(pages: List[str]) -> Tuple[str, List[int]]:
+        """
+        Returns:
+            (texte du document, chaque page suivie de deux sauts de ligne; position du début de chaque page)
+        """
+        offsets = []
+        position = 0
+        for page in pages:
+            offsets.append(position)
+            position += len(page) + 2
+        return "".join(page + "\n\n" for page in pages), offsets
+    
+    def _add_pages(self, path: str, pages: List[str]) -> bool:
+        """
+        Ajoute un document (liste de pages) aux listes de documents indexés (qui doivent être
+        en mémoire, voir _materialize).
+        
+        Returns:
+            True si le document contient du texte
+        """
+        if not any(page.strip() for page in pages):
+            return False
+        text, offsets = self._join_pages(pages)
+        self.documents.append(text)
+        self.document_paths.append(path)
+        self.page_offsets.append(offsets)
+        return True
+    
+    def _chunk_documents(self, doc_ids: List[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Découpe des documents indexés en passages et calcule leurs pages.
+        
+        Returns:
+            (document de chaque passage, positions (début, fin), pages (première, dernière))
+        """
+        passage_doc_ids, spans, pages = [], [], []
+        for doc_id in doc_ids:
+            offsets = self.page_offsets[doc_id]
+            for start, end in chunk_text(self.documents[doc_id]):
+                passage_doc_ids.append(doc_id)
+                spans.append((start, end))
+                # Numéros de page à partir de 1
+                pages.append((bisect.bisect_right(offsets, start), bisect.bisect_right(offsets, end - 1)))
+        return (
+            np.array(passage_doc_ids, dtype=np.int64),
+            np.array(spans, dtype=np.int64).reshape(-1, 2),
+            np.array(pages, dtype=np.int64).reshape(-1, 2),
+        )
+    
+    def _build_passages(self) -> None:
+        """
+        Découpe tous les documents indexés en passages.
+        """
+        self.passage_doc_ids, self.passage_spans, self.passage_pages = self._chunk_documents(
+            list(range(len(self.documents)))
+        )
+    
+    def get_passage_text(self, passage_id: int) -> str:
+        """
+        Retourne le texte d'un passage indexé.
+        """
+        if self.segment is not None:
+            return self.segment.passage_text(passage_id)
+        start, end = self.passage_spans[passage_id]
+        return self.documents[self.passage_doc_ids[passage_id]][start:end]
+    
+    def find_pdf_files(self) -> List[str]:
+        """
+        Retourne tous les fichiers PDF du répertoire et de ses sous-répertoires, triés.
+        """
+        pattern = os.path.join(self.pdf_directory, "**", "*")
+        return sorted(
+            path for path in glob.glob(pattern, recursive=True)
+            if path.lower().endswith(".pdf") and os.path.isfile(path)
+        )
+    
+    def extract_files(self, pdf_paths: List[str]) -> Dict[str, List[str]]:
+        """
+        Extrait plusieurs documents (PDF, DOCX, TXT) en parallèle dans un pool de processus.
+        
+        Chaque résultat est ajouté au rapport d'ingestion (self.ingestion_report) dès que
+        son extraction est terminée.
+        
+        Args:
+            pdf_paths: Les fichiers à extraire
             
-            text = ""
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(reader.pages)):
-                    page = reader.pages[page_num]
-                    text += page.extract_text() + "\n\n"
+        Returns:
+            Un dictionnaire chemin -> pages des fichiers extraits avec succès
+        """
+        extracted = {}
+        if not pdf_paths:
+            return extracted
+        
+        workers = min(self.max_workers, len(pdf_paths))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(extract_pdf_worker, path, self.extraction_timeout) for path in pdf_paths]
+            for future in as_completed(futures):
+                result = future.result()
+                pages = result.pop("pages")
+                result["page_count"] = len(pages)
+                self.ingestion_report.append(result)
+                if result["status"] == "extracted":
+                    extracted[result["path"]] = pages
+                    print(f"Indexé: {os.path.basename(result['path'])} "
+                          f"({len(pages)} pages, {result['seconds']:.2f}s)")
+                else:
+                    print(f"Erreur lors de l'extraction du texte de {result['path']}: {result['error']}")
+        return extracted
+    
+    def _is_in_pdf_directory(self, path: str) -> bool:
+        directory = os.path.abspath(self.pdf_directory)
+        return os.path.commonpath([directory, os.path.abspath(path)]) == directory
+    
+    def _fit(self) -> None:
+        """
+        Entraîne le vectoriseur TF-IDF sur tous les passages et recalcule la matrice.
+        """
+        if len(self.passage_doc_ids):
+            self.vectorizer = self._build_vectorizer()
+            self.document_vectors = self.vectorizer.fit_transform(
+                self.get_passage_text(i) for i in range(len(self.passage_doc_ids))
+            )
+        else:
+            self.vectorizer = None
+            self.document_vectors = None
+        self.pending_changes = 0
+    
+    def _warm_up(self) -> None:
+        """
+        Prépare les structures de recherche pour que la première requête ne les construise pas
+        (le verrou doit être détenu).
+        """
+        if self.document_vectors is None:
+            return
+        if self.retrieval_mode == "bm25":
+            self._get_bm25_index()
+        else:
+            self._get_scoring_matrix()
+    
+    def _staging_copy(self) -> "PDFIndexer":
+        """
+        Copie de travail de l'index, modifiée hors du verrou puis installée par _commit
+        (appelée avec self._lock). Les listes et dictionnaires sont recopiés; les tableaux,
+        la matrice et le segment, qui ne sont jamais modifiés en place, sont partagés.
+        """
+        staging = copy.copy(self)
+        staging._lock = threading.RLock()
+        if staging.segment is None:
+            staging.documents = list(self.documents)
+        staging.document_paths = list(self.document_paths)
+        staging.page_offsets = list(self.page_offsets)
+        staging.file_signatures = dict(self.file_signatures)
+        staging.failed_files = dict(self.failed_files)
+        staging.extra_files = dict(self.extra_files)
+        return staging
+    
+    def _commit(self, staging: "PDFIndexer", generation: int) -> bool:
+        """
+        Installe une copie de travail modifiée (voir _staging_copy). Les structures de
+        recherche et le nouveau segment sont construits hors du verrou; sous le verrou, le
+        manifeste est publié et l'index remplacé d'un coup. Les recherches ne sont donc
+        bloquées que le temps de ce remplacement.
+        
+        Args:
+            staging: La copie de travail
+            generation: Génération de l'index au moment de la copie
             
-            return text
-        except Exception as e:
-            print(f"Erreur lors de l'extraction du texte de {pdf_path}: {str(e)}")
-            return ""
+        Returns:
+            False si l'index a changé depuis la copie (modification à refaire sur la nouvelle génération)
+        """
+        staging._warm_up()
+        segment = staging.segment
+        publish = bool(self.index_directory)
+        if publish and segment is None:
+            try:
+                segment = staging._write_segment()
+            except OSError as e:
+                logger.error(f"Erreur lors de la sauvegarde de l'index: {str(e)}")
+                publish = False
+        
+        with self._lock:
+            if self.generation != generation:
+                return False
+            for name in STAGED_ATTRIBUTES:
+                setattr(self, name, getattr(staging, name))
+            if publish:
+                try:
+                    self._publish(segment)
+                except OSError as e:
+                    logger.error(f"Erreur lors de la sauvegarde de l'index: {str(e)}")
+            self._warm_up()
+            return True
+    
+    def add_document(self, path: str, pages: Optional[List[str]] = None) -> bool:
+        """
+        Ajoute (ou met à jour) un document dans l'index sans réentraîner le vectoriseur.
+        
+        Les passages du document sont vectorisés avec le vocabulaire existant et ajoutés à
+        la matrice; les mots absents du vocabulaire ne seront pris en compte qu'au prochain
+        réentraînement (voir refit). Un document déjà indexé et inchangé est ignoré. Le
+        nouvel index est construit sur une copie de travail, hors du verrou (voir _commit).
+        
+        Args:
+            path: Chemin vers le document (PDF, DOCX ou TXT)
+            pages: Texte des pages s'il a déjà été extrait (par la file d'ingestion)
+            
+        Returns:
+            True si le document est indexé
+        """
+        signature = self.file_signature(path)
+        # Partir de la dernière génération publiée, qui peut contenir les ajouts d'autres workers
+        self.reload_if_changed(force=True)
+        with self._lock:
+            if path in self.document_paths and self.file_signatures.get(path) == signature:
+                return True
+        
+        # L'extraction se fait hors du verrou pour ne pas bloquer les recherches
+        if pages is None:
+            pages = self.extract_files([path]).get(path, [])
+        
+        with self._write_lock:
+            while True:
+                with self._lock:
+                    generation = self.generation
+                    staging = self._staging_copy()
+                indexed = staging._add_document(path, signature, pages)
+                if self._commit(staging, generation):
+                    break
+                # Index modifié entre-temps (nouvelle génération publiée par un autre worker)
+                self.reload_if_changed(force=True)
+        if indexed:
+            logger.info(f"Document ajouté à l'index: {os.path.basename(path)}")
+        return indexed
+    
+    def _add_document(self, path: str, signature: List[int], pages: List[str]) -> bool:
+        """
+        Ajoute un document à une copie de travail (voir add_document).
+        
+        Returns:
+            True si le document contient du texte
+        """
+        if path in self.document_paths or any(page.strip() for page in pages):
+            self._materialize()
+        if path in self.document_paths:
+            self._remove_document(path)
+        self.file_signatures[path] = signature
+        if not self._is_in_pdf_directory(path):
+            self.extra_files[path] = signature
+        if not self._add_pages(path, pages):
+            self.failed_files[path] = signature
+            return False
+        self.failed_files.pop(path, None)
+        
+        doc_id = len(self.documents) - 1
+        if self.vectorizer is None:
+            self._build_passages()
+            self._fit()
+        else:
+            doc_ids, spans, pages = self._chunk_documents([doc_id])
+            start, end = spans[:, 0], spans[:, 1]
+            text = self.documents[doc_id]
+            vectors = self.vectorizer.transform([text[a:b] for a, b in zip(start, end)])
+            import scipy.sparse as sp
+            
+            self.document_vectors = sp.vstack([self.document_vectors, vectors], format="csr")
+            self.passage_doc_ids = np.concatenate([self.passage_doc_ids, doc_ids])
+            self.passage_spans = np.concatenate([self.passage_spans, spans])
+            self.passage_pages = np.concatenate([self.passage_pages, pages])
+            self.pending_changes += 1
+        self.generation += 1
+        return True
+    
+    def _remove_document(self, path: str) -> None:
+        """
+        Retire un document et ses passages de l'index (copie de travail en mémoire, voir
+        _staging_copy et _materialize).
+        """
+        doc_id = self.document_paths.index(path)
+        keep = self.passage_doc_ids != doc_id
+        if self.document_vectors is not None:
+            self.document_vectors = self.document_vectors[keep]
+        doc_ids = self.passage_doc_ids[keep]
+        # Les documents suivants sont décalés d'une position
+        self.passage_doc_ids = np.where(doc_ids > doc_id, doc_ids - 1, doc_ids)
+        self.passage_spans = self.passage_spans[keep]
+        self.passage_pages = self.passage_pages[keep]
+        del self.documents[doc_id]
+        del self.document_paths[doc_id]
+        del self.page_offsets[doc_id]
+        self.pending_changes += 1
+        self.generation += 1
+    
+    def remove_document(self, path: str) -> bool:
+        """
+        Retire un document de l'index sans réentraîner le vectoriseur (sur une copie de
+        travail, hors du verrou, voir _commit).
+        
+        Args:
+            path: Chemin du document tel qu'indexé
+            
+        Returns:
+            True si le document était indexé
+        """
+        self.reload_if_changed(force=True)
+        with self._write_lock:
+            while True:
+                with self._lock:
+                    self.file_signatures.pop(path, None)
+                    self.extra_files.pop(path, None)
+                    self.failed_files.pop(path, None)
+                    if path not in self.document_paths:
+                        return False
+                    generation = self.generation
+                    staging = self._staging_copy()
+                staging._materialize()
+                staging._remove_document(path)
+                if self._commit(staging, generation):
+                    break
+                self.reload_if_changed(force=True)
+        logger.info(f"Document retiré de l'index: {os.path.basename(path)}")
+        return True
+    
+    def refit(self) -> bool:
+        """
+        Réentraîne le vectoriseur sur tous les passages pour intégrer le vocabulaire des
+        documents ajoutés depuis la dernière indexation complète.
+        
+        L'entraînement et l'écriture du segment se font hors du verrou; le nouvel index n'est
+        installé que s'il n'a pas été modifié entre-temps.
+        
+        Returns:
+            True si le nouvel index a été installé
+        """
+        with self._write_lock:
+            with self._lock:
+                generation = self.generation
+                staging = self._staging_copy()
+            texts = [staging.get_passage_text(i) for i in range(len(staging.passage_doc_ids))]
+            if not texts:
+                return False
+            
+            vectorizer = self._build_vectorizer()
+            vectors = vectorizer.fit_transform(texts)
+            staging._materialize()
+            staging.vectorizer = vectorizer
+            staging.document_vectors = vectors
+            staging.pending_changes = 0
+            staging.generation += 1
+            if not self._commit(staging, generation):
+                logger.info("Index modifié pendant le réentraînement, nouvelle tentative nécessaire")
+                return False
+        logger.info(f"Vectoriseur réentraîné sur {len(texts)} passages")
+        return True
     
     def index_documents(self) -> None:
         """
-        Indexe tous les documents PDF dans le répertoire spécifié.
+        Indexe tous les documents PDF dans le répertoire spécifié (et les documents ajoutés
+        avec add_document). Chaque document est découpé en passages (voir chunk_text) et
+        c'est chaque passage qui est vectorisé.
+        
+        L'index sauvegardé sur disque est réutilisé: seuls les PDF nouveaux ou modifiés
+        (taille ou date de modification différente) sont réextraits. Si aucun fichier n'a
+        changé, le segment sauvegardé est projeté en mémoire directement, sans réentraîner
+        le vectoriseur ni recopier les textes, et un appel répété sur un index déjà à jour
+        ne fait rien.
         """
-        # Trouver tous les fichiers PDF dans le répertoire
-        pdf_files = glob.glob(os.path.join(self.pdf_directory, "*.pdf"))
+        start_time = time.perf_counter()
+        
+        snapshot = self.load_index()
+        manifest = snapshot["manifest"] if snapshot else {}
+        segment = snapshot["segment"] if snapshot else None
+        cached_files = manifest.get("files", {})
+        cached_failed = manifest.get("failed", {})
+        # Fichier -> document du segment, pour les fichiers dont le texte y est conservé
+        cached_documents = (
+            {path: doc_id for doc_id, path in enumerate(manifest["document_paths"])} if segment else {}
+        )
+        
+        # Trouver tous les fichiers PDF dans le répertoire et ses sous-répertoires,
+        # ainsi que les documents ajoutés individuellement qui existent toujours
+        pdf_files = self.find_pdf_files()
+        extra_files = dict(manifest.get("extra_files", {}))
+        extra_files.update(self.extra_files)
+        pdf_files += sorted(path for path in extra_files if path not in pdf_files and os.path.isfile(path))
         
         if not pdf_files:
-            print(f"Aucun fichier PDF trouvé dans {self.pdf_directory}")
+            logger.warning(f"Aucun fichier PDF trouvé dans {self.pdf_directory}")
             return
         
-        # Extraire le texte de chaque PDF
+        file_signatures = {path: self.file_signature(path) for path in pdf_files}
+        self.indexing_files = len(pdf_files)
+        with self._lock:
+            if self.vectorizer is not None and file_signatures == self.file_signatures and not self.pending_changes:
+                logger.info("Index déjà à jour, aucun document modifié")
+                return
+        
+        # Reprendre le texte des PDF inchangés depuis l'index, extraire les autres en parallèle.
+        # Un PDF en échec n'est réessayé que s'il a été modifié depuis.
+        to_extract = [
+            path for path in pdf_files
+            if cached_files.get(path) != file_signatures[path]
+            or (path not in cached_documents and cached_failed.get(path) != file_signatures[path])
+        ]
+        self.ingestion_report = [
+            {"path": path,
+             "page_count": segment.page_count(cached_documents[path]) if path in cached_documents else 0,
+             "seconds": 0.0, "status": "cached" if path in cached_documents else "failed", "error": None}
+            for path in pdf_files if path not in to_extract
+        ]
+        new_texts = self.extract_files(to_extract)
+        extracted = len(to_extract)
+        if to_extract:
+            slowest = sorted(self.ingestion_report, key=lambda r: r["seconds"], reverse=True)[:5]
+            logger.info("Extractions les plus longues: " + ", ".join(
+                f"{os.path.basename(r['path'])} ({r['page_count']} pages, {r['seconds']:.2f}s)" for r in slowest
+            ))
+        
+        # Index inchangé: projeter le segment sauvegardé (vocabulaire, matrice, passages et textes)
+        if (extracted == 0 and segment is not None
+                and manifest["document_paths"] == [path for path in pdf_files if path in cached_documents]
+                and set(cached_files) == set(file_signatures)):
+            with self._write_lock, self._lock:
+                self.generation += 1
+                self._manifest_stamp = snapshot["stamp"]
+                self._attach(segment, manifest)
+                self.file_signatures = file_signatures
+                self.failed_files = {path: file_signatures[path] for path in pdf_files if path not in cached_documents}
+                self.extra_files = {path: file_signatures[path] for path in extra_files if path in file_signatures}
+                self._warm_up()
+            logger.info(f"Index chargé depuis {self.index_directory} en "
+                        f"{time.perf_counter() - start_time:.3f}s. {len(self.documents)} documents, "
+                        f"{len(self.passage_doc_ids)} passages indexés.")
+            return
+        
+        # Le nouvel index est construit sur une copie de travail, hors du verrou (voir _commit):
+        # les recherches continuent sur l'ancien pendant l'entraînement et l'écriture du segment
+        with self._write_lock:
+            while True:
+                with self._lock:
+                    generation = self.generation
+                    staging = self._staging_copy()
+                staging._rebuild(pdf_files, file_signatures, to_extract, new_texts, segment,
+                                 cached_documents, extra_files)
+                if self._commit(staging, generation):
+                    break
+                # Génération installée entre-temps (rechargée depuis un autre worker): elle est remplacée
+        if staging.vectorizer is not None:
+            logger.info(f"Indexation terminée en {time.perf_counter() - start_time:.3f}s. "
+                        f"{len(staging.documents)} documents ({extracted} extraits), "
+                        f"{len(staging.passage_doc_ids)} passages indexés.")
+        else:
+            logger.warning("Aucun document n'a pu être indexé.")
+    
+    def _rebuild(self, pdf_files: List[str], file_signatures: Dict[str, List[int]], to_extract: List[str],
+                 new_texts: Dict[str, List[str]], segment: Optional[IndexSegment],
+                 cached_documents: Dict[str, int], extra_files: Dict[str, List[int]]) -> None:
+        """
+        Reconstruit entièrement une copie de travail (voir index_documents): documents,
+        passages et vectoriseur.
+        
+        Args:
+            pdf_files: Les fichiers à indexer, dans l'ordre
+            file_signatures: Signature de chaque fichier
+            to_extract: Les fichiers réextraits
+            new_texts: Pages des fichiers extraits avec succès
+            segment: Segment sauvegardé dont sont repris les autres fichiers (None s'il n'y en a pas)
+            cached_documents: Fichier -> document du segment
+            extra_files: Documents ajoutés hors de pdf_directory
+        """
+        self.segment = None
+        self.documents = []
+        self.document_paths = []
+        self.page_offsets = []
+        self.failed_files = {}
         for pdf_path in pdf_files:
-            text = self.extract_text_from_pdf(pdf_path)
-            if text:
-                self.documents.append(text)
-                self.document_paths.append(pdf_path)
-                print(f"Indexé: {os.path.basename(pdf_path)}")
-        
-        # Créer un vectoriseur TF-IDF et transformer les documents
-        if self.documents:
-            # Définir une liste de mots vides français courants
-            french_stopwords = [
-                "a", "à", "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "elle", "en", 
-                "et", "eux", "il", "ils", "je", "la", "le", "les", "leur", "lui", "ma", "mais", "me", 
-                "même", "mes", "moi", "mon", "ni", "notre", "nous", "ou", "par", "pas", "pour", "qu", 
-                "que", "qui", "s", "sa", "se", "si", "son", "sur", "ta", "te", "tes", "toi", "ton", 
-                "tu", "un", "une", "votre", "vous", "c", "d", "j", "l", "m", "n", "s", "t", "y", "est", 
-                "été", "étée", "étées", "étés", "étant", "suis", "es", "est", "sommes", "êtes", "sont", 
-                "serai", "seras", "sera", "serons", "serez", "seront", "serais", "serait", "serions", 
-                "seriez", "seraient", "étais", "était", "étions", "étiez", "étaient", "fus", "fut", 
-                "fûmes", "fûtes", "furent", "sois", "soit", "soyons", "soyez", "soient", "fusse", 
-                "fusses", "fût", "fussions", "fussiez", "fussent"
-            ]
+            if pdf_path in to_extract:
+                pages = new_texts.get(pdf_path, [])
+            elif pdf_path in cached_documents:
+                pages = segment.document_pages(cached_documents[pdf_path])
+            else:
+                pages = []
+            if not self._add_pages(pdf_path, pages):
+                self.failed_files[pdf_path] = file_signatures[pdf_path]
+        self.file_signatures = file_signatures
+        self.extra_files = {path: file_signatures[path] for path in extra_files if path in file_signatures}
+        
+        # Découper les documents en passages, puis créer un vectoriseur TF-IDF sur les passages
+        self._build_passages()
+        self._fit()
+        self.generation += 1
+    
+    def index_progress(self) -> Dict[str, int]:
+        """
+        Retourne l'avancement de l'indexation: fichiers à traiter et fichiers déjà repris de
+        l'index ou extraits.
+        """
+        return {"files": self.indexing_files, "processed": len(self.ingestion_report)}
+    
+    def _get_scoring_matrix(self) -> "sp.csr_matrix":
+        """
+        Retourne la matrice des passages transposée (termes x passages) au format CSR,
+        recalculée uniquement lorsque l'index a changé (le verrou doit être détenu). Un index
+        projeté utilise directement la matrice du segment.
+        """
+        if self.segment is not None:
+            return self.segment.scoring_matrix
+        if self._scoring_matrix is None or self._scoring_matrix[0] != self.generation:
+            self._scoring_matrix = (self.generation, self.document_vectors.T.tocsr())
+        return self._scoring_matrix[1]
+    
+    def _get_bm25_index(self):
+        """
+        Retourne l'index BM25 des passages (le verrou doit être détenu). Un index projeté
+        utilise les postings du segment; sinon (index en cours de modification, ou segment
+        publié en mode "tfidf") l'index est construit en mémoire, uniquement lorsque l'index a changé.
+        """
+        if self.segment is not None and self.segment.bm25 is not None:
+            return self.segment.bm25
+        if self._bm25_index is None or self._bm25_index[0] != self.generation:
+            from bm25_index import BM25Index
             
-            self.vectorizer = TfidfVectorizer(
-                lowercase=True,
-                stop_words=french_stopwords,  # Utiliser notre liste de mots vides français
-                max_df=0.85,
-                min_df=2
-            )
-            self.document_vectors = self.vectorizer.fit_transform(self.documents)
-            print(f"Indexation terminée. {len(self.documents)} documents indexés.")
-        else:
-            print("Aucun document n'a pu être indexé.")
+            bm25 = BM25Index()
+            bm25.build(self.get_passage_text(i) for i in range(len(self.passage_doc_ids)))
+            self._bm25_index = (self.generation, bm25)
+        return self._bm25_index[1]
     
-    def search(self, query: str, top_k: int = 3) -> List[Dict[str, str]]:
+    def _format_result(self, passage_id: int, score: float) -> Dict:
+        doc_id = int(self.passage_doc_ids[passage_id])
+        return {
+            "path": self.document_paths[doc_id],
+            "content": self.get_passage_text(passage_id),
+            "pages": (int(self.passage_pages[passage_id][0]), int(self.passage_pages[passage_id][1])),
+            "score": score
+        }
+    
+    def search(self, query: str, top_k: int = 5) -> List[Dict]:
         """
-        Recherche les documents les plus pertinents pour une requête donnée.
+        Recherche les passages les plus pertinents pour une requête donnée.
         
         Args:
             query: La requête de recherche
-            top_k: Le nombre de documents à retourner
+            top_k: Le nombre de passages à retourner
             
         Returns:
-            Une liste de dictionnaires contenant le chemin du document, son contenu et son score
+            Une liste de dictionnaires contenant le chemin du document, le texte du passage,
+            ses pages (première, dernière) et son score
         """
-        # Vérifier si l'index a été créé
-        if not self.vectorizer or self.document_vectors is None or len(self.documents) == 0:
-            print("L'index n'a pas été créé. Veuillez d'abord indexer les documents.")
-            return []
+        return self.search_many([query], top_k)[0]
+    
+    def search_many(self, queries: List[str], top_k: int = 5) -> List[List[Dict]]:
+        """
+        Recherche les passages les plus pertinents pour plusieurs requêtes en une seule
+        multiplication de matrices creuses.
         
-        # Transformer la requête en vecteur TF-IDF
-        query_vector = self.vectorizer.transform([query])
+        Args:
+            queries: Les requêtes de recherche
+            top_k: Le nombre de passages à retourner par requête
+            
+        Returns:
+            Pour chaque requête, la liste de résultats (voir search)
+        """
+        with self._lock:
+            entries = self._ranking_entries(queries, top_k)
+            # Ne retourner que les passages avec une similarité positive
+            return [
+                [self._format_result(passage_id, score) for passage_id, score in entry["ranking"]]
+                for entry in entries
+            ]
+
+    def _ranking_entries(self, queries: List[str], top_k: int) -> List[Dict]:
+        """
+        Classement des passages de chaque requête, lu dans le cache ou calculé en une seule
+        passe pour les requêtes absentes (appelée avec self._lock).
         
-        # Calculer la similarité cosinus entre la requête et tous les documents
-        similarities = cosine_similarity(query_vector, self.document_vectors).flatten()
+        Returns:
+            Pour chaque requête, l'entrée du cache (voir RetrievalCache.set)
+        """
+        # Index pas encore créé ou vide: aucun passage à classer
+        if not self.vectorizer or self.document_vectors is None or len(self.passage_doc_ids) == 0:
+            return [{"ranking": (), "contexts": {}} for _ in queries]
         
-        # Trier les documents par similarité décroissante
-        top_indices = similarities.argsort()[::-1][:top_k]
+        keys = [self.search_cache.key(query, top_k, self.retrieval_mode) for query in queries]
+        entries = [self.search_cache.get(key, self.generation) for key in keys]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if not missing:
+            return entries
         
-        results = []
-        for idx in top_indices:
-            if similarities[idx] > 0.0:  # Ne retourner que les documents avec une similarité positive
-                results.append({
-                    "path": self.document_paths[idx],
-                    "content": self.documents[idx][:1000] + "...",  # Tronquer pour éviter des textes trop longs
-                    "score": float(similarities[idx])
-                })
+        if self.retrieval_mode == "bm25":
+            bm25 = self._get_bm25_index()
+            rankings = [bm25.search(queries[i], top_k) for i in missing]
+        else:
+            # Transformer les requêtes en vecteurs TF-IDF normalisés et calculer les similarités
+            query_vectors = self.vectorizer.transform([queries[i] for i in missing])
+            rankings = rank_passages(query_vectors, self._get_scoring_matrix(), top_k)
+        for i, ranking in zip(missing, rankings):
+            entries[i] = self.search_cache.set(keys[i], self.generation, ranking)
+        return entries
+
+    def retrieve(self, query: str, max_chars: int = 4000,
+                 extra_results: Optional[List[Dict]] = None) -> Tuple[str, float]:
+        """
+        Contexte pertinent pour une requête et score du meilleur passage de l'index. Sans
+        résultats supplémentaires, le contexte est construit une seule fois par requête et
+        conservé avec son classement dans le cache.
         
-        return results
+        Args:
+            query: La requête de recherche
+            max_chars: Le nombre maximum de caractères à retourner
+            extra_results: Résultats placés avant ceux de l'index (documents propres à la
+                conversation), au même format que ceux de search
+            
+        Returns:
+            (contexte, score du meilleur passage de l'index, 0 s'il n'y en a aucun)
+        """
+        with self._lock:
+            entry = self._ranking_entries([query], 5)[0]
+            ranking = entry["ranking"]
+            score = ranking[0][1] if ranking else 0.0
+            if extra_results:
+                results = extra_results + [self._format_result(passage_id, s) for passage_id, s in ranking]
+                return self.format_context(results, max_chars), score
+            context = entry["contexts"].get(max_chars)
+            if context is None:
+                results = [self._format_result(passage_id, s) for passage_id, s in ranking]
+                context = entry["contexts"][max_chars] = self.format_context(results, max_chars)
+            return context, score
 
-    def get_relevant_context(self, query: str, max_chars: int = 4000) -> str:
+    def get_relevant_context(self, query: str, max_chars: int = 4000,
+                             extra_results: Optional[List[Dict]] = None) -> str:
         """
         Obtient le contexte pertinent pour une requête donnée.
         
         Args:
             query: La requête de recherche
             max_chars: Le nombre maximum de caractères à retourner
+            extra_results: Résultats placés avant ceux de l'index (documents propres à la
+                conversation), au même format que ceux de search
             
         Returns:
             Un texte contenant les informations pertinentes des documents
         """
-        results = self.search(query, top_k=3)
+        return self.retrieve(query, max_chars, extra_results)[0]
+    
+    def format_context(self, results: List[Dict], max_chars: int = 4000) -> str:
+        """
+        Met en forme des résultats (au format de search) en contexte pour le LLM.
         
+        Args:
+            results: Les passages, dans l'ordre où ils doivent apparaître
+            max_chars: Le nombre maximum de caractères à retourner
+            
+        Returns:
+            Le contexte, ou une chaîne vide s'il n'y a aucun résultat
+        """
         if not results:
             return ""
         
@@ -147,7 +1297,9 @@ class PDFIndexer:
         
         total_chars = len(context)
         for i, result in enumerate(results):
-            doc_info = f"Document {i+1} ({os.path.basename(result['path'])}, score: {result['score']:.2f}):\n"
+            first_page, last_page = result['pages']
+            pages = f"page {first_page}" if first_page == last_page else f"pages {first_page}-{last_page}"
+            doc_info = f"Document {i+1} ({os.path.basename(result['path'])}, {pages}, score: {result['score']:.2f}):\n"
             doc_content = result['content']
             
             # Vérifier si l'ajout de ce document dépasserait la limite de caractères
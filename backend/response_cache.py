@@ -0,0 +1,117 @@
+"""
+Cache LRU des réponses du chatbot, avec expiration (TTL), limite mémoire et statistiques
+"""
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def make_cache_key(user_query: str, last_messages: List[Dict[str, str]]) -> str:
+    """
+    Construit une clé de cache compacte à partir de la requête et des derniers messages.
+
+    Args:
+        user_query: La question de l'utilisateur
+        last_messages: Les derniers messages de la conversation
+
+    Returns:
+        Une empreinte hexadécimale de 32 caractères
+    """
+    payload = json.dumps([user_query, last_messages], ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_size: int = 100, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        """
+        Initialise le cache.
+
+        Args:
+            max_size: Nombre maximum d'entrées
+            ttl: Durée de vie d'une entrée en secondes (None pour ne jamais expirer)
+            max_bytes: Taille mémoire maximale approximative des clés et valeurs (None pour illimitée)
+        """
+        self.cache = OrderedDict()  # Clé -> (valeur, date d'insertion, taille), du moins au plus récent
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(key: str, value: Any) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value)
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self.cache.pop(key)
+        self.current_bytes -= size
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, created_at, _ = entry
+            if self.ttl is not None and time.monotonic() - created_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            # Marquer l'entrée comme la plus récemment utilisée
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        size = self._entry_size(key, value)
+        with self._lock:
+            if key in self.cache:
+                self._remove(key)
+            # Une valeur plus grande que le cache entier n'est pas conservée
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+
+            # Supprimer les éléments les moins récemment utilisés tant que le cache est plein
+            while self.cache and (
+                len(self.cache) >= self.max_size
+                or (self.max_bytes is not None and self.current_bytes + size > self.max_bytes)
+            ):
+                oldest_key = next(iter(self.cache))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+            self.cache[key] = (value, time.monotonic(), size)
+            self.current_bytes += size
+
+    def clear(self) -> None:
+        with self._lock:
+            self.cache.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retourne les compteurs du cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.cache),
+                "max_size": self.max_size,
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,129 @@
+"""
+Cache des résultats de recherche dans l'index: une requête déjà vue (à la casse, aux accents,
+aux espaces et aux mots vides près) retrouve le classement des passages sans refaire la
+vectorisation, le calcul des scores et le tri. Le contexte envoyé au LLM n'est construit qu'à
+la première utilisation de l'entrée
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import metrics
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def strip_accents(text: str) -> str:
+    """
+    Retire les accents d'un texte, comme strip_accents="unicode" de scikit-learn (utilisé par
+    les vectoriseurs de l'index): les clés du cache et les termes de l'index coïncident.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_query(query: str, stop_words: Iterable[str] = ()) -> str:
+    """
+    Forme normalisée d'une requête: minuscules, sans accents ni mots vides, mots triés
+    (l'ordre des mots ne change pas le classement TF-IDF ou BM25; les répétitions, qui le
+    changent, sont conservées).
+
+    Args:
+        query: La requête
+        stop_words: Mots vides, déjà normalisés (voir RetrievalCache)
+
+    Returns:
+        Les mots restants séparés par des espaces
+    """
+    tokens = _TOKEN_PATTERN.findall(strip_accents(query.lower()))
+    return " ".join(sorted(token for token in tokens if token not in stop_words))
+
+
+class RetrievalCache:
+    def __init__(self, max_entries: int = 1000, stop_words: Iterable[str] = ()):
+        """
+        Args:
+            max_entries: Nombre maximum de requêtes conservées (0 pour désactiver le cache)
+            stop_words: Mots vides du vectoriseur, ignorés dans les clés
+        """
+        # (requête normalisée, nombre de passages, mode) -> {"ranking": ((passage, score), ...),
+        # "contexts": {max_chars: contexte}}, du moins au plus récemment utilisé
+        self.entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self.max_entries = max_entries
+        self.stop_words = frozenset(strip_accents(word.lower()) for word in stop_words)
+        self.generation = None  # Génération de l'index des entrées en cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def key(self, query: str, top_k: int, mode: str) -> Tuple[str, int, str]:
+        return normalize_query(query, self.stop_words), top_k, mode
+
+    def _check_generation(self, generation: int) -> None:
+        # L'index a changé (ajout, suppression, réindexation): les classements sont périmés
+        if generation != self.generation:
+            if self.entries:
+                self.invalidations += 1
+                self.entries.clear()
+            self.generation = generation
+
+    def get(self, key: Hashable, generation: int) -> Optional[Dict]:
+        """
+        Retourne l'entrée d'une requête pour la génération courante de l'index, ou None.
+        """
+        with self._lock:
+            self._check_generation(generation)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        metrics.retrieval_cache_lookups.inc(result="miss" if entry is None else "hit")
+        return entry
+
+    def set(self, key: Hashable, generation: int, ranking: List[Tuple[int, float]]) -> Dict:
+        """
+        Enregistre le classement d'une requête.
+
+        Args:
+            key: Clé de la requête (voir key)
+            generation: Génération de l'index qui a produit le classement
+            ranking: Les (indice du passage, score) par score décroissant
+
+        Returns:
+            L'entrée créée (les contextes y sont ajoutés à la demande)
+        """
+        entry = {"ranking": tuple(ranking), "contexts": {}}
+        if self.max_entries <= 0:
+            return entry
+        with self._lock:
+            self._check_generation(generation)
+            self.entries.pop(key, None)
+            while len(self.entries) >= self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = entry
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,174 @@
+"""
+Documents téléversés dans une conversation: cherchables uniquement dans cette conversation,
+sans modifier l'index partagé. Les passages sont conservés dans une base SQLite partagée par
+tous les workers uvicorn; chaque worker construit le petit index BM25 d'une conversation à
+la première recherche, puis à chaque nouvelle version de ses documents
+"""
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+from bm25_index import BM25Index
+from pdf_indexer import chunk_pages
+
+
+class ScopedDocumentIndex:
+    def __init__(self, path: str = "uploads.db", max_conversations: int = 1000):
+        """
+        Initialise l'index des documents par conversation.
+
+        Args:
+            path: Base SQLite des passages (partagée par les workers)
+            max_conversations: Nombre maximum de conversations avec des documents (celles dont
+                les documents ont été ajoutés le moins récemment sont oubliées)
+        """
+        self.path = path
+        self.max_conversations = max_conversations
+        # Index BM25 construits par ce worker, du moins au plus récemment utilisé:
+        # conversation -> {"passages": [(nom, texte, première page, dernière page)], "bm25": BM25Index, "version": n}
+        self.conversations: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS scoped_conversations ("
+                "conversation_id TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS scoped_passages ("
+                "conversation_id TEXT NOT NULL, name TEXT NOT NULL, text TEXT NOT NULL, "
+                "first_page INTEGER NOT NULL, last_page INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS scoped_passages_conversation ON scoped_passages (conversation_id, name)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS scoped_conversations_updated_at ON scoped_conversations (updated_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Une connexion par thread (threads de recherche et d'ingestion)
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def add(self, conversation_id: str, name: str, pages: List[str]) -> int:
+        """
+        Ajoute (ou remplace) un document de la conversation. Son index BM25 sera reconstruit
+        par chaque worker à sa prochaine recherche dans la conversation.
+
+        Args:
+            conversation_id: La conversation propriétaire du document
+            name: Nom du document
+            pages: Texte de chaque page
+
+        Returns:
+            Le nombre de passages indexés pour ce document
+        """
+        passages = [(conversation_id, name, text, first, last) for text, first, last in chunk_pages(pages)]
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "DELETE FROM scoped_passages WHERE conversation_id = ? AND name = ?", (conversation_id, name)
+            )
+            connection.executemany("INSERT INTO scoped_passages VALUES (?, ?, ?, ?, ?)", passages)
+            connection.execute(
+                "INSERT INTO scoped_conversations VALUES (?, 1, ?) ON CONFLICT(conversation_id) DO UPDATE "
+                "SET version = version + 1, updated_at = excluded.updated_at", (conversation_id, time.time())
+            )
+            # Les conversations les moins récemment modifiées au-delà de la capacité sont oubliées
+            forgotten = [row[0] for row in connection.execute(
+                "SELECT conversation_id FROM scoped_conversations ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+                (self.max_conversations,)
+            )]
+            for forgotten_id in forgotten:
+                self._delete(connection, forgotten_id)
+        return len(passages)
+
+    @staticmethod
+    def _delete(connection: sqlite3.Connection, conversation_id: str) -> None:
+        connection.execute("DELETE FROM scoped_passages WHERE conversation_id = ?", (conversation_id,))
+        connection.execute("DELETE FROM scoped_conversations WHERE conversation_id = ?", (conversation_id,))
+
+    def remove(self, conversation_id: str) -> None:
+        with self._connect() as connection:
+            self._delete(connection, conversation_id)
+        with self._lock:
+            self.conversations.pop(conversation_id, None)
+
+    def version(self, conversation_id: str) -> int:
+        """
+        Retourne le numéro de version des documents de la conversation (0 si elle n'en a pas),
+        lu dans la base: un document ajouté par un autre worker est pris en compte.
+        """
+        row = self._connect().execute(
+            "SELECT version FROM scoped_conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _load(self, conversation_id: str, version: int) -> Dict:
+        """
+        Lit les passages de la conversation et construit leur index BM25 (hors de _lock, pour
+        ne pas bloquer les recherches des autres conversations).
+        """
+        passages = self._connect().execute(
+            "SELECT name, text, first_page, last_page FROM scoped_passages WHERE conversation_id = ? "
+            "ORDER BY rowid", (conversation_id,)
+        ).fetchall()
+        bm25 = BM25Index()
+        if passages:
+            bm25.build(text for _, text, _, _ in passages)
+        entry = {"passages": passages, "bm25": bm25, "version": version}
+        with self._lock:
+            current = self.conversations.get(conversation_id)
+            if current is None or current["version"] < version:
+                self.conversations[conversation_id] = entry
+            self.conversations.move_to_end(conversation_id)
+            while len(self.conversations) > self.max_conversations:
+                self.conversations.popitem(last=False)
+        return entry
+
+    def search(self, conversation_id: str, query: str, top_k: int = 2) -> List[Dict]:
+        """
+        Recherche dans les documents de la conversation.
+
+        Returns:
+            Les résultats au format de PDFIndexer.search (chemin, contenu, pages, score)
+        """
+        version = self.version(conversation_id)
+        with self._lock:
+            entry = self.conversations.get(conversation_id)
+            if version == 0:
+                self.conversations.pop(conversation_id, None)
+                return []
+            if entry is not None and entry["version"] == version:
+                self.conversations.move_to_end(conversation_id)
+            else:
+                entry = None
+        if entry is None:
+            entry = self._load(conversation_id, version)
+        passages = entry["passages"]
+        return [
+            {
+                "path": passages[i][0],
+                "content": passages[i][1],
+                "pages": (passages[i][2], passages[i][3]),
+                "score": score
+            }
+            for i, score in entry["bm25"].search(query, top_k)
+        ]
+
+    def stats(self) -> Dict:
+        connection = self._connect()
+        conversations = connection.execute("SELECT COUNT(*) FROM scoped_conversations").fetchone()[0]
+        passages = connection.execute("SELECT COUNT(*) FROM scoped_passages").fetchone()[0]
+        with self._lock:
+            loaded = len(self.conversations)
+        return {"conversations": conversations, "passages": passages, "loaded": loaded}
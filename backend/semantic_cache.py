@@ -0,0 +1,185 @@
+"""
+Cache sémantique des réponses: retrouve une réponse déjà générée pour une question
+formulée différemment (mêmes mots significatifs, à l'ordre, aux accents et aux mots
+vides près)
+"""
+import re
+import math
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from pdf_indexer import FRENCH_STOPWORDS
+
+# Mots vides supplémentaires fréquents dans les questions
+QUESTION_STOPWORDS = {
+    "quel", "quels", "quelle", "quelles", "quoi", "comment", "combien", "est-ce", "cas",
+    "puis", "peut", "peux", "dois", "doit", "faut", "svp", "merci", "bonjour",
+    "ما", "هي", "هو", "كيف", "في", "من", "على", "الى", "إلى", "عن", "هل",
+}
+
+_STOPWORDS = frozenset(
+    unicodedata.normalize("NFKD", word).encode("ascii", "ignore").decode("ascii") or word
+    for word in set(FRENCH_STOPWORDS) | QUESTION_STOPWORDS
+)
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_question(text: str) -> FrozenSet[str]:
+    """
+    Réduit une question à l'ensemble de ses mots significatifs: minuscules, sans accents,
+    sans mots vides et sans marque du pluriel. Les nombres (numéros d'articles) sont
+    toujours conservés, même d'un seul chiffre.
+
+    Args:
+        text: La question de l'utilisateur
+
+    Returns:
+        L'ensemble des mots normalisés
+    """
+    # Supprimer les accents latins sans toucher aux caractères arabes
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in decomposed if not unicodedata.combining(c))
+
+    tokens = set()
+    for token in _TOKEN_PATTERN.findall(text):
+        if token.isdigit():
+            tokens.add(token)
+            continue
+        if token in _STOPWORDS or len(token) < 2:
+            continue
+        if len(token) > 3 and token[-1] in "sx" and token.isascii():
+            token = token[:-1]
+        tokens.add(token)
+    return frozenset(tokens)
+
+
+def _numbers(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    return frozenset(token for token in tokens if token.isdigit())
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.8, max_size: int = 50000):
+        """
+        Initialise le cache sémantique.
+
+        Args:
+            threshold: Similarité de Jaccard minimale entre deux questions pour réutiliser la réponse
+            max_size: Nombre maximum de questions conservées (les moins récemment utilisées sont supprimées)
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self.entries = OrderedDict()  # Identifiant -> (langue, mots, réponse)
+        # Index inversé par langue: mot -> identifiants des questions qui le contiennent
+        self.postings: Dict[str, Dict[str, set]] = defaultdict(lambda: defaultdict(set))
+        self.exact: Dict[Tuple[str, FrozenSet[str]], int] = {}
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, entry_id: int) -> None:
+        language, tokens, _ = self.entries.pop(entry_id)
+        self.exact.pop((language, tokens), None)
+        postings = self.postings[language]
+        for token in tokens:
+            ids = postings[token]
+            ids.discard(entry_id)
+            if not ids:
+                del postings[token]
+
+    def _find(self, tokens: FrozenSet[str], language: str) -> Tuple[Optional[int], float]:
+        entry_id = self.exact.get((language, tokens))
+        if entry_id is not None:
+            return entry_id, 1.0
+
+        postings = self.postings.get(language)
+        if not postings:
+            return None, 0.0
+
+        # Filtrage par préfixe: une question de similarité >= seuil partage au moins
+        # ceil(seuil * |q|) mots avec la requête, donc au moins un de ses mots les plus rares
+        ordered = sorted(tokens, key=lambda token: len(postings.get(token, ())))
+        prefix_length = len(tokens) - math.ceil(self.threshold * len(tokens)) + 1
+        candidates = set()
+        for token in ordered[:prefix_length]:
+            candidates.update(postings.get(token, ()))
+
+        # Deux questions qui ne citent pas les mêmes numéros (d'article, de loi) ne se
+        # ressemblent jamais, quel que soit le nombre de mots en commun
+        numbers = _numbers(tokens)
+        best_id, best_score = None, 0.0
+        for candidate in candidates:
+            candidate_tokens = self.entries[candidate][1]
+            if _numbers(candidate_tokens) != numbers:
+                continue
+            overlap = len(tokens & candidate_tokens)
+            score = overlap / (len(tokens) + len(candidate_tokens) - overlap)
+            if score > best_score:
+                best_id, best_score = candidate, score
+        return best_id, best_score
+
+    def get(self, question: str, language: str) -> Optional[str]:
+        """
+        Cherche une réponse à une question similaire dans la même langue.
+
+        Returns:
+            La réponse en cache, ou None si aucune question n'atteint le seuil
+        """
+        tokens = normalize_question(question)
+        with self._lock:
+            if not tokens:
+                self.misses += 1
+                return None
+            entry_id, score = self._find(tokens, language)
+            if entry_id is None or score < self.threshold:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(entry_id)
+            self.hits += 1
+            return self.entries[entry_id][2]
+
+    def set(self, question: str, language: str, response: str) -> None:
+        """
+        Enregistre la réponse générée pour une question.
+        """
+        tokens = normalize_question(question)
+        if not tokens:
+            return
+        with self._lock:
+            existing = self.exact.get((language, tokens))
+            if existing is not None:
+                self._remove(existing)
+            while len(self.entries) >= self.max_size:
+                self._remove(next(iter(self.entries)))
+
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = (language, tokens, response)
+            self.exact[(language, tokens)] = entry_id
+            postings = self.postings[language]
+            for token in tokens:
+                postings[token].add(entry_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.postings.clear()
+            self.exact.clear()
+
+    def stats(self) -> Dict:
+        """
+        Retourne les compteurs du cache (chaque succès est un appel au LLM économisé).
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "llm_calls_saved": self.hits,
+            }
@@ -0,0 +1,62 @@
+"""
+Regroupement des requêtes identiques en cours: le premier appelant lance le calcul, les
+suivants attendent le même résultat au lieu de refaire la recherche ou l'appel à Groq
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Nom du groupe (pour les statistiques)
+        """
+        self.name = name
+        # Clé -> [tâche partagée, nombre d'appelants qui l'attendent]
+        self.inflight: Dict[Hashable, list] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self.inflight
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Exécute factory() une seule fois pour tous les appels simultanés avec la même clé.
+
+        L'exception éventuelle est transmise à tous les appelants, et la clé est libérée dès
+        la fin du calcul: l'appel suivant recommence (aucun échec n'est mis en cache). Un
+        appelant annulé n'annule pas le calcul tant que d'autres l'attendent; le calcul est
+        annulé quand plus personne ne l'attend.
+
+        Returns:
+            Le résultat de factory()
+        """
+        entry = self.inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(factory())
+            entry = self.inflight[key] = [task, 0]
+            self.leaders += 1
+
+            def release(_, key=key, entry=entry):
+                if self.inflight.get(key) is entry:
+                    del self.inflight[key]
+
+            task.add_done_callback(release)
+        else:
+            self.coalesced += 1
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and entry[1] == 1:
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self.inflight), "leaders": self.leaders, "coalesced": self.coalesced}
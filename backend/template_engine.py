@@ -0,0 +1,145 @@
+"""
+Modèles de documents juridiques: chaque modèle est découpé une seule fois en texte fixe et
+variables {{nom}}, mis en cache (invalidé quand le fichier change) puis rempli en une passe
+"""
+import os
+import re
+import json
+import zipfile
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+class CompiledTemplate:
+    def __init__(self, source: str):
+        """
+        Découpe le modèle en segments: literals[i] précède la variable names[i], et le
+        dernier segment de texte suit la dernière variable.
+
+        Args:
+            source: Texte du modèle avec ses variables {{nom}}
+        """
+        self.literals: List[str] = []
+        self.names: List[str] = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(source):
+            self.literals.append(source[position:match.start()])
+            self.names.append(match.group(1))
+            position = match.end()
+        self.literals.append(source[position:])
+        self.placeholders = frozenset(self.names)
+
+    def check(self, parameters: Dict) -> Tuple[List[str], List[str]]:
+        """
+        Returns:
+            (variables du modèle absentes des paramètres, paramètres inconnus du modèle)
+        """
+        missing = sorted(self.placeholders.difference(parameters))
+        unknown = sorted(set(parameters).difference(self.placeholders))
+        return missing, unknown
+
+    def render(self, parameters: Dict) -> str:
+        """
+        Remplit le modèle en une passe, comme l'ancien remplacement: une variable absente des
+        paramètres est laissée telle quelle ({{nom}}), une valeur None est écrite "None".
+        """
+        parts = []
+        for literal, name in zip(self.literals, self.names):
+            parts.append(literal)
+            parts.append(str(parameters[name]) if name in parameters else f"{{{{{name}}}}}")
+        parts.append(self.literals[-1])
+        return "".join(parts)
+
+
+class TemplateStore:
+    def __init__(self, directory: str = "document_templates"):
+        """
+        Initialise le cache des modèles.
+
+        Args:
+            directory: Dossier des modèles (<type>_<langue>.txt)
+        """
+        self.directory = directory
+        # Chemin -> (date de modification, taille, modèle compilé)
+        self.templates: Dict[str, Tuple[int, int, CompiledTemplate]] = {}
+        self._listing: Optional[Tuple[int, List[Dict[str, str]]]] = None
+        self._lock = threading.Lock()
+
+    def get(self, document_type: str, language: str) -> Optional[CompiledTemplate]:
+        """
+        Retourne le modèle compilé, relu uniquement si le fichier a changé.
+
+        Returns:
+            Le modèle, ou None s'il n'existe pas
+        """
+        path = os.path.join(self.directory, f"{document_type}_{language}.txt")
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self.templates.pop(path, None)
+            return None
+
+        with self._lock:
+            cached = self.templates.get(path)
+        if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        with open(path, "r", encoding="utf-8") as f:
+            template = CompiledTemplate(f.read())
+        with self._lock:
+            self.templates[path] = (stat.st_mtime_ns, stat.st_size, template)
+        return template
+
+    def list_templates(self) -> List[Dict[str, str]]:
+        """
+        Liste les modèles disponibles; la liste n'est refaite que si le dossier a changé.
+        """
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return []
+
+        with self._lock:
+            if self._listing is not None and self._listing[0] == mtime:
+                return self._listing[1]
+
+        templates = []
+        for file in sorted(os.listdir(self.directory)):
+            if file.endswith(".txt") and "_" in file:
+                # Le type peut lui-même contenir des "_" (lettre_mise_en_demeure_fr.txt)
+                doc_type, language = file[:-len(".txt")].rsplit("_", 1)
+                templates.append({"type": doc_type, "language": language, "filename": file})
+        with self._lock:
+            self._listing = (mtime, templates)
+        return templates
+
+
+def write_batch_zip(path: str, template: CompiledTemplate, batch: Iterable[Dict],
+                    filename_prefix: str) -> List[Dict]:
+    """
+    Génère un document par jeu de paramètres et les écrit dans une archive zip, avec un
+    rapport (rapport.json) des variables manquantes et inconnues de chaque document.
+    Fonction bloquante: à appeler hors de la boucle d'événements.
+
+    Args:
+        path: Chemin de l'archive à créer
+        template: Modèle compilé
+        batch: Paramètres de chaque document
+        filename_prefix: Préfixe du nom des documents dans l'archive
+
+    Returns:
+        Le rapport de chaque document (nom, variables manquantes, paramètres inconnus)
+    """
+    report = []
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for number, parameters in enumerate(batch, start=1):
+            filename = f"{filename_prefix}_{number:04d}.txt"
+            missing, unknown = template.check(parameters)
+            archive.writestr(filename, template.render(parameters))
+            report.append({"filename": filename, "missing_parameters": missing, "unknown_parameters": unknown})
+        archive.writestr("rapport.json", json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
@@ -0,0 +1,157 @@
+"""
+Fixtures communes: application FastAPI sur un petit corpus temporaire et faux client Groq
+(aucun appel réseau)
+"""
+from types import SimpleNamespace
+
+import pytest
+
+# Petit corpus indexé au démarrage de l'application de test
+CORPUS = {
+    "code_du_travail.pdf": (
+        "Code du Travail\n"
+        "Article 6: Le contrat de travail est conclu pour une durée indéterminée ou pour une durée déterminée.\n"
+        "Article 14: Le contrat de travail à durée indéterminée peut être résilié par la volonté de "
+        "l'une des parties moyennant un préavis d'un mois.\n"
+        "Article 23 bis: Le licenciement abusif ouvre droit à des dommages-intérêts fixés par le "
+        "tribunal, en plus de l'indemnité de préavis et de l'indemnité de licenciement.\n"
+        "Article 64: La femme salariée a droit à un congé de maternité de trente jours.\n"
+        "Article 79: La durée normale du travail effectif ne peut excéder quarante-huit heures par semaine.\n"
+        "Article 113: Tout travailleur a droit à un congé annuel payé à la charge de l'employeur."
+    ),
+    "code_des_obligations.pdf": (
+        "Code des Obligations et des Contrats\n"
+        "Article 242: Les conventions légalement formées tiennent lieu de loi à ceux qui les ont faites.\n"
+        "Article 243: Toute obligation doit être exécutée de bonne foi.\n"
+        "Article 273: Le débiteur est tenu des dommages-intérêts en cas d'inexécution de l'obligation.\n"
+        "Article 727: Le loyer est payé aux termes convenus par le contrat de bail.\n"
+        "Article 791: Le bailleur est tenu de livrer la chose louée en bon état de réparations."
+    ),
+    "code_penal.pdf": (
+        "Code Pénal\n"
+        "Article 258: Est puni de cinq ans d'emprisonnement le vol commis sans circonstance aggravante.\n"
+        "Article 264: Le vol est puni de dix ans d'emprisonnement lorsqu'il est commis la nuit."
+    ),
+    "code_du_statut_personnel.pdf": (
+        "Code du Statut Personnel\n"
+        "Article 31: Le divorce est prononcé par le tribunal.\n"
+        "Article 67: En cas de divorce, la garde des enfants est confiée dans l'intérêt de l'enfant."
+    ),
+}
+
+
+def write_pdf(path, text):
+    """
+    Écrit un PDF d'une page (police Helvetica, encodage WinAnsi), une ligne de texte par ligne.
+    """
+    def escape(line):
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    lines = "".join(f"({escape(line)}) Tj T* " for line in text.split("\n"))
+    stream = f"BT /F1 10 Tf 12 TL 40 800 Td {lines}ET".encode("cp1252")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    content, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(content)
+    content += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    content += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    content += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(content)
+
+
+@pytest.fixture(scope="session")
+def legal_documents(tmp_path_factory):
+    """
+    Répertoire des documents juridiques de test (CORPUS, en PDF).
+    """
+    documents = tmp_path_factory.mktemp("legal_documents")
+    for name, text in CORPUS.items():
+        write_pdf(documents / name, text)
+    return documents
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory, legal_documents):
+    """
+    Importe app.py dans un répertoire temporaire (index, bases et journal y sont créés), sur
+    le corpus CORPUS, et attend que l'index soit chargé.
+    """
+    root = tmp_path_factory.mktemp("app")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("GROQ_API_KEY", "stub-key")
+        patch.setenv("GROQ_MODEL", "stub-large")
+        patch.setenv("GROQ_FAST_MODEL", "")
+        patch.setenv("LEGAL_DOCUMENTS_DIR", str(legal_documents))
+        patch.setenv("INDEX_DIRECTORY", str(root / "index_cache"))
+        patch.setenv("INDEX_WORKERS", "1")
+        patch.chdir(root)
+        import app
+        assert app.warm_up.wait(timeout=60), app.warm_up.status()
+        assert len(app.pdf_indexer.documents) == len(CORPUS)
+        yield app
+
+
+class FakeStream:
+    """
+    Réponse en streaming du faux client: un morceau "chat.completion.chunk" par token.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.closed = False
+
+    def __aiter__(self):
+        return self.chunks()
+
+    async def chunks(self):
+        for token in self.tokens:
+            delta = SimpleNamespace(content=token)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)], x_groq=None)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeGroqClient:
+    """
+    Remplace groq.AsyncGroq dans LLMGateway: renvoie answer (en morceaux d'un mot en streaming)
+    et conserve les paramètres de chaque appel dans requests.
+    """
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, stream=False, timeout=None, **params):
+        self.requests.append({"stream": stream, **params})
+        if stream:
+            words = self.answer.split(" ")
+            return FakeStream([word + " " for word in words[:-1]] + words[-1:])
+        message = SimpleNamespace(role="assistant", content=self.answer)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15),
+        )
+
+
+@pytest.fixture
+def groq_client(app_module, monkeypatch):
+    """
+    Installe un faux client Groq dans la passerelle de l'application: groq_client(answer).
+    """
+    def install(answer):
+        client = FakeGroqClient(answer)
+        monkeypatch.setattr(app_module.llm_gateway, "client", client)
+        return client
+
+    return install
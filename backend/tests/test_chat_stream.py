@@ -0,0 +1,83 @@
+"""
+Tests de /chat/stream/ (Server-Sent Events) avec un faux client Groq: texte reçu, historique
+de la conversation et cache des réponses
+"""
+import json
+
+from fastapi.testclient import TestClient
+
+from llm_gateway import LLMUnavailableError
+
+ANSWER = "Selon l'article 23 bis du Code du Travail, le licenciement abusif ouvre droit à des dommages-intérêts."
+
+
+def read_events(client, message, conversation_id):
+    """
+    Envoie une question à /chat/stream/ et retourne les événements reçus: [(type, données)].
+    """
+    events, event = [], None
+    with client.stream("POST", "/chat/stream/", json={"message": message, "conversation_id": conversation_id}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+
+def test_stream_sends_linked_tokens_then_done(app_module, groq_client):
+    fake = groq_client(ANSWER)
+    client = TestClient(app_module.app)
+    events = read_events(client, "Quelles indemnités en cas de licenciement abusif ?", "test-stream")
+
+    linked_answer = app_module.legal_linker.link(ANSWER)
+    assert linked_answer != ANSWER
+    tokens = [data["token"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == linked_answer
+    assert events[-1][0] == "done"
+    assert events[-1][1]["response"] == linked_answer
+    assert events[-1][1]["conversation_id"] == "test-stream"
+    assert len(fake.requests) == 1 and fake.requests[0]["stream"]
+
+
+def test_stream_saves_raw_answer_in_history(app_module, groq_client):
+    groq_client(ANSWER)
+    client = TestClient(app_module.app)
+    read_events(client, "Le licenciement abusif donne-t-il droit à réparation ?", "test-history")
+
+    messages = app_module.conversation_store.get_or_create("test-history").messages
+    assert messages[-2] == {"role": "user", "content": "Le licenciement abusif donne-t-il droit à réparation ?"}
+    assert messages[-1] == {"role": "assistant", "content": ANSWER}
+
+
+def test_streamed_answer_is_cached(app_module, groq_client):
+    fake = groq_client(ANSWER)
+    client = TestClient(app_module.app)
+    question = "Quel préavis pour résilier un contrat à durée indéterminée ?"
+    cache_size = len(app_module.response_cache.cache)
+    read_events(client, question, "test-cache-1")
+    assert len(app_module.response_cache.cache) == cache_size + 1
+
+    # La même première question est servie par le cache, en un seul morceau, sans appel à Groq
+    events = read_events(client, question, "test-cache-2")
+    tokens = [data["token"] for event, data in events if event == "token"]
+    assert tokens == [app_module.legal_linker.link(ANSWER)]
+    assert events[-1][0] == "done"
+    assert len(fake.requests) == 1
+
+
+def test_stream_reports_unavailable_api(app_module, monkeypatch):
+    async def unavailable(**params):
+        raise LLMUnavailableError("panne simulée", retry_after=7)
+        yield
+
+    monkeypatch.setattr(app_module.llm_gateway, "stream", unavailable)
+    client = TestClient(app_module.app)
+    events = read_events(client, "Quelle est la durée normale du travail par semaine ?", "test-error")
+
+    assert events == [("error", {"detail": "Service temporairement indisponible", "retry_after": 7})]
+    messages = app_module.conversation_store.get_or_create("test-error").messages
+    assert messages[-1]["role"] == "user"
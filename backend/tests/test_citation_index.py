@@ -0,0 +1,38 @@
+"""
+Tests de l'index des citations: articles cités dans une question et liens générés vers les
+articles (ancre seulement pour les codes dont le format est vérifié)
+"""
+from citation_index import CitationIndex
+from legal_links_database import ARTICLE_ANCHORS, LEGAL_LINKS
+
+DOCUMENTS = [
+    ("code_du_travail.pdf", [
+        "Code du Travail\nArticle 14: Le contrat à durée indéterminée peut être résilié moyennant un préavis.\n",
+        "Article 23 bis: Le licenciement abusif ouvre droit à des dommages-intérêts.",
+    ]),
+    ("code-2011-penal.pdf", ["Code Pénal\nArticle 258: Est puni de cinq ans d'emprisonnement le vol simple."]),
+]
+
+
+def build_index():
+    index = CitationIndex()
+    assert index.build(DOCUMENTS) == 3
+    return index
+
+
+def test_cited_articles_are_found():
+    index = build_index()
+    results, citations = index.lookup_query("Que dit l'article 23 bis du code du travail et l'article 258 du code pénal ?")
+    assert citations == 2
+    assert [result["path"] for result in results] == ["code_du_travail.pdf", "code-2011-penal.pdf"]
+    assert results[0]["pages"] == (2, 2) and "licenciement abusif" in results[0]["content"]
+    assert index.find_citations("الفصل 14 من مجلة الشغل") == [("code du travail", "14")]
+
+
+def test_anchors_only_for_verified_codes():
+    links = build_index().article_links(LEGAL_LINKS, ARTICLE_ANCHORS)
+    assert links["article 14 du code du travail"] == LEGAL_LINKS["code du travail"] + "#article-14"
+    assert links["article 23 bis du code du travail"] == LEGAL_LINKS["code du travail"] + "#article-23-bis"
+    # Format d'ancre inconnu: lien vers le texte du code
+    assert links["article 258 du code pénal"] == LEGAL_LINKS["code pénal"]
+    assert build_index().article_links(LEGAL_LINKS, {})["article 14 du code du travail"] == LEGAL_LINKS["code du travail"]
@@ -0,0 +1,107 @@
+"""
+Tests du stockage des conversations: tours simultanés d'une même conversation, capacité
+bornée (compteur de conversations SQLite) et expiration
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from conversation_store import MemoryConversationStore, SQLiteConversationStore
+
+SYSTEM_MESSAGE = {"role": "system", "content": "prompt"}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**options):
+        if request.param == "sqlite":
+            return SQLiteConversationStore(SYSTEM_MESSAGE, path=str(tmp_path / "conversations.db"), **options)
+        return MemoryConversationStore(SYSTEM_MESSAGE, **options)
+    return make
+
+
+def add_turn(turn):
+    def change(conversation):
+        conversation.messages.append({"role": "user", "content": f"question {turn}"})
+        conversation.messages.append({"role": "assistant", "content": f"réponse {turn}"})
+        conversation.update_last_activity()
+    return change
+
+
+def test_concurrent_turns_are_all_kept(make_store):
+    store = make_store()
+    # En SQLite, un stockage par thread, comme plusieurs workers uvicorn sur la même base
+    stores = [make_store() if isinstance(store, SQLiteConversationStore) else store for _ in range(4)]
+    turns_per_thread = 25
+
+    def run(store, thread):
+        for turn in range(turns_per_thread):
+            store.update("shared", add_turn(f"{thread}-{turn}"))
+
+    threads = [threading.Thread(target=run, args=(store, thread)) for thread, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    turns = stores[0].get("shared").turns
+    assert len(turns) == 2 * 4 * turns_per_thread
+    assert {m["content"] for m in turns if m["role"] == "user"} == {
+        f"question {thread}-{turn}" for thread in range(4) for turn in range(turns_per_thread)
+    }
+
+
+def test_update_creates_then_extends(make_store):
+    store = make_store()
+    assert store.get("new") is None
+    assert len(store.update("new", add_turn(1)).turns) == 2
+    assert len(store.update("new", add_turn(2)).turns) == 4
+    assert store.get("new").turns[-1]["content"] == "réponse 2"
+
+
+def test_capacity_evicts_least_recent(make_store):
+    store = make_store(max_conversations=3)
+    for i in range(5):
+        store.update(f"session-{i}", add_turn(i))
+    assert store.stats()["sessions"] == 3
+    assert store.evictions == 2
+    assert store.get("session-0") is None and store.get("session-1") is None
+    assert store.get("session-4") is not None
+
+
+def test_sqlite_count_follows_inserts_and_deletes(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    store = SQLiteConversationStore(SYSTEM_MESSAGE, path=path, idle_timeout=60)
+    for i in range(4):
+        store.update(f"session-{i}", add_turn(i))
+        store.update(f"session-{i}", add_turn(i))
+    store.delete("session-0")
+    conversation = store.get("session-1")
+    conversation.last_activity = time.time() - 120
+    store.save(conversation)
+    assert store.sweep() == 1
+
+    connection = sqlite3.connect(path)
+    count = connection.execute("SELECT n FROM conversation_count").fetchone()[0]
+    assert count == connection.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 2
+    connection.close()
+    # Une base existante garde son compteur
+    assert SQLiteConversationStore(SYSTEM_MESSAGE, path=path).stats()["sessions"] == 2
+
+
+def test_sqlite_counter_added_to_existing_database(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE conversations (id TEXT PRIMARY KEY, turns TEXT NOT NULL, last_activity REAL NOT NULL)"
+    )
+    connection.executemany("INSERT INTO conversations VALUES (?, '[]', ?)",
+                           [(f"old-{i}", time.time()) for i in range(3)])
+    connection.commit()
+    connection.close()
+
+    store = SQLiteConversationStore(SYSTEM_MESSAGE, path=path, max_conversations=3)
+    store.update("new", add_turn(1))
+    assert store.stats()["sessions"] == 3
+    assert store.evictions == 1
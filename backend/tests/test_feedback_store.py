@@ -0,0 +1,74 @@
+"""
+Tests du stockage des retours: statistiques sans écriture des retours en attente et import
+de l'ancien journal CSV en une seule transaction
+"""
+import sqlite3
+
+import pytest
+
+from feedback_store import FeedbackStore
+
+CSV = (
+    "timestamp,conversation_id,message_id,rating,comment\n"
+    "2025-03-01 10:00:00,conv-1,1,5,Très clair\\, merci\n"
+    "2025-03-02 11:00:00,conv-1,2,3,\n"
+    "2025-04-10 09:30:00,conv-2,3,1,Réponse hors sujet\n"
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Écriture par le thread de fond désactivée pendant le test
+    store = FeedbackStore(str(tmp_path / "feedback.db"), flush_interval=3600)
+    yield store
+    store.close()
+
+
+def stored_rows(store):
+    return sqlite3.connect(store.path).execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+
+
+def test_stats_count_pending_feedback_without_writing_it(store):
+    store.submit("conv-1", "1", 5, "merci", "french", timestamp="2025-03-01 10:00:00")
+    store.submit("conv-2", "2", 2, "", "arabic", timestamp="2025-05-01 10:00:00")
+    stats = store.stats()
+    assert stats["total_feedbacks"] == 2 and stats["average_rating"] == 3.5
+    assert stats["by_language"] == {"french": 1, "arabic": 1}
+    assert store.stats(conversation_id="conv-1")["total_feedbacks"] == 1
+    assert store.stats(start="2025-04-01")["rating_distribution"][2] == 1
+    assert store.stats(language="french", end="2025-03-31")["total_feedbacks"] == 1
+    assert stored_rows(store) == 0 and len(store.pending) == 2
+
+    # Une fois écrits, les retours ne sont pas comptés deux fois
+    assert store.flush() == 2
+    assert store.stats() == stats
+
+
+def test_import_csv_once(store, tmp_path):
+    csv_path = tmp_path / "feedback_log.csv"
+    csv_path.write_text(CSV, encoding="utf-8")
+    assert store.import_csv(str(csv_path)) == 3
+    assert store.import_csv(str(csv_path)) == 0
+    stats = store.stats()
+    assert stats["total_feedbacks"] == 3 and stats["rating_distribution"] == {1: 1, 2: 0, 3: 1, 4: 0, 5: 1}
+    assert store.stats(conversation_id="conv-1", start="2025-03-02")["total_feedbacks"] == 1
+
+
+def test_interrupted_import_leaves_no_rows(store, tmp_path, monkeypatch):
+    csv_path = tmp_path / "feedback_log.csv"
+    csv_path.write_text(CSV, encoding="utf-8")
+    insert = FeedbackStore._insert
+
+    def interrupted(connection, rows):
+        insert(connection, rows)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(FeedbackStore, "_insert", staticmethod(interrupted))
+    with pytest.raises(KeyboardInterrupt):
+        store.import_csv(str(csv_path))
+    monkeypatch.undo()
+    assert stored_rows(store) == 0 and store.stats()["total_feedbacks"] == 0
+
+    # Import repris en entier, sans doublons
+    assert store.import_csv(str(csv_path)) == 3
+    assert stored_rows(store) == 3 and store.stats()["total_feedbacks"] == 3
@@ -0,0 +1,120 @@
+"""
+Tests de la fenêtre d'historique: historique réduit au budget de tokens, résumé limité à
+summary_budget, seuls les nouveaux messages comptés à chaque tour et encodage chargé au
+premier comptage
+"""
+import history_manager
+from conversation_store import Conversation
+from history_manager import MESSAGE_OVERHEAD_TOKENS, SUMMARY_HEADER, HistoryManager, TokenCounter
+
+SYSTEM_MESSAGE = {"role": "system", "content": "Tu es un assistant juridique tunisien."}
+
+
+class WordCounter:
+    """
+    Un token par mot; conserve les textes comptés.
+    """
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        return len(text.split())
+
+
+def add_turn(conversation, number, words=30):
+    conversation.messages.append({"role": "user", "content": f"Question {number} sur le préavis. " + "mot " * words})
+    conversation.messages.append({"role": "assistant", "content": f"Réponse {number}. " + "article " * words})
+
+
+def recount(manager, conversation):
+    """
+    Recompte les messages envoyés: (tokens de l'historique, tokens du résumé)
+    """
+    messages = manager.build_messages(conversation)[1:]
+    summary = 0
+    if conversation.summary:
+        summary = manager.message_tokens(messages.pop(0))
+    return sum(manager.message_tokens(message) for message in messages), summary
+
+
+def test_history_is_trimmed_to_the_budget():
+    manager = HistoryManager(SYSTEM_MESSAGE, token_budget=200, summary_budget=0, count_tokens=WordCounter())
+    conversation = Conversation("budget", SYSTEM_MESSAGE)
+    for number in range(10):
+        add_turn(conversation, number)
+    total = manager.trim(conversation)
+
+    assert total <= 200
+    history, _ = recount(manager, conversation)
+    assert total == manager.system_tokens + history
+    assert conversation.dropped_messages == 20 - len(conversation.turns)
+    assert conversation.messages[-1]["content"].startswith("Réponse 9.")
+    # Sans budget de résumé, les échanges supprimés ne sont pas résumés
+    assert conversation.summary == "" and manager.build_messages(conversation)[0] is SYSTEM_MESSAGE
+
+    # Le dernier message est toujours conservé, même au-delà du budget
+    conversation.messages.append({"role": "user", "content": "mot " * 500})
+    manager.trim(conversation)
+    assert len(conversation.turns) == 1 and conversation.token_counts == [500 + MESSAGE_OVERHEAD_TOKENS]
+
+
+def test_summary_stays_within_summary_budget():
+    manager = HistoryManager(SYSTEM_MESSAGE, token_budget=250, summary_budget=40, count_tokens=WordCounter())
+    conversation = Conversation("summary", SYSTEM_MESSAGE)
+    for number in range(20):
+        add_turn(conversation, number)
+        total = manager.trim(conversation)
+        assert total <= 250
+        assert conversation.summary_tokens <= 40
+
+    # Les lignes les plus anciennes du résumé sont retirées: il ne garde que les derniers échanges supprimés
+    assert conversation.summary.startswith("- ") and "Question 0 " not in conversation.summary
+    history, summary = recount(manager, conversation)
+    # Chaque ligne est comptée avec son saut de ligne: estimation par excès du résumé envoyé
+    assert summary <= conversation.summary_tokens <= 40
+    assert total == manager.system_tokens + conversation.summary_tokens + history
+    messages = manager.build_messages(conversation)
+    assert messages[1] == {"role": "system", "content": f"{SUMMARY_HEADER}\n{conversation.summary}"}
+
+
+def test_only_new_messages_are_counted_across_turns():
+    counter = WordCounter()
+    manager = HistoryManager(SYSTEM_MESSAGE, token_budget=300, summary_budget=60, count_tokens=counter)
+    conversation = Conversation("incremental", SYSTEM_MESSAGE)
+    # Message système et en-tête du résumé: comptés une seule fois
+    assert manager.system_tokens == 6 + MESSAGE_OVERHEAD_TOKENS
+    assert manager.summary_header_tokens == len(SUMMARY_HEADER.split()) + 1 + MESSAGE_OVERHEAD_TOKENS
+    for number in range(12):
+        add_turn(conversation, number)
+        counter.texts.clear()
+        manager.trim(conversation)
+        new_messages = [message["content"] for message in conversation.messages[-2:]]
+        # Les deux nouveaux messages, puis les lignes du résumé si des messages ont été supprimés
+        assert counter.texts[:2] == new_messages
+        assert all(text.startswith("- ") for text in counter.texts[2:])
+        assert conversation.token_counts == [manager.message_tokens(message) for message in conversation.turns]
+        assert conversation.history_tokens == sum(conversation.token_counts)
+
+    # Une conversation relue depuis le stockage reprend les tokens déjà comptés
+    restored = Conversation("incremental", SYSTEM_MESSAGE, conversation.turns, history=conversation.history_state())
+    counter.texts.clear()
+    assert manager.trim(restored) == manager.trim(conversation)
+    assert counter.texts == []
+
+
+def test_encoding_is_loaded_on_first_count(monkeypatch):
+    loads = []
+
+    def load_token_counter(encoding_name):
+        loads.append(encoding_name)
+        return lambda text: len(text)
+
+    monkeypatch.setattr(history_manager, "load_token_counter", load_token_counter)
+    counter = TokenCounter("o200k_base")
+    manager = HistoryManager(SYSTEM_MESSAGE, count_tokens=counter)
+    assert loads == []
+    conversation = Conversation("lazy", SYSTEM_MESSAGE, [{"role": "user", "content": "Bonjour"}])
+    assert manager.trim(conversation) == len(SYSTEM_MESSAGE["content"]) + len("Bonjour") + 2 * MESSAGE_OVERHEAD_TOKENS
+    assert counter.load() is counter.load() and loads == ["o200k_base"]
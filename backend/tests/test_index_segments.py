@@ -0,0 +1,183 @@
+"""
+Tests des segments d'index projetés en mémoire: un autre processus (ici un second PDFIndexer)
+retrouve l'index publié, postings BM25 compris, sans le reconstruire
+"""
+import math
+import shutil
+import threading
+
+import numpy as np
+import pytest
+
+import pdf_indexer
+from bm25_index import BM25Index
+from pdf_indexer import PDFIndexer
+
+QUERIES = ["licenciement abusif", "contrat de bail", "préavis", "vol commis la nuit", "article 14"]
+
+
+def is_mapped(array) -> bool:
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+@pytest.fixture
+def published(legal_documents, tmp_path):
+    """
+    Indexe le corpus en mode "bm25" et publie l'index dans tmp_path.
+    """
+    indexer = PDFIndexer(str(legal_documents), index_directory=str(tmp_path), max_workers=1, retrieval_mode="bm25")
+    indexer.index_documents()
+    return indexer
+
+
+def test_worker_maps_published_bm25_postings(published, legal_documents, tmp_path):
+    worker = PDFIndexer(str(legal_documents), index_directory=str(tmp_path), max_workers=1, retrieval_mode="bm25")
+    worker.index_documents()
+    assert worker.segment is not None
+    bm25 = worker._get_bm25_index()
+    assert bm25 is worker.segment.bm25
+    assert is_mapped(bm25.lengths)
+    assert is_mapped(bm25.postings.data) and is_mapped(bm25.postings.indices)
+    # Aucun index BM25 privé n'est construit
+    assert worker._bm25_index is None
+    for query in QUERIES:
+        assert worker.search(query) == published.search(query)
+
+
+def test_tfidf_segment_has_no_bm25_postings(legal_documents, tmp_path):
+    indexer = PDFIndexer(str(legal_documents), index_directory=str(tmp_path), max_workers=1)
+    indexer.index_documents()
+    assert indexer.segment is not None and indexer.segment.bm25 is None
+    # Un worker en mode "bm25" sur ce segment construit son propre index
+    indexer.retrieval_mode = "bm25"
+    assert indexer.search("licenciement abusif")
+
+
+def test_added_document_is_published_and_removed(published, legal_documents, tmp_path):
+    document = tmp_path / "redevance.txt"
+    document.write_text("Redevance zorglub due chaque mois par le preneur.")
+    assert published.add_document(str(document), ["Redevance zorglub due chaque mois par le preneur."])
+    assert published.segment is not None
+    assert published.search("zorglub")[0]["path"] == str(document)
+
+    worker = PDFIndexer(str(legal_documents), index_directory=str(tmp_path), max_workers=1, retrieval_mode="bm25")
+    worker.index_documents()
+    assert worker.search("zorglub")[0]["path"] == str(document)
+
+    assert published.remove_document(str(document))
+    assert not published.remove_document(str(document))
+    assert published.search("zorglub") == []
+    assert worker.reload_if_changed(force=True)
+    assert worker.search("zorglub") == []
+
+
+def test_searches_run_while_segment_is_written(published, tmp_path, monkeypatch):
+    """
+    Le nouveau segment est écrit hors du verrou: les recherches continuent sur l'ancien index,
+    et une génération installée entre-temps fait recommencer l'ajout sur celle-ci.
+    """
+    writing, release = threading.Event(), threading.Event()
+    write_segment = pdf_indexer.write_segment
+
+    def slow_write_segment(*args, **kwargs):
+        if not writing.is_set():
+            writing.set()
+            assert release.wait(10)
+        return write_segment(*args, **kwargs)
+
+    monkeypatch.setattr(pdf_indexer, "write_segment", slow_write_segment)
+    document = tmp_path / "redevance.txt"
+    document.write_text("Redevance zorglub due chaque mois par le preneur.")
+    before = published.search("licenciement abusif")
+    adding = threading.Thread(target=published.add_document,
+                              args=(str(document), ["Redevance zorglub due chaque mois par le preneur."]))
+    adding.start()
+    try:
+        assert writing.wait(10)
+        assert published.search("licenciement abusif") == before
+        assert published.search("zorglub") == []
+        with published._lock:
+            published.generation += 1
+    finally:
+        release.set()
+        adding.join(10)
+    assert published.search("zorglub")[0]["path"] == str(document)
+    assert published.search("licenciement abusif")[0]["path"] == before[0]["path"]
+
+
+def test_searches_run_while_documents_are_reindexed(legal_documents, tmp_path, monkeypatch):
+    """
+    La réindexation complète construit le nouvel index sur une copie de travail: les recherches
+    continuent sur l'ancien jusqu'à son installation.
+    """
+    documents = tmp_path / "documents"
+    shutil.copytree(legal_documents, documents)
+    indexer = PDFIndexer(str(documents), index_directory=str(tmp_path / "index"), max_workers=1)
+    indexer.index_documents()
+    shutil.copy(documents / "code_penal.pdf", documents / "code_penal_2.pdf")
+
+    writing, release = threading.Event(), threading.Event()
+    write_segment = pdf_indexer.write_segment
+
+    def slow_write_segment(*args, **kwargs):
+        if not writing.is_set():
+            writing.set()
+            assert release.wait(10)
+        return write_segment(*args, **kwargs)
+
+    monkeypatch.setattr(pdf_indexer, "write_segment", slow_write_segment)
+    before = indexer.search("vol commis la nuit")
+    indexing = threading.Thread(target=indexer.index_documents)
+    indexing.start()
+    try:
+        assert writing.wait(10)
+        assert indexer.search("vol commis la nuit") == before
+        # Une génération installée entre-temps fait recommencer la réindexation
+        with indexer._lock:
+            indexer.generation += 1
+    finally:
+        release.set()
+        indexing.join(10)
+    assert not indexing.is_alive()
+    assert len(indexer.document_paths) == 5
+    assert {result["path"] for result in indexer.search("vol commis la nuit")} == {
+        str(documents / "code_penal.pdf"), str(documents / "code_penal_2.pdf")
+    }
+
+
+def test_bm25_scores_match_reference_formula():
+    texts = [
+        "Le licenciement abusif ouvre droit à des dommages-intérêts.",
+        "Le préavis de licenciement est d'un mois, article 14.",
+        "Le contrat de bail fixe le loyer mensuel.",
+        "Licenciement, licenciement et encore licenciement: article 5.",
+    ]
+    index = BM25Index(k1=1.5, b=0.75)
+    index.build(texts)
+    tokens = [index.analyzer(text) for text in texts]
+    average = sum(len(t) for t in tokens) / len(tokens)
+
+    def reference(query):
+        scores = {}
+        for term in set(index.analyzer(query)):
+            frequency = sum(term in t for t in tokens)
+            if not frequency:
+                continue
+            idf = math.log1p((len(texts) - frequency + 0.5) / (frequency + 0.5))
+            for passage, passage_tokens in enumerate(tokens):
+                tf = passage_tokens.count(term)
+                if tf:
+                    norm = 1.5 * (1 - 0.75 + 0.75 * len(passage_tokens) / average)
+                    scores[passage] = scores.get(passage, 0.0) + idf * tf * 2.5 / (tf + norm)
+        return scores
+
+    for query in ["licenciement", "Préavis de licenciement", "article 5", "loyer"]:
+        results = index.search(query, top_k=10)
+        assert dict(results) == pytest.approx(reference(query))
+        assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    # Accents et casse ignorés
+    assert index.search("PREAVIS", 10) == index.search("préavis", 10)
@@ -0,0 +1,138 @@
+"""
+Tests de la file d'ingestion et des documents des conversations: deux workers (deux
+instances sur la même base SQLite) voient les mêmes tâches et les mêmes documents, pages
+des documents DOCX et TXT, et documents limités à leur conversation dans /chat/
+"""
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ingestion_queue import SCOPE_CONVERSATION, IngestionQueue
+from scoped_index import ScopedDocumentIndex
+
+LEASE = ["Le loyer mensuel est fixé à 850 dinars, payable d'avance.", "Le preneur restitue les clés au terme du bail."]
+
+
+@pytest.fixture
+def database(tmp_path):
+    return str(tmp_path / "uploads.db")
+
+
+def write_docx(path, paragraphs):
+    """
+    Écrit un document Word minimal (un paragraphe par élément, "\f" pour un saut de page).
+    """
+    body = "".join(
+        '<w:p><w:r><w:br w:type="page"/></w:r></w:p>' if paragraph == "\f"
+        else f"<w:p><w:r><w:t>{escape(paragraph)}</w:t></w:r></w:p>"
+        for paragraph in paragraphs
+    )
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f"<w:body>{body}</w:body></w:document>"
+        ))
+
+
+def write_documents(directory):
+    docx = directory / "contrat.docx"
+    write_docx(docx, ["Contrat de bail", "Le loyer mensuel est fixé à 850 dinars.", "\f",
+                      "Le preneur verse un dépôt de garantie de deux mois."])
+    txt = directory / "notes.txt"
+    txt.write_text("Préavis de licenciement notifié le 3 mars.\fIndemnité de congés payés réclamée.", encoding="utf-8")
+    return docx, txt
+
+
+def wait_for(queue, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.status(job_id)
+        if job and job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"tâche {job_id} non terminée: {queue.status(job_id)}")
+
+
+def test_documents_are_shared_between_workers(database):
+    first, second = ScopedDocumentIndex(database), ScopedDocumentIndex(database)
+    assert second.search("bail-1", "loyer") == []
+    assert first.add("bail-1", "contrat.txt", LEASE) == 1
+    assert second.version("bail-1") == 1
+    results = second.search("bail-1", "loyer mensuel dinars")
+    assert results[0]["path"] == "contrat.txt" and results[0]["pages"] == (1, 2)
+    assert second.search("autre", "loyer mensuel dinars") == []
+
+    # Un document remplacé dans un worker est relu par l'autre
+    first.add("bail-1", "contrat.txt", ["Le loyer mensuel est fixé à 900 dinars."])
+    assert second.version("bail-1") == 2
+    results = second.search("bail-1", "loyer")
+    assert len(results) == 1 and "900 dinars" in results[0]["content"]
+
+    first.remove("bail-1")
+    assert second.version("bail-1") == 0 and second.search("bail-1", "loyer") == []
+
+
+def test_least_recently_updated_conversations_are_forgotten(database):
+    index = ScopedDocumentIndex(database, max_conversations=2)
+    for i in range(3):
+        index.add(f"conversation-{i}", "contrat.txt", LEASE)
+    assert index.version("conversation-0") == 0
+    assert index.search("conversation-2", "loyer")
+    assert index.stats()["conversations"] == 2 and index.stats()["passages"] == 2
+
+
+def test_job_status_is_visible_from_another_worker(database, tmp_path):
+    document = tmp_path / "notes.txt"
+    document.write_text("\n".join(LEASE), encoding="utf-8")
+    scoped = ScopedDocumentIndex(database)
+    uploading = IngestionQueue(None, scoped, database, workers=1)
+    polling = IngestionQueue(None, ScopedDocumentIndex(database), database, workers=1, max_jobs=2)
+    try:
+        job_id = uploading.submit(str(document), "notes.txt", "bail-2", SCOPE_CONVERSATION)
+        assert polling.status(job_id)["filename"] == "notes.txt"
+        job = wait_for(polling, job_id)
+        assert job["status"] == "done" and job["passages"] == 1, job
+        assert polling.scoped_index.search("bail-2", "loyer")[0]["path"] == "notes.txt"
+        assert polling.status("inconnue") is None
+
+        # Seules les max_jobs tâches les plus récentes sont conservées
+        for i in range(2):
+            missing = tmp_path / f"absent-{i}.txt"
+            polling.submit(str(missing), missing.name, "bail-2", SCOPE_CONVERSATION)
+        assert polling.status(job_id) is None
+    finally:
+        uploading.shutdown()
+        polling.shutdown()
+
+
+def test_docx_and_txt_pages(database, tmp_path):
+    docx, txt = write_documents(tmp_path)
+    queue = IngestionQueue(None, ScopedDocumentIndex(database), database, workers=1)
+    try:
+        for path in (docx, txt):
+            job = wait_for(queue, queue.submit(str(path), path.name, "bail-3", SCOPE_CONVERSATION))
+            assert job["status"] == "done" and job["pages"] == 2, job
+        results = queue.scoped_index.search("bail-3", "loyer mensuel dinars")
+        assert results[0]["path"] == "contrat.docx" and results[0]["pages"] == (1, 2)
+        assert queue.scoped_index.search("bail-3", "indemnité congés")[0]["path"] == "notes.txt"
+    finally:
+        queue.shutdown()
+
+
+def test_uploaded_document_stays_in_its_conversation(app_module, tmp_path):
+    docx, _ = write_documents(tmp_path)
+    client = TestClient(app_module.app)
+    with open(docx, "rb") as f:
+        response = client.post("/upload_document/", files={"file": ("contrat.docx", f)},
+                               data={"conversation_id": "test-upload", "scope": "conversation"})
+    job_id = response.json()["job_id"]
+    job = wait_for(app_module.ingestion_queue, job_id)
+    assert job["status"] == "done", job
+    assert client.get(f"/upload_status/{job_id}").json()["status"] == "done"
+
+    assert "850 dinars" in app_module.retrieve_context("test-upload", "loyer mensuel dinars")[0]
+    assert "850 dinars" not in app_module.retrieve_context("autre-conversation", "loyer mensuel dinars")[0]
+    assert app_module.scoped_documents.search("autre-conversation", "loyer mensuel dinars") == []
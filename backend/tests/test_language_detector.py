@@ -0,0 +1,51 @@
+"""
+Tests de l'identification de la langue des messages
+"""
+import pytest
+
+from language_detector import (ARABIC, FRENCH, TUNISIAN_ARABIC, TUNISIAN_LATIN, _is_arabizi, detect_language,
+                               detect_many, identify_language, response_language)
+
+
+@pytest.mark.parametrize("text, language", [
+    ("Quels sont mes droits en cas de licenciement abusif ?", FRENCH),
+    ("ما هي حقوقي في حالة الطرد التعسفي؟", ARABIC),
+    ("chneya el 7a9 mte3i ki ytard3ouni mel khedma", TUNISIAN_LATIN),
+    ("ya3tik sa7a, kifech na3mel", TUNISIAN_LATIN),
+    ("شنية حقي كيفاش نعمل باش نشكي", TUNISIAN_ARABIC),
+    # Références et ordinaux avec des chiffres: pas d'arabizi
+    ("Le décret 2020-19 sur le covid19 et la loi L1234, art.5 et art5 du 2eme chapitre", FRENCH),
+    ("Mon contrat CDD3 a été renouvelé 3 fois depuis le 5 mai", FRENCH),
+    # Une réponse en français qui cite quelques mots arabes reste en français
+    ("Selon le Code du travail (مجلة الشغل), le préavis est d'un mois pour les deux parties.", FRENCH),
+])
+def test_identify_language(text, language):
+    assert identify_language(text) == language
+
+
+@pytest.mark.parametrize("token, arabizi", [
+    ("ya3tik", True), ("ma3neha", True), ("na3ref", True), ("sa7a", True), ("ta2chira", True),
+    ("covid19", False), ("l1234", False), ("art5", False), ("2eme", False), ("3andi", False),
+    ("cdd3", False), ("mp4", False), ("licenciement", False), ("2024", False),
+])
+def test_is_arabizi(token, arabizi):
+    assert _is_arabizi(token) is arabizi
+
+
+def test_detect_language_keeps_french_or_tunisian_contract():
+    assert detect_language("Quels sont mes droits ?") == "french"
+    assert detect_language("chneya el 7a9 mte3i fel khedma") == "tunisian"
+    assert detect_language("شنية حقي كيفاش نعمل") == "tunisian"
+    assert detect_language("ما هي حقوقي في حالة الطرد التعسفي؟") == "french"
+
+
+def test_response_language():
+    assert response_language("Quels sont mes droits ?") == "french"
+    assert response_language("chneya el 7a9 mte3i fel khedma") == "french"
+    assert response_language("شنية حقي كيفاش نعمل") == "arabic"
+    assert response_language("ما هي حقوقي في حالة الطرد التعسفي؟") == "arabic"
+
+
+def test_detect_many_keeps_order():
+    texts = ["Bonjour", "مرحبا بكم", "chneya 7a9i w kifech na3ref"]
+    assert detect_many(texts) == [FRENCH, ARABIC, TUNISIAN_LATIN]
@@ -0,0 +1,85 @@
+"""
+Tests du lieur de références juridiques: la référence la plus longue l'emporte, pas de liens
+qui se chevauchent ni au milieu d'un mot, et même résultat en flux (morceau par morceau)
+que sur le texte entier
+"""
+import random
+
+from legal_links_database import ANCHOR_TEMPLATE, LEGAL_LINKS, LegalLinker, enrich_text_with_links
+
+ARTICLES = {"article 5 du code du travail": "https://exemple.tn/travail#article-5"}
+CODES = {
+    "code du travail": "https://exemple.tn/travail",
+    "travail de nuit": "https://exemple.tn/nuit",
+    "code": "https://exemple.tn/codes",
+    "bail": "https://exemple.tn/bail",
+}
+
+
+def anchor(text, link):
+    return ANCHOR_TEMPLATE.format(link=link, text=text)
+
+
+def test_longest_reference_wins():
+    linker = LegalLinker(ARTICLES, CODES)
+    text = "Selon l'Article 5 du Code du Travail et le code du travail, voir le code."
+    assert linker.link(text) == (
+        "Selon l'" + anchor("Article 5 du Code du Travail", ARTICLES["article 5 du code du travail"])
+        + " et le " + anchor("code du travail", CODES["code du travail"])
+        + ", voir le " + anchor("code", CODES["code"]) + "."
+    )
+    # Une référence présente dans plusieurs tables garde le lien de la première
+    assert LegalLinker({"bail": "premier"}, CODES).link("bail") == anchor("bail", "premier")
+
+
+def test_overlapping_references_are_linked_once():
+    linker = LegalLinker(ARTICLES, CODES)
+    # "code du travail" et "travail de nuit" se chevauchent: la première commencée l'emporte
+    assert linker.link("code du travail de nuit") == anchor("code du travail", CODES["code du travail"]) + " de nuit"
+    assert linker.link("le travail de nuit") == "le " + anchor("travail de nuit", CODES["travail de nuit"])
+
+
+def test_references_inside_words_are_not_linked():
+    linker = LegalLinker(ARTICLES, CODES)
+    for text in ("un encode", "codes et baux", "bail2", "sous-bail_"):
+        assert linker.link(text) == text
+    assert linker.link("le code du travailleur") == "le " + anchor("code", CODES["code"]) + " du travailleur"
+    # Limites de mot: ponctuation, début et fin du texte
+    assert linker.link("(bail)") == "(" + anchor("bail", CODES["bail"]) + ")"
+    assert linker.link("bail") == anchor("bail", CODES["bail"])
+
+
+def feed(linker, chunks):
+    stream = linker.stream()
+    return "".join(stream.feed(chunk) for chunk in chunks) + stream.flush()
+
+
+def test_stream_matches_link_whatever_the_split():
+    linker = LegalLinker(ARTICLES, CODES)
+    text = ("Selon l'article 5 du code du travail, le travail de nuit est encadré; le code du travailleur "
+            "et le Code du Travail aussi. Bail: voir le code")
+    expected = linker.link(text)
+    # Référence coupée entre deux morceaux, à chaque position possible
+    for cut in range(len(text) + 1):
+        assert feed(linker, [text[:cut], text[cut:]]) == expected, cut
+    # Morceaux de tailles aléatoires (tokens du LLM)
+    generator = random.Random(7)
+    for _ in range(50):
+        chunks, position = [], 0
+        while position < len(text):
+            size = generator.randint(1, 12)
+            chunks.append(text[position:position + size])
+            position += size
+        assert feed(linker, chunks) == expected
+
+
+def test_stream_emits_text_that_cannot_start_a_reference():
+    stream = LegalLinker(ARTICLES, CODES).stream()
+    assert stream.feed("Voir l'article 5 du co") == "Voir l'"
+    assert stream.feed("de du travail.") == anchor("article 5 du code du travail", ARTICLES["article 5 du code du travail"]) + "."
+    assert stream.feed(" Le cod") == " Le "
+    assert stream.flush() == "cod"
+
+
+def test_enrich_text_with_links_uses_legal_links():
+    assert enrich_text_with_links("Le Code pénal.") == "Le " + anchor("Code pénal", LEGAL_LINKS["code pénal"]) + "."
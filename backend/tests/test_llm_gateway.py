@@ -0,0 +1,187 @@
+"""
+Tests de LLMGateway contre le faux serveur Groq à pannes (benchmarks.common.start_fault_llm_server):
+nouvelles tentatives, Retry-After, délai par appel, disjoncteur, limite d'appels et connexions
+persistantes
+"""
+import time
+import asyncio
+
+import groq
+import pytest
+
+from benchmarks.common import start_fault_llm_server
+from llm_gateway import CLOSED, OPEN, CircuitBreaker, LLMGateway, LLMUnavailableError
+
+MESSAGES = [{"role": "user", "content": "Bonjour"}]
+
+
+@pytest.fixture
+def fault_server():
+    """
+    Démarre un faux serveur (mêmes arguments que start_fault_llm_server), arrêté à la fin du test.
+    """
+    servers = []
+
+    def start(plan=(), default=(200, 0.0)):
+        server = start_fault_llm_server(plan=plan, default=default)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def run_with_gateway(server, check, **options):
+    """
+    Exécute check(gateway) avec une passerelle vers server (attente de 10 ms au plus entre
+    deux tentatives, sauf indication contraire).
+    """
+    options.setdefault("backoff_base", 0.01)
+
+    async def run():
+        gateway = LLMGateway("stub-key", base_url=f"http://127.0.0.1:{server.server_address[1]}", **options)
+        try:
+            await check(gateway)
+        finally:
+            await gateway.client.close()
+
+    asyncio.run(run())
+
+
+def test_server_errors_are_retried(fault_server):
+    server = fault_server(plan=[(503, 0), (500, 0), (502, 0)])
+
+    async def check(gateway):
+        completion = await gateway.complete(model="stub", messages=MESSAGES)
+        assert completion.choices[0].message.content == "Réponse."
+        assert gateway.breaker.state == CLOSED
+
+    run_with_gateway(server, check)
+    assert server.calls == 4
+
+
+def test_retries_are_bounded(fault_server):
+    server = fault_server(default=(500, 0.0))
+
+    async def check(gateway):
+        with pytest.raises(LLMUnavailableError):
+            await gateway.complete(model="stub", messages=MESSAGES)
+
+    run_with_gateway(server, check, max_retries=2)
+    assert server.calls == 3
+
+
+def test_rate_limit_honours_retry_after(fault_server):
+    server = fault_server(plan=[(429, 0, 0.3)])
+
+    async def check(gateway):
+        start = time.perf_counter()
+        await gateway.complete(model="stub", messages=MESSAGES)
+        assert time.perf_counter() - start >= 0.3
+        # Une erreur 429 ne compte pas comme une panne de l'API
+        assert gateway.breaker.failures == 0
+
+    run_with_gateway(server, check)
+    assert server.calls == 2
+
+
+def test_client_errors_are_not_retried(fault_server):
+    server = fault_server(plan=[(400, 0)])
+
+    async def check(gateway):
+        with pytest.raises(groq.BadRequestError):
+            await gateway.complete(model="stub", messages=MESSAGES)
+        assert gateway.breaker.state == CLOSED
+
+    run_with_gateway(server, check)
+    assert server.calls == 1
+
+
+def test_deadline_bounds_slow_calls(fault_server):
+    server = fault_server(default=(200, 2.0))
+
+    async def check(gateway):
+        start = time.perf_counter()
+        with pytest.raises(LLMUnavailableError):
+            await gateway.complete(model="stub", messages=MESSAGES)
+        assert time.perf_counter() - start < 1.0
+
+    run_with_gateway(server, check, timeout=0.3, deadline=0.8)
+
+
+def test_breaker_opens_then_closes_after_trial_call(fault_server):
+    server = fault_server(default=(500, 0.0))
+
+    async def check(gateway):
+        # Panne: le disjoncteur s'ouvre, les appels suivants échouent sans contacter l'API
+        for _ in range(2):
+            with pytest.raises(LLMUnavailableError):
+                await gateway.complete(model="stub", messages=MESSAGES)
+        assert gateway.breaker.state == OPEN
+        assert server.calls == 3
+        start = time.perf_counter()
+        with pytest.raises(LLMUnavailableError) as raised:
+            await gateway.complete(model="stub", messages=MESSAGES)
+        assert time.perf_counter() - start < 0.05
+        assert 0 < raised.value.retry_after <= 0.3
+        assert server.calls == 3
+        # L'API est rétablie: après reset_timeout, l'appel d'essai referme le disjoncteur
+        server.default = (200, 0.0)
+        await asyncio.sleep(0.35)
+        await gateway.complete(model="stub", messages=MESSAGES)
+        assert gateway.breaker.state == CLOSED
+        assert server.calls == 4
+
+    run_with_gateway(server, check, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.3))
+
+
+def test_breaker_allows_a_single_trial_call():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    breaker.before_call()
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_concurrency_limit_and_connection_reuse(fault_server):
+    server = fault_server(default=(200, 0.05))
+
+    async def check(gateway):
+        await asyncio.gather(*(gateway.complete(model="stub", messages=MESSAGES) for _ in range(20)))
+        for _ in range(20):
+            await gateway.complete(model="stub", messages=MESSAGES)
+
+    run_with_gateway(server, check, max_concurrency=4)
+    assert server.max_active == 4
+    assert server.connections == 4
+
+
+def test_waiting_for_a_slot_counts_in_the_deadline(fault_server):
+    server = fault_server(default=(200, 0.5))
+
+    async def check(gateway):
+        first = asyncio.ensure_future(gateway.complete(model="stub", messages=MESSAGES))
+        await asyncio.sleep(0.05)
+        with pytest.raises(LLMUnavailableError):
+            await gateway.complete(deadline=0.1, model="stub", messages=MESSAGES)
+        await first
+
+    run_with_gateway(server, check, max_concurrency=1)
+
+
+def test_stream_is_retried_before_the_first_chunk(fault_server):
+    server = fault_server(plan=[(503, 0)])
+
+    async def check(gateway):
+        tokens = [chunk.choices[0].delta.content
+                  async for chunk in gateway.stream(model="stub", messages=MESSAGES) if chunk.choices]
+        assert "".join(tokens) == "Réponse en flux."
+
+    run_with_gateway(server, check)
+    assert server.calls == 2
@@ -0,0 +1,52 @@
+"""
+Tests de l'instrumentation de /chat/: étapes dans l'en-tête Server-Timing et séries de
+/metrics (requêtes HTTP, appels et tokens Groq, consultations du cache)
+"""
+from fastapi.testclient import TestClient
+
+from metrics import MetricsMiddleware
+
+STAGES = ("language", "cache", "retrieval", "prompt", "llm", "serialization")
+
+
+def metrics_middleware(app):
+    if app.middleware_stack is None:
+        app.middleware_stack = app.build_middleware_stack()
+    layer = app.middleware_stack
+    while not isinstance(layer, MetricsMiddleware):
+        layer = layer.app
+    return layer
+
+
+def sample(exposition, series):
+    for line in exposition.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_chat_stages_are_exposed(app_module, groq_client, monkeypatch):
+    fake = groq_client("Le salarié a droit à un jour de congé payé par mois de travail effectif.")
+    monkeypatch.setattr(metrics_middleware(app_module.app), "timing_header", True)
+    client = TestClient(app_module.app)
+    question = "Combien de jours de congé annuel payé par mois de travail effectif ?"
+
+    before = client.get("/metrics").text
+    response = client.post("/chat/", json={"message": question, "conversation_id": "test-metrics-1"})
+    # Même première question dans une autre conversation: servie par le cache
+    client.post("/chat/", json={"message": question, "conversation_id": "test-metrics-2"}).raise_for_status()
+    after = client.get("/metrics").text
+
+    def delta(series):
+        return sample(after, series) - sample(before, series)
+
+    timing = response.headers["server-timing"]
+    for name in STAGES:
+        assert f"{name};dur=" in timing, timing
+        assert delta(f'chat_stage_seconds_count{{stage="{name}"}}') >= 1, name
+    assert delta('http_request_duration_seconds_count{method="POST",route="/chat/",status="200"}') == 2
+    assert len(fake.requests) == 1
+    assert delta('llm_requests_total{mode="complete",outcome="success"}') == 1
+    assert delta('llm_tokens_total{kind="prompt"}') == 10
+    assert delta('chat_cache_lookups_total{result="miss"}') == 1
+    assert delta('chat_cache_lookups_total{result="exact"}') + delta('chat_cache_lookups_total{result="semantic"}') == 1
@@ -0,0 +1,88 @@
+"""
+Tests des règles de ModelRouter, avec des scores de recherche fixés
+"""
+import pytest
+
+import metrics
+from model_router import FAST, LARGE, ModelRouter
+
+
+@pytest.fixture
+def router():
+    return ModelRouter("stub-fast", "stub-large", max_fast_words=20, max_fast_depth=4, min_fast_score=0.3,
+                       fast_languages=("french",), min_answer_chars=40)
+
+
+@pytest.mark.parametrize("query, language, score, depth, cited, reason", [
+    ("Merci beaucoup !", "french", 0.0, 3, 0, "small_talk"),
+    ("مرحبا", "arabic", None, 1, 0, "small_talk"),
+    ("Que dit l'article 14 du Code du Travail ?", "french", None, 1, 1, "citation"),
+    ("Que dit l'article 14 du Code du Travail ?", "french", 0.9, 1, 1, "citation"),
+    ("taux de TVA", "arabic", 0.9, 1, 0, "language"),
+    ("mot " * 30, "french", 0.9, 1, 0, "long_query"),
+    ("taux de TVA", "french", 0.9, 9, 0, "deep_conversation"),
+    ("taux de TVA", "french", None, 1, 0, "no_context"),
+    ("taux de TVA", "french", 0.1, 1, 0, "weak_retrieval"),
+    ("taux de TVA", "french", 0.3, 1, 0, "simple_lookup"),
+])
+def test_route_rules(router, query, language, score, depth, cited, reason):
+    decision = router.route(query, language, score, depth, cited)
+    assert decision["reason"] == reason
+    expected = FAST if reason in ("small_talk", "simple_lookup") else LARGE
+    assert decision["route"] == expected
+    assert decision["model"] == ("stub-fast" if expected == FAST else "stub-large")
+
+
+def test_without_fast_model_everything_goes_to_large_model():
+    for fast_model in ("", None, "stub-large"):
+        router = ModelRouter(fast_model, "stub-large")
+        assert not router.enabled
+        decision = router.route("Bonjour", "french", 0.9, 1)
+        assert decision["route"] == LARGE
+        assert decision["reason"] == "single_model"
+        assert decision["model"] == "stub-large"
+
+
+def test_escalation_reasons(router):
+    decision = router.route("taux de TVA", "french", 0.9, 1)
+    assert decision["route"] == FAST
+    answer = "Selon l'article 14 du Code du travail tunisien, le délai applicable est d'un mois."
+    assert router.escalation_reason(decision, "Réponse complète et sourcée " * 3, "length") == "truncated"
+    assert router.escalation_reason(decision, "Oui.", "stop") == "too_short"
+    assert router.escalation_reason(decision, "Je ne sais pas répondre à cette question précise.", "stop") == "uncertain"
+    assert router.escalation_reason(decision, answer, "stop") is None
+
+
+def test_short_small_talk_answer_is_kept(router):
+    decision = router.route("Bonjour", "french", None, 1)
+    assert router.escalation_reason(decision, "Bonjour !", "stop") is None
+    assert router.escalation_reason(decision, "Bonjour !", "length") == "truncated"
+
+
+def test_large_model_answers_are_never_escalated(router):
+    decision = router.route("taux de TVA", "french", 0.1, 1)
+    assert router.escalation_reason(decision, "Oui.", "length") is None
+
+
+def test_escalate_switches_to_large_model(router):
+    before = metrics.llm_route_escalations.values.get(("too_short",), 0)
+    decision = router.escalate(router.route("taux de TVA", "french", 0.9, 1), "too_short")
+    assert decision["route"] == LARGE
+    assert decision["model"] == "stub-large"
+    assert decision["reason"] == "escalated_too_short"
+    assert metrics.llm_route_escalations.values[("too_short",)] == before + 1
+
+
+def test_question_citing_an_indexed_article_goes_to_large_model(app_module, groq_client, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    fake = groq_client("Selon l'article 14 du Code du Travail, le préavis est d'un mois pour les deux parties.")
+    monkeypatch.setattr(app_module.model_router, "fast_model", "stub-fast")
+    question = "Que dit l'article 14 du Code du Travail ?"
+    context, score, cited = app_module.retrieve_context("test-citation", question)
+    assert cited == 1 and score is None
+    assert "préavis d'un mois" in context
+
+    response = TestClient(app_module.app).post("/chat/", json={"message": question, "conversation_id": "test-citation"})
+    assert response.status_code == 200
+    assert [request["model"] for request in fake.requests] == ["stub-large"]
@@ -0,0 +1,113 @@
+"""
+Tests du cache des réponses: éviction des entrées les moins récemment utilisées, expiration
+(TTL), limite mémoire et compteurs
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Horloge du cache avancée à la main: clock.now += secondes.
+    """
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_size=3)
+    for key in "abc":
+        cache.set(key, f"réponse {key}")
+    assert cache.get("a") == "réponse a"
+    cache.set("d", "réponse d")
+    # "b" est la moins récemment utilisée: "a" a été lue après son insertion
+    assert list(cache.cache) == ["c", "a", "d"]
+    assert cache.get("b") is None
+
+    # Remplacer une entrée la rend la plus récente sans rien évincer
+    cache.set("c", "nouvelle réponse c")
+    assert list(cache.cache) == ["a", "d", "c"] and cache.get("c") == "nouvelle réponse c"
+    cache.set("e", "réponse e")
+    assert list(cache.cache) == ["d", "c", "e"]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(max_size=10, ttl=60)
+    cache.set("a", "réponse a")
+    clock.now += 30
+    cache.set("b", "réponse b")
+    clock.now += 30
+    # Une lecture ne prolonge pas la durée de vie: elle part de l'insertion
+    assert cache.get("a") == "réponse a"
+    clock.now += 1
+    assert cache.get("a") is None and cache.get("b") == "réponse b"
+    assert "a" not in cache.cache
+    clock.now += 30
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 2 and stats["entries"] == 0 and stats["bytes"] == 0
+
+    # Sans TTL, rien n'expire
+    forever = ResponseCache(max_size=10)
+    forever.set("a", "réponse a")
+    clock.now += 10 ** 9
+    assert forever.get("a") == "réponse a"
+
+
+def test_entries_are_evicted_to_stay_within_max_bytes():
+    key_size = ResponseCache._entry_size("a", "")
+    answer = "x" * 1000
+    size = ResponseCache._entry_size("a", answer)
+    cache = ResponseCache(max_size=100, max_bytes=3 * size + key_size)
+    for key in "abcd":
+        cache.set(key, answer)
+        assert cache.current_bytes <= cache.max_bytes
+    assert list(cache.cache) == ["b", "c", "d"] and cache.current_bytes == 3 * size
+
+    # Une valeur plus grande que le cache entier n'est pas conservée et n'évince rien
+    cache.set("e", "x" * (4 * size))
+    assert cache.get("e") is None and list(cache.cache) == ["b", "c", "d"]
+    # Une valeur plus grande remplace l'ancienne et évince autant d'entrées que nécessaire
+    larger = "x" * (2 * size + 1)
+    cache.set("d", larger)
+    assert list(cache.cache) == ["d"] and cache.current_bytes == ResponseCache._entry_size("d", larger)
+    assert cache.stats()["evictions"] == 3
+
+
+def test_counters(clock):
+    cache = ResponseCache(max_size=2, ttl=10)
+    assert cache.stats()["hit_rate"] == 0.0
+    cache.set("a", "réponse a")
+    cache.set("b", "réponse b")
+    cache.get("a")
+    cache.get("a")
+    cache.get("inconnue")
+    cache.set("c", "réponse c")
+    clock.now += 11
+    cache.get("a")
+
+    stats = cache.stats()
+    assert {name: stats[name] for name in ("entries", "hits", "misses", "evictions", "expirations")} == {
+        "entries": 1, "hits": 2, "misses": 2, "evictions": 1, "expirations": 1
+    }
+    assert stats["hit_rate"] == 0.5 and stats["max_size"] == 2 and stats["ttl"] == 10
+    assert stats["bytes"] == ResponseCache._entry_size("c", "réponse c")
+
+    # Vider le cache ne remet pas les compteurs à zéro
+    cache.clear()
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0 and cache.stats()["hits"] == 2
+
+
+def test_cache_key_depends_on_query_and_messages():
+    messages = [{"role": "user", "content": "Bonjour"}, {"role": "assistant", "content": "Bonjour !"}]
+    key = make_cache_key("Durée du préavis ?", messages)
+    assert len(key) == 32 and key == make_cache_key("Durée du préavis ?", [dict(m) for m in messages])
+    assert key != make_cache_key("Durée du préavis ?", messages[:1])
+    assert key != make_cache_key("Durée du congé ?", messages)
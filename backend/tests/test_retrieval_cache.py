@@ -0,0 +1,103 @@
+"""
+Tests du cache des recherches: une requête servie par le cache a le même classement qu'une
+recherche sans cache, quelles que soient sa casse, ses accents ou sa ponctuation
+"""
+import pytest
+
+from pdf_indexer import INDEX_STOPWORDS, PDFIndexer
+from retrieval_cache import RetrievalCache, normalize_query
+
+# Même requête à la casse, aux accents, à la ponctuation et à l'ordre des mots près
+VARIANTS = [
+    "dommages-intérêts du contrat",
+    "DOMMAGES-INTERETS du contrat ?",
+    "contrat: dommages intérêts",
+    "dommages interets contrat",
+]
+
+
+@pytest.fixture(scope="module")
+def indexer(legal_documents):
+    indexer = PDFIndexer(str(legal_documents), index_directory=None, max_workers=1)
+    indexer.index_documents()
+    return indexer
+
+
+def test_normalize_query():
+    stop_words = RetrievalCache(stop_words=INDEX_STOPWORDS).stop_words
+    assert normalize_query("Quel est le PRÉAVIS du contrat ?", stop_words) == "contrat preavis quel"
+    assert normalize_query("préavis préavis", stop_words) == "preavis preavis"
+    assert len({normalize_query(query, stop_words) for query in VARIANTS}) == 1
+
+
+@pytest.mark.parametrize("mode", ["tfidf", "bm25"])
+def test_cached_ranking_equals_fresh_search(indexer, mode, monkeypatch):
+    monkeypatch.setattr(indexer, "retrieval_mode", mode)
+    fresh = []
+    for query in VARIANTS:
+        indexer.search_cache.clear()
+        fresh.append(indexer.search(query))
+    assert fresh[0]
+
+    indexer.search_cache.clear()
+    hits = indexer.search_cache.hits
+    cached = [indexer.search(query) for query in VARIANTS]
+    assert indexer.search_cache.hits == hits + len(VARIANTS) - 1
+    assert cached == fresh
+
+
+@pytest.mark.parametrize("mode", ["tfidf", "bm25"])
+def test_retrievers_ignore_accents(indexer, mode, monkeypatch):
+    monkeypatch.setattr(indexer, "retrieval_mode", mode)
+    indexer.search_cache.clear()
+    accented = indexer.search("dommages-intérêts")
+    indexer.search_cache.clear()
+    assert accented
+    assert indexer.search("dommages-interets") == accented
+
+
+def test_cache_is_invalidated_when_index_changes(indexer):
+    indexer.search_cache.clear()
+    indexer.search(VARIANTS[0])
+    indexer.generation += 1
+    try:
+        hits = indexer.search_cache.hits
+        indexer.search(VARIANTS[0])
+        assert indexer.search_cache.hits == hits
+        assert indexer.search_cache.stats()["entries"] == 1
+    finally:
+        indexer.generation -= 1
+        indexer.search_cache.clear()
+
+
+def test_cached_context_equals_uncached_context(indexer, legal_documents):
+    uncached = PDFIndexer(str(legal_documents), index_directory=None, max_workers=1, search_cache_size=0)
+    uncached.index_documents()
+    indexer.search_cache.clear()
+    for query in VARIANTS + ["congé de maternité", "vol commis la nuit"]:
+        expected = uncached.retrieve(query)
+        assert indexer.retrieve(query) == expected and indexer.retrieve(query) == expected, query
+    extra = [{"path": "contrat.docx", "content": "Loyer mensuel: 850 dinars.", "pages": (1, 1), "score": 3.0}]
+    assert indexer.retrieve(VARIANTS[0], extra_results=extra) == uncached.retrieve(VARIANTS[0], extra_results=extra)
+
+
+def test_added_document_is_found_after_a_cached_search(legal_documents, tmp_path):
+    indexer = PDFIndexer(str(legal_documents), index_directory=str(tmp_path / "index"), max_workers=1)
+    indexer.index_documents()
+    query = "durée du contrat de travail"
+    context = indexer.retrieve(query)[0]
+    assert context and "avenant.txt" not in context
+
+    text = "Le contrat de travail à durée déterminée ne peut excéder quatre ans."
+    document = tmp_path / "avenant.txt"
+    document.write_text(text, encoding="utf-8")
+    assert indexer.add_document(str(document), [text])
+    assert "avenant.txt" in indexer.retrieve(query)[0]
+    assert indexer.search_cache.stats()["invalidations"] == 1
+
+
+def test_empty_index_searches_silently(tmp_path, capsys):
+    indexer = PDFIndexer(str(tmp_path), index_directory=None)
+    assert indexer.search("préavis") == []
+    assert indexer.search_many(["préavis", "contrat"]) == [[], []]
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,86 @@
+"""
+Tests du cache sémantique: une question reformulée retrouve la réponse, une question sur un
+autre article non, et /chat/ ne s'en sert que pour la première question d'une conversation
+sans documents téléversés (version des documents lue hors de la boucle d'événements)
+"""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from semantic_cache import SemanticCache, normalize_question
+
+
+def test_normalize_question_keeps_article_numbers():
+    assert normalize_question("L'Article 5 du Code du Travail ?") == {"article", "5", "code", "travail"}
+    assert normalize_question("article 5 du code du travail") != normalize_question("article 6 du code du travail")
+    assert normalize_question("Quelles sont les indemnités ?") == normalize_question("quelle indemnite")
+
+
+def test_near_duplicate_hits_and_other_article_misses():
+    cache = SemanticCache(threshold=0.8)
+    question = "Quelle est la durée du préavis de licenciement prévue par l'article 14 du code du travail ?"
+    cache.set(question, "fr", "Un mois.")
+
+    assert cache.get("durée préavis licenciement article 14 code travail", "fr") == "Un mois."
+    assert cache.get("Quelles sont les durées de préavis de licenciement, article 14 du code du travail ?", "fr") == "Un mois."
+    # Mêmes mots sauf le numéro d'article: jamais la même réponse, même au-dessus du seuil
+    assert cache.get(question.replace("14", "15"), "fr") is None
+    assert cache.get(question.replace("14", "14 et 15"), "fr") is None
+    assert cache.get(question.replace("14", "1"), "fr") is None
+    # Même question dans une autre langue: pas de réponse partagée
+    assert cache.get(question, "ar") is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 4
+
+
+def test_chat_uses_semantic_cache_only_for_first_turn_without_documents(app_module, groq_client):
+    fake = groq_client("Le congé de maternité est de trente jours.")
+    client = TestClient(app_module.app)
+    question = "Quelle est la durée du congé de maternité selon l'article 64 du code du travail ?"
+    paraphrase = "durée congé maternité article 64 code travail"
+
+    def chat(conversation_id, message):
+        response = client.post("/chat/", json={"message": message, "conversation_id": conversation_id})
+        assert response.status_code == 200
+        return response.json()
+
+    chat("semantic-1", question)
+    assert len(fake.requests) == 1
+    # Première question d'une autre conversation: réponse reprise du cache sémantique
+    chat("semantic-2", paraphrase)
+    assert len(fake.requests) == 1
+    # Autre article: nouvel appel au LLM
+    chat("semantic-3", question.replace("64", "65"))
+    assert len(fake.requests) == 2
+
+    # Deuxième question d'une conversation: la réponse dépend de l'historique
+    chat("semantic-1", paraphrase)
+    assert len(fake.requests) == 3
+
+    # Conversation avec ses propres documents: pas de réponse partagée
+    app_module.scoped_documents.add("semantic-4", "contrat.txt", ["Congé de maternité de soixante jours."])
+    try:
+        chat("semantic-4", paraphrase)
+        assert len(fake.requests) == 4
+    finally:
+        app_module.scoped_documents.remove("semantic-4")
+
+
+def test_document_version_is_read_off_the_event_loop(app_module, groq_client, monkeypatch):
+    groq_client("Le loyer est de 850 dinars.")
+    version = app_module.scoped_documents.version
+    on_event_loop = []
+
+    def record_version(conversation_id):
+        on_event_loop.append(asyncio._get_running_loop() is not None)
+        return version(conversation_id)
+
+    monkeypatch.setattr(app_module.scoped_documents, "version", record_version)
+    app_module.scoped_documents.add("semantic-5", "bail.txt", ["Le loyer mensuel est fixé à 850 dinars."])
+    try:
+        response = TestClient(app_module.app).post(
+            "/chat/", json={"message": "Quel est le loyer mensuel ?", "conversation_id": "semantic-5"}
+        )
+        assert response.status_code == 200
+    finally:
+        app_module.scoped_documents.remove("semantic-5")
+    assert on_event_loop and not any(on_event_loop)
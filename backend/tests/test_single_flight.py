@@ -0,0 +1,144 @@
+"""
+Tests de SingleFlight: regroupement des appels simultanés, propagation des erreurs et annulation,
+puis regroupement des recherches et des appels à Groq des requêtes /chat/ identiques
+"""
+import asyncio
+
+import httpx
+
+from single_flight import SingleFlight
+
+
+def make_compute(calls):
+    async def compute(value, delay=0.05, error=None):
+        calls.append(value)
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return value
+
+    return compute
+
+
+def test_concurrent_calls_share_one_computation():
+    async def run():
+        flight = SingleFlight("test")
+        calls = []
+        compute = make_compute(calls)
+        results = await asyncio.gather(*(flight.do("k", lambda: compute(1)) for _ in range(20)))
+        assert results == [1] * 20
+        assert calls == [1]
+        assert not flight.inflight
+        assert flight.leaders == 1 and flight.coalesced == 19
+
+    asyncio.run(run())
+
+
+def test_different_keys_are_not_coalesced():
+    async def run():
+        flight = SingleFlight("test")
+        calls = []
+        compute = make_compute(calls)
+        results = await asyncio.gather(flight.do("a", lambda: compute(1)), flight.do("b", lambda: compute(2)))
+        assert results == [1, 2]
+        assert sorted(calls) == [1, 2]
+
+    asyncio.run(run())
+
+
+def test_error_reaches_every_caller_and_is_not_cached():
+    async def run():
+        flight = SingleFlight("test")
+        calls = []
+        compute = make_compute(calls)
+        outcomes = await asyncio.gather(*(flight.do("k", lambda: compute(2, error=ValueError("échec")))
+                                          for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+        assert calls == [2]
+        # L'appel suivant recommence le calcul
+        assert await flight.do("k", lambda: compute(3)) == 3
+        assert calls == [2, 3]
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_cancel_shared_computation():
+    async def run():
+        flight = SingleFlight("test")
+        calls = []
+        compute = make_compute(calls)
+        first = asyncio.ensure_future(flight.do("k", lambda: compute(4)))
+        second = asyncio.ensure_future(flight.do("k", lambda: compute(5)))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == 4
+        assert first.cancelled()
+        assert calls == [4]
+
+    asyncio.run(run())
+
+
+def test_computation_cancelled_when_no_caller_is_left():
+    async def run():
+        flight = SingleFlight("test")
+        compute = make_compute([])
+        only = asyncio.ensure_future(flight.do("k", lambda: compute(6, delay=10)))
+        await asyncio.sleep(0.01)
+        task = flight.inflight["k"][0]
+        only.cancel()
+        await asyncio.sleep(0.01)
+        assert task.cancelled()
+        assert not flight.inflight
+
+    asyncio.run(run())
+
+
+def test_identical_chat_requests_share_one_search_and_llm_call(app_module, groq_client):
+    fake = groq_client("Le délai de préavis en cas de démission est d'un mois.")
+    create = fake.chat.completions.create
+
+    async def slow_create(**params):
+        await asyncio.sleep(0.2)
+        return await create(**params)
+
+    fake.chat.completions.create = slow_create
+    question = "Quels sont les délais de préavis en cas de démission du salarié ?"
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/chat/", json={"message": question, "conversation_id": f"test-coalescing-{i}"})
+                for i in range(10)
+            ))
+
+    leaders = app_module.retrieval_flight.leaders
+    responses = asyncio.run(burst())
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.json()["response"] for response in responses}) == 1
+    assert len(fake.requests) == 1
+    assert app_module.retrieval_flight.leaders - leaders == 1
+
+
+def test_same_question_in_different_conversations_searches_once(app_module):
+    question = "Quelle est la durée légale du congé de maternité de la salariée ?"
+    conversations = [
+        app_module.Conversation(f"test-retrieval-{i}", app_module.SYSTEM_MESSAGE, [
+            {"role": "user", "content": f"Question précédente {i}"},
+            {"role": "assistant", "content": f"Réponse précédente {i}"},
+            {"role": "user", "content": question},
+        ])
+        for i in range(5)
+    ]
+
+    async def build():
+        return await asyncio.gather(*(
+            app_module.build_messages_with_context(conversation, question, "french") for conversation in conversations
+        ))
+
+    leaders = app_module.retrieval_flight.leaders
+    built = [messages for messages, _, _ in asyncio.run(build())]
+    assert app_module.retrieval_flight.leaders - leaders == 1
+    # Même contexte, mais chaque conversation garde son historique
+    assert len({messages[-1]["content"] for messages in built}) == 1
+    assert built[0][1] != built[1][1]
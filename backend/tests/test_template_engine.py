@@ -0,0 +1,61 @@
+"""
+Tests des modèles de documents: même rendu que l'ancien remplacement (valeurs None et
+variables absentes comprises) et archive des lots supprimée après son envoi
+"""
+import io
+import json
+import zipfile
+
+from fastapi.testclient import TestClient
+
+from template_engine import CompiledTemplate, TemplateStore
+
+SOURCE = "Tunis, le {{date}}\n\nMonsieur {{nom}},\nmontant dû: {{montant}} dinars.\n{{nom}}\n"
+
+
+def legacy_render(source, parameters):
+    for key, value in parameters.items():
+        source = source.replace(f"{{{{{key}}}}}", str(value))
+    return source
+
+
+def test_render_matches_legacy_replacement():
+    template = CompiledTemplate(SOURCE)
+    for parameters in (
+        {"date": "1er mars 2025", "nom": "Ben Ali", "montant": 1200},
+        {"date": None, "nom": "Ben Ali", "montant": 0},
+        {"nom": "Ben Ali", "inconnu": "x"},
+        {},
+    ):
+        assert template.render(parameters) == legacy_render(SOURCE, parameters), parameters
+    assert "le None" in template.render({"date": None})
+    assert template.check({"date": None, "inconnu": 1}) == (["montant", "nom"], ["inconnu"])
+
+
+def test_store_reloads_changed_template(tmp_path):
+    path = tmp_path / "procuration_fr.txt"
+    path.write_text("Je soussigné {{nom}}", encoding="utf-8")
+    store = TemplateStore(str(tmp_path))
+    assert store.get("procuration", "fr").render({"nom": "A"}) == "Je soussigné A"
+    assert store.get("procuration", "ar") is None
+    assert store.list_templates() == [{"type": "procuration", "language": "fr", "filename": "procuration_fr.txt"}]
+    path.write_text("Je soussigné(e) {{nom}}, né(e) le {{date}}", encoding="utf-8")
+    assert store.get("procuration", "fr").names == ["nom", "date"]
+
+
+def test_batch_archive_is_deleted_after_sending(app_module, tmp_path, monkeypatch):
+    (tmp_path / "procuration_fr.txt").write_text(SOURCE, encoding="utf-8")
+    generated = tmp_path / "generated"
+    monkeypatch.setattr(app_module, "template_store", TemplateStore(str(tmp_path)))
+    monkeypatch.setattr(app_module, "GENERATED_DOCUMENTS_DIR", str(generated))
+    documents = [{"date": "1er mars 2025", "nom": "Ben Ali", "montant": 1200}, {"nom": "Trabelsi"}]
+
+    response = TestClient(app_module.app).post(
+        "/generate_documents/batch/", json={"document_type": "procuration", "documents": documents}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Documents-Count"] == "2" and response.headers["X-Incomplete-Documents"] == "1"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.read("procuration_fr_0002.txt").decode("utf-8") == legacy_render(SOURCE, documents[1])
+    assert json.loads(archive.read("rapport.json"))[1]["missing_parameters"] == ["date", "montant"]
+    assert list(generated.iterdir()) == []
@@ -0,0 +1,69 @@
+"""
+Tests de la préparation en arrière-plan: une étape en échec est relancée, la préparation
+n'échoue définitivement qu'après max_attempts tentatives, et /chat/ répond pendant le chargement
+"""
+from fastapi.testclient import TestClient
+
+from warmup import FAILED, READY, WARMING, WarmUp
+
+
+def flaky(failures):
+    calls = []
+
+    def step():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise OSError("index illisible")
+    return step, calls
+
+
+def test_failed_step_is_retried_until_it_succeeds():
+    warm_up = WarmUp(max_attempts=5, backoff_base=0.01, backoff_max=0.02)
+    first, first_calls = flaky(0)
+    second, second_calls = flaky(2)
+    warm_up.add_step("index", first)
+    warm_up.add_step("citations", second)
+    warm_up.start()
+    assert warm_up.wait(timeout=10)
+
+    status = warm_up.status()
+    assert status["status"] == READY and status["error"] is None
+    assert [step["attempts"] for step in status["steps"]] == [1, 3]
+    # Les étapes réussies ne sont pas rejouées
+    assert len(first_calls) == 1 and len(second_calls) == 3
+
+
+def test_gives_up_after_max_attempts():
+    warm_up = WarmUp(max_attempts=3, backoff_base=0.01)
+    step, calls = flaky(10)
+    warm_up.add_step("index", step)
+    warm_up.start()
+    assert not warm_up.wait(timeout=10)
+
+    status = warm_up.status()
+    assert status["status"] == FAILED and status["error"] == "index: index illisible"
+    assert status["steps"][0]["status"] == "failed" and len(calls) == 3
+
+
+def test_chat_while_warming(app_module, groq_client, monkeypatch):
+    fake = groq_client("Le préavis est d'un mois.")
+    warming = WarmUp()
+    warming.state = WARMING
+    monkeypatch.setattr(app_module, "warm_up", warming)
+    client = TestClient(app_module.app)
+    question = {"message": "Quelle est la durée du préavis pendant la période d'essai ?", "conversation_id": "test-warming"}
+
+    # "unavailable": 503 avec Retry-After, le processus reste vivant
+    response = client.post("/chat/", json=question)
+    assert response.status_code == 503 and response.headers["retry-after"] == str(app_module.WARMUP_RETRY_AFTER)
+    assert client.get("/healthz").status_code == 200 and client.get("/readyz").status_code == 503
+    assert fake.requests == []
+
+    # "no_context": réponse sans contexte juridique, signalée et non mise en cache
+    monkeypatch.setattr(app_module, "CHAT_WHILE_WARMING", "no_context")
+    response = client.post("/chat/", json=question).json()
+    assert response["degraded"]
+    assert "Aucune information spécifique" in fake.requests[-1]["messages"][-1]["content"]
+    warming.state = READY
+    response = client.post("/chat/", json={**question, "conversation_id": "test-warming-2"}).json()
+    assert not response["degraded"] and len(fake.requests) == 2
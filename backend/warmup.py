@@ -0,0 +1,143 @@
+"""
+Préparation de l'application en arrière-plan: le serveur HTTP répond dès son démarrage
+pendant que l'index est chargé ou construit, et l'état de chaque étape est consultable
+(/healthz, /readyz). Une étape en échec est relancée après une attente croissante; la
+préparation n'échoue définitivement qu'après max_attempts tentatives
+"""
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+# États de la préparation
+STARTING = "starting"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    def __init__(self, max_attempts: int = 5, backoff_base: float = 5.0, backoff_max: float = 300.0):
+        """
+        Initialise la préparation.
+
+        Args:
+            max_attempts: Nombre de tentatives d'une étape avant l'échec définitif (0 = sans limite)
+            backoff_base: Attente avant la première nouvelle tentative (doublée à chaque essai)
+            backoff_max: Plafond de l'attente entre deux tentatives
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.state = STARTING
+        self.steps: List[Dict] = []
+        self.started_at = time.time()
+        self.ready_after: Optional[float] = None  # Durée de la préparation en secondes
+        self.error: Optional[str] = None
+        self._functions: List[Callable[[], None]] = []
+        self._progress: Dict[str, Callable[[], Dict]] = {}
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add_step(self, name: str, function: Callable[[], None],
+                 progress: Optional[Callable[[], Dict]] = None) -> None:
+        """
+        Ajoute une étape, exécutée après les précédentes.
+
+        Args:
+            name: Nom de l'étape
+            function: Fonction à exécuter
+            progress: Fonction qui retourne l'avancement de l'étape en cours (facultatif)
+        """
+        self.steps.append({"name": name, "status": "pending", "seconds": None, "attempts": 0})
+        self._functions.append(function)
+        if progress is not None:
+            self._progress[name] = progress
+
+    def start(self) -> None:
+        """
+        Lance les étapes dans un thread en arrière-plan.
+        """
+        self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        start = time.perf_counter()
+        with self._lock:
+            self.state = WARMING
+        for step, function in zip(self.steps, self._functions):
+            while not self._run_step(step, function):
+                attempts = step["attempts"]
+                if self.max_attempts and attempts >= self.max_attempts:
+                    logger.error(f"Démarrage abandonné après {attempts} tentatives de l'étape {step['name']}")
+                    with self._lock:
+                        self.state = FAILED
+                    self._ready.set()
+                    return
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                with self._lock:
+                    step["retry_at"] = time.time() + delay
+                time.sleep(delay)
+        with self._lock:
+            self.state = READY
+            self.ready_after = time.perf_counter() - start
+            self.error = None
+        self._ready.set()
+
+    def _run_step(self, step: Dict, function: Callable[[], None]) -> bool:
+        """
+        Exécute une tentative de l'étape.
+
+        Returns:
+            True si l'étape a réussi
+        """
+        step_start = time.perf_counter()
+        with self._lock:
+            step.update(status="running", attempts=step["attempts"] + 1)
+            step.pop("retry_at", None)
+        try:
+            function()
+        except Exception as e:
+            logger.error(f"Échec de l'étape de démarrage {step['name']} (tentative {step['attempts']}): {str(e)}")
+            with self._lock:
+                step.update(status="failed", seconds=time.perf_counter() - step_start)
+                self.error = f"{step['name']}: {str(e)}"
+            return False
+        with self._lock:
+            step.update(status="done", seconds=time.perf_counter() - step_start)
+        logger.info(f"Démarrage: {step['name']} en {time.perf_counter() - step_start:.2f}s")
+        return True
+
+    def is_ready(self) -> bool:
+        return self.state == READY
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Attend la fin de la préparation (réussie, ou en échec après max_attempts tentatives).
+
+        Returns:
+            True si l'application est prête
+        """
+        self._ready.wait(timeout)
+        return self.is_ready()
+
+    def status(self) -> Dict:
+        """
+        Retourne l'état de la préparation, la durée et l'avancement de chaque étape.
+        """
+        with self._lock:
+            steps = [dict(step) for step in self.steps]
+            status = {
+                "status": self.state,
+                "uptime": time.time() - self.started_at,
+                "ready_after": self.ready_after,
+                "error": self.error,
+            }
+        for step in steps:
+            if step["status"] == "running" and step["name"] in self._progress:
+                step["progress"] = self._progress[step["name"]]()
+        status["steps"] = steps
+        return status
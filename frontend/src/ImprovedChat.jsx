@@ -110,39 +110,93 @@ const handleSubmit = async (event) => {
 
     // Envoi de la requête avec timeout et annulation
     const controller = new AbortController();
-    const timeoutId = setTimeout(() => controller.abort(), 30000); // 30s timeout
-
- // Modifier la configuration Axios
-const res = await axios.post("http://127.0.0.1:8000/chat/", {
-  message: trimmedMessage,
-  role: "user",
-  conversation_id: conversationId,
-}, {
-  headers: { 
-    'Content-Type': 'application/json',
-    'Accept-Language': detectedLanguage 
-  },
-  timeout: 60000, // Timeout à 60 secondes
-  signal: controller.signal
-});
+    const timeoutId = setTimeout(() => controller.abort(), 60000); // Timeout à 60 secondes
+
+    // Réponse en streaming (Server-Sent Events): le texte s'affiche au fur et à mesure
+    const res = await fetch("http://127.0.0.1:8000/chat/stream/", {
+      method: "POST",
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
+        'Accept-Language': detectedLanguage
+      },
+      body: JSON.stringify({
+        message: trimmedMessage,
+        role: "user",
+        conversation_id: conversationId,
+      }),
+      signal: controller.signal
+    });
+
+    if (!res.ok) {
+      // Même forme d'erreur qu'axios pour la gestion ci-dessous
+      const data = await res.json().catch(() => ({}));
+      const httpError = new Error(`HTTP ${res.status}`);
+      httpError.response = { status: res.status, data };
+      throw httpError;
+    }
+
+    // Message de l'assistant ajouté immédiatement puis complété token par token
+    const assistantTimestamp = new Date().toISOString();
+    const updateAssistantMessage = (content, language) => {
+      setMessages(prev => {
+        const last = prev[prev.length - 1];
+        const assistantMessage = { role: "assistant", content, language, timestamp: assistantTimestamp };
+        if (last?.role === "assistant" && last.timestamp === assistantTimestamp) {
+          return [...prev.slice(0, -1), assistantMessage];
+        }
+        return [...prev, assistantMessage];
+      });
+    };
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let partialResponse = "";
+    let finalData = null;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Les événements SSE sont séparés par une ligne vide
+      let separatorIndex;
+      while ((separatorIndex = buffer.indexOf("\n\n")) !== -1) {
+        const rawEvent = buffer.slice(0, separatorIndex);
+        buffer = buffer.slice(separatorIndex + 2);
+
+        let eventName = "message";
+        let eventData = "";
+        rawEvent.split("\n").forEach(line => {
+          if (line.startsWith("event: ")) eventName = line.slice(7);
+          else if (line.startsWith("data: ")) eventData += line.slice(6);
+        });
+        const data = eventData ? JSON.parse(eventData) : {};
+
+        if (eventName === "token") {
+          partialResponse += data.token;
+          updateAssistantMessage(partialResponse, detectedLanguage);
+        } else if (eventName === "done") {
+          finalData = data;
+        } else if (eventName === "error") {
+          const streamError = new Error(data.detail);
+          streamError.response = { status: 503, data };
+          throw streamError;
+        }
+      }
+    }
 
     clearTimeout(timeoutId);
 
     // Traitement de la réponse
-    if (!res.data?.response) {
+    if (!finalData?.response) {
       throw new Error('Réponse vide du serveur');
     }
 
-    const responseLanguage = res.data.language === "arabic" ? "ar" : "fr";
+    const responseLanguage = finalData.language === "arabic" ? "ar" : "fr";
     setCurrentLanguage(responseLanguage);
-
-    const assistantMessage = { 
-      role: "assistant", 
-      content: res.data.response,
-      language: responseLanguage,
-      timestamp: new Date().toISOString()
-    };
-    setMessages(prev => [...prev, assistantMessage]);
+    updateAssistantMessage(finalData.response, responseLanguage);
 
   } catch (error) {
     // Gestion fine des erreurs
@@ -150,7 +204,7 @@ const res = await axios.post("http://127.0.0.1:8000/chat/", {
       ? "حدث خطأ أثناء الاتصال بالخادم." 
       : "Une erreur s'est produite lors de la communication avec le serveur.";
 
-    if (axios.isCancel(error)) {
+    if (axios.isCancel(error) || error.name === "AbortError") {
       errorMessage = currentLanguage === "ar"
         ? "تم إلغاء الطلب بسبب تجاوز المهلة."
         : "La requête a expiré (timeout).";